@@ -0,0 +1,696 @@
+"""
+П.13: Распределение мест с учетом приоритетов
+
+Распределение за дату вычисляется один раз и используется всеми:
+расчетом проходных баллов, списками зачисленных, PDF отчетом и страницей
+программы. Результат запоминается по ключу (дата, версия данных);
+версия хранится в БД (таблица data_versions) и увеличивается при загрузке
+и удалении списка, поэтому устаревший результат не используется ни в одном
+процессе приложения.
+
+Из БД читаются только нужные столбцы (id, программа, приоритет, сумма баллов,
+согласие) в массивы NumPy; программы кодируются целыми числами, очередь
+строится векторными сортировками, а каскад приоритетов обходится с массивом
+счетчиков мест (см. cascade).
+
+Способ распределения задается Config.ALLOCATION_ENGINE (см. ENGINES):
+- greedy - каскад по очереди абитуриентов (по максимальной сумме баллов);
+- deferred_acceptance - отложенное принятие (заявления подают абитуриенты),
+  программа ранжирует по сумме баллов именно в своем заявлении.
+При одинаковой сумме баллов во всех заявлениях абитуриента результаты совпадают.
+
+После небольших изменений списка распределение не пересчитывается целиком:
+измененные абитуриенты переставляются в очереди, и каскад повторяется только
+с первого затронутого места очереди (см. update_allocation; только greedy).
+
+Расчет проходных баллов сохраняет распределение в таблицу enrollments
+(см. save_enrollment); страницы и отчеты читают статусы зачисления из нее
+одним запросом с соединением, не повторяя распределение.
+"""
+
+import heapq
+import threading
+from itertools import chain
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+import numpy as np
+from sqlalchemy import select
+from config import Config
+from models import db, Applicant, DataVersion, Enrollment
+from dimensions import date_id, program_case, program_ids
+from archive import open_archive, remove_archive
+
+
+PROGRAMS = Config.PROGRAMS
+
+# Программы кодируются номерами в алфавитном порядке кодов
+PROGRAM_CODES = sorted(PROGRAMS.keys())
+PROGRAM_INDEX = {code: i for i, code in enumerate(PROGRAM_CODES)}
+
+# Столбцы, загружаемые для распределения
+COLUMNS = ('id', 'program', 'priority', 'total_score', 'has_consent')
+
+# Первое окно каскада (абитуриентов); каждое следующее - в 4 раза больше
+REPLAY_WINDOW = 4096
+
+# Статус строки таблицы enrollments
+ENROLLED = 'enrolled'
+
+# Заявление зачисленного абитуриента
+EnrolledApplicant = namedtuple('EnrolledApplicant', ['id', 'program_code', 'priority', 'total_score'])
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+class Allocation:
+    """
+    Результат распределения мест за дату
+
+    - enrolled: {код_программы: [EnrolledApplicant]} по убыванию баллов
+    - placement: {id абитуриента: код программы зачисления}
+    - queue: состояние очереди (Queue) для пошагового пересчета
+    - version: версия данных, по которой выполнено распределение
+    """
+    def __init__(self, date, enrolled, queue=None, version=None):
+        self.date = date
+        self.enrolled = enrolled
+        self.queue = queue
+        self.version = version
+        self.placement = {
+            app.id: code
+            for code, applicants in enrolled.items()
+            for app in applicants
+        }
+
+    def count(self, program_code):
+        return len(self.enrolled[program_code])
+
+    def passing_score(self, program_code):
+        """
+        Балл последнего зачисленного или None (НЕДОБОР), если места не заполнены
+        """
+        seats = PROGRAMS[program_code]['seats']
+        enrolled_list = self.enrolled[program_code]
+        if len(enrolled_list) >= seats:
+            return enrolled_list[seats - 1].total_score
+        return None
+
+    def passing_scores(self):
+        return {code: self.passing_score(code) for code in PROGRAMS}
+
+
+class Queue:
+    """
+    Очередь абитуриентов с согласием и состояние распределения
+
+    Строка - абитуриент в порядке очереди (по убыванию максимального балла,
+    при равенстве - по возрастанию id), столбец - его заявления по приоритету.
+    Пустые ячейки и последний столбец ссылаются на фиктивную программу
+    с номером len(seats) - "не зачислен".
+
+    - pointer: столбец заявления, по которому абитуриент зачислен
+    - chosen: номер программы зачисления (len(seats) - не зачислен)
+    """
+    def __init__(self, ids, best, programs, priorities, totals, seats):
+        self.ids = ids
+        self.best = best
+        self.programs = programs
+        self.priorities = priorities
+        self.totals = totals
+        self.seats = seats
+        self.pointer = np.zeros(len(ids), dtype=np.int64)
+        self.chosen = np.full(len(ids), len(seats), dtype=programs.dtype)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def get_version(date):
+    """
+    Текущая версия данных за дату (0, если дата ни разу не менялась)
+    """
+    record = db.session.get(DataVersion, date)
+    return record.version if record else 0
+
+
+def get_result_version(date):
+    """
+    Версия результатов за дату: (версия данных, номер расчета)
+    
+    Меняется при загрузке и удалении списка и при каждом расчете проходных
+    баллов - ключ кэша результатов страниц (result_cache.py).
+    """
+    record = db.session.get(DataVersion, date)
+    return (record.version, record.calculation) if record else (0, 0)
+
+
+def bump_calculation(date):
+    """
+    Увеличивает номер расчета за дату в текущей транзакции (фиксирует
+    вызывающий код вместе с результатами расчета)
+    """
+    record = db.session.get(DataVersion, date)
+    if record is None:
+        record = DataVersion(upload_date=date, version=0, calculation=0)
+        db.session.add(record)
+    record.calculation = (record.calculation or 0) + 1
+
+
+def get_archive(date):
+    """
+    Архив даты (archive.py) для текущей версии данных или None
+    """
+    return open_archive(date, get_version(date), PROGRAM_CODES)
+
+
+def bump_version(date, changed_ids=None):
+    """
+    Увеличивает версию данных за дату - все результаты, посчитанные по
+    предыдущей версии, перестают использоваться
+
+    changed_ids - id абитуриентов, чьи заявления изменились (если известны).
+    Тогда распределение, запомненное для предыдущей версии, обновляется
+    пошагово, а не пересчитывается при следующем обращении.
+    """
+    # Архив даты записан по прежнему списку
+    remove_archive(date)
+    record = db.session.get(DataVersion, date)
+    if record:
+        previous = record.version
+        record.version += 1
+        record.updated_at = datetime.utcnow()
+    else:
+        previous = 0
+        record = DataVersion(upload_date=date, version=1)
+        db.session.add(record)
+    version = record.version
+    db.session.commit()
+
+    with _lock:
+        cached = _cache.pop(date, None)
+
+    incremental = (
+        Config.ALLOCATION_INCREMENTAL
+        and Config.ALLOCATION_ENGINE == 'greedy'
+        and changed_ids is not None
+        and len(changed_ids) <= Config.ALLOCATION_INCREMENTAL_LIMIT
+        and cached is not None
+        and cached[0] == previous
+        and cached[1].queue is not None
+    )
+    if incremental:
+        remember(date, version, update_allocation(cached[1], changed_ids))
+
+
+def load_columns(date, consent_only=True, ids=None, connection=None):
+    """
+    Загружает заявления за дату в массивы NumPy
+
+    Берутся только нужные для распределения столбцы; код программы
+    заменяется номером в PROGRAM_INDEX. ids - загрузить только заявления
+    этих абитуриентов; connection - соединение для чтения (по умолчанию
+    сессия приложения). Возвращает словарь
+    {'id', 'program', 'priority', 'total_score', 'has_consent'}.
+
+    Заархивированная дата читается из архива, а не из БД.
+    """
+    archive = get_archive(date) if connection is None else None
+    if archive:
+        columns = archive['columns']
+        rows = np.ones(len(columns['id']), dtype=bool)
+        if consent_only:
+            rows &= columns['has_consent']
+        if ids is not None:
+            rows &= np.isin(columns['id'], np.asarray(list(ids), dtype=np.int64))
+        return {name: columns[name][rows].astype(np.int64) for name in COLUMNS}
+
+    query = columns_query(date, consent_only, ids, connection)
+
+    # Значения строк читаются в плоский массив без промежуточных списков
+    rows = (connection or db.session).execute(query)
+    data = np.fromiter(chain.from_iterable(rows), dtype=np.int64).reshape(-1, len(COLUMNS))
+    return {name: data[:, i].copy() for i, name in enumerate(COLUMNS)}
+
+
+def columns_query(date, consent_only=True, ids=None, connection=None):
+    """
+    Запрос столбцов COLUMNS для load_columns
+    """
+    table = Applicant.__table__
+    query = select(
+        table.c.id,
+        program_case(table.c.program_id, PROGRAM_INDEX, else_=-1, connection=connection),
+        table.c.priority,
+        table.c.total_score,
+        table.c.has_consent
+    ).where(table.c.date_id == date_id(date, connection))
+    if consent_only:
+        query = query.where(table.c.has_consent == True)
+    if ids is not None:
+        query = query.where(table.c.id.in_([int(applicant_id) for applicant_id in ids]))
+    return query
+
+
+def seat_counts():
+    """
+    Массив числа мест, индексированный номером программы
+    """
+    return np.array([PROGRAMS[code]['seats'] for code in PROGRAM_CODES], dtype=np.int64)
+
+
+def build_queue(columns, seats):
+    """
+    Строит очередь (Queue) из заявлений с согласием; распределение не выполняется
+    """
+    rows = np.flatnonzero((columns['has_consent'] != 0) & (columns['program'] >= 0))
+    ids = columns['id'][rows]
+    program = columns['program'][rows]
+    priority = columns['priority'][rows]
+    total = columns['total_score'][rows]
+    none = len(seats)
+
+    if not len(rows):
+        empty = np.full((0, 1), none, dtype=np.int16)
+        return Queue(ids, total, empty, empty.copy(), np.zeros((0, 1), dtype=np.int64), seats)
+
+    # Заявления каждого абитуриента подряд, по приоритету
+    order = sort_order(ids, priority, -total, program)
+    ids_sorted = ids[order]
+    is_start = np.r_[True, ids_sorted[1:] != ids_sorted[:-1]]
+    starts = np.flatnonzero(is_start)
+    lengths = np.diff(np.append(starts, len(order)))
+
+    # Очередь абитуриентов: по убыванию максимального балла, затем по id
+    best = np.maximum.reduceat(total[order], starts)
+    queue = sort_order(-best, ids_sorted[starts])
+    rank = np.empty(len(queue), dtype=np.int64)
+    rank[queue] = np.arange(len(queue))
+
+    # Матрицы заявлений: строка - место в очереди, столбец - номер по приоритету
+    applicant_rank = np.repeat(rank, lengths)
+    slot = np.arange(len(order)) - np.repeat(starts, lengths)
+    shape = (len(queue), lengths.max() + 1)
+    programs = np.full(shape, none, dtype=np.int16)
+    programs[applicant_rank, slot] = program[order]
+    priorities = np.zeros(shape, dtype=np.int16)
+    priorities[applicant_rank, slot] = priority[order]
+    totals = np.zeros(shape, dtype=np.int64)
+    totals[applicant_rank, slot] = total[order]
+
+    return Queue(ids_sorted[starts][queue], best[queue], programs, priorities, totals, seats)
+
+
+def cascade(programs, seats):
+    """
+    Распределяет места seats между абитуриентами programs (строки в порядке очереди)
+
+    Каждый абитуриент зачисляется на первую по приоритету программу, в которой
+    на момент его очереди есть свободные места. Вместо прохода по абитуриентам
+    вычисляются моменты заполнения программ: пока ни одна программа не закрыта,
+    все выбирают первый приоритет; программа, раньше других набравшая seats
+    заявлений, закрывается на этом месте очереди, и только абитуриенты после
+    него переходят к следующему приоритету. Шагов не больше, чем программ.
+
+    Возвращает (pointer, chosen) - столбец и номер программы зачисления.
+    """
+    none = len(seats)
+
+    # Место очереди, после которого программа заполнена; программы без мест закрыты сразу
+    open_mark = np.iinfo(np.int64).max
+    closed_at = np.append(np.where(seats > 0, open_mark, -1), open_mark)
+
+    pointer = np.zeros(len(programs), dtype=np.int64)
+    chosen = programs[:, 0].copy()
+
+    def advance(applicants):
+        # Абитуриенты, чья программа закрыта к их очереди, переходят к следующему приоритету
+        while len(applicants):
+            applicants = applicants[applicants > closed_at[chosen[applicants]]]
+            pointer[applicants] += 1
+            chosen[applicants] = programs[applicants, pointer[applicants]]
+
+    advance(np.arange(len(programs)))
+    while True:
+        # Место очереди, на котором каждая открытая программа набирает все места
+        fill = np.full(none, open_mark)
+        accepted = {}
+        for code in np.flatnonzero(closed_at[:none] == open_mark):
+            accepted[code] = np.flatnonzero(chosen == code)
+            if len(accepted[code]) >= seats[code]:
+                fill[code] = accepted[code][seats[code] - 1]
+
+        # Раньше всех заполненная программа закрывается окончательно
+        code = np.argmin(fill)
+        if fill[code] == open_mark:
+            break
+        closed_at[code] = fill[code]
+        advance(accepted[code][seats[code]:])
+
+    return pointer, chosen
+
+
+def replay(queue, start=0):
+    """
+    Повторяет распределение с места очереди start; места до start не меняются
+
+    Очередь обходится окнами растущего размера с остатком мест после
+    предыдущих окон; когда все места заняты, остальные абитуриенты
+    не рассматриваются.
+    """
+    none = len(queue.seats)
+    queue.pointer[start:] = 0
+    queue.chosen[start:] = none
+
+    taken = queue.chosen[:start]
+    seats_left = queue.seats - np.bincount(taken[taken != none], minlength=none)
+
+    position, window = start, REPLAY_WINDOW
+    while position < len(queue) and (seats_left > 0).any():
+        end = min(len(queue), position + window)
+        pointer, chosen = cascade(queue.programs[position:end], seats_left)
+        queue.pointer[position:end] = pointer
+        queue.chosen[position:end] = chosen
+        seats_left = seats_left - np.bincount(chosen[chosen != none], minlength=none)
+        position, window = end, window * 4
+    return queue
+
+
+def deferred_acceptance(queue):
+    """
+    Распределение отложенным принятием (заявления подают абитуриенты)
+
+    Абитуриент подает заявление на следующую по приоритету программу;
+    программа держит не больше seats лучших заявлений в куче с минимумом
+    наверху (сумма баллов в этом заявлении, при равенстве выше меньший id).
+    Если программа заполнена и новое заявление лучше худшего, худшее
+    вытесняется и его абитуриент подает следующее заявление. Каждое
+    заявление рассматривается не больше одного раза - O(n log seats).
+
+    Абитуриенты подают заявления в порядке очереди; когда все программы
+    заполнены, а максимальный балл следующего абитуриента ниже худшего
+    зачисленного во всех программах, остальные не рассматриваются. Строки
+    очереди переводятся в списки Python окнами растущего размера (как в replay),
+    поэтому нерассмотренная часть очереди не копируется.
+    """
+    none = len(queue.seats)
+    seats = queue.seats.tolist()
+    programs, totals, best, ids = [], [], [], []
+    pointer = [0] * len(queue)
+    window = REPLAY_WINDOW
+
+    heaps = [[] for _ in range(none)]
+    # Программы без мест считаются заполненными сразу
+    full = sum(1 for count in seats if count <= 0)
+
+    for rank in range(len(queue)):
+        if rank == len(ids):
+            end = min(len(queue), rank + window)
+            programs.extend(queue.programs[rank:end].tolist())
+            totals.extend(queue.totals[rank:end].tolist())
+            best.extend(queue.best[rank:end].tolist())
+            ids.extend(queue.ids[rank:end].tolist())
+            window *= 4
+
+        if full == none:
+            lowest = [heaps[code][0][0] for code in range(none) if seats[code] > 0]
+            if not lowest or best[rank] < min(lowest):
+                break
+
+        applicant = rank
+        while applicant is not None:
+            slot = pointer[applicant]
+            code = programs[applicant][slot]
+            if code == none:
+                # Заявления закончились - абитуриент не зачислен
+                break
+            key = (totals[applicant][slot], -ids[applicant], applicant)
+            heap = heaps[code]
+            if len(heap) < seats[code]:
+                heapq.heappush(heap, key)
+                if len(heap) == seats[code]:
+                    full += 1
+                applicant = None
+            elif seats[code] > 0 and key > heap[0]:
+                # Вытесненный абитуриент подает следующее заявление
+                applicant = heapq.heapreplace(heap, key)[2]
+                pointer[applicant] += 1
+            else:
+                pointer[applicant] += 1
+
+    queue.pointer = np.array(pointer, dtype=np.int64)
+    queue.chosen = np.full(len(queue), none, dtype=queue.programs.dtype)
+    for code, heap in enumerate(heaps):
+        ranks = [entry[2] for entry in heap]
+        queue.chosen[ranks] = code
+    return queue
+
+
+# Способы распределения: функция получает Queue и заполняет pointer и chosen
+ENGINES = {
+    'greedy': replay,
+    'deferred_acceptance': deferred_acceptance,
+}
+
+
+def run_engine(queue, engine=None):
+    """
+    Выполняет распределение по очереди способом engine (по умолчанию - из конфигурации)
+    """
+    engine = engine or Config.ALLOCATION_ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"Неизвестный способ распределения: {engine}")
+    return ENGINES[engine](queue)
+
+
+def allocate(columns, seats, engine=None):
+    """
+    Распределяет места среди заявлений с согласием (П.13); возвращает Queue
+    """
+    return run_engine(build_queue(columns, seats), engine)
+
+
+def sort_order(*keys):
+    """
+    Порядок сортировки по нескольким целочисленным ключам (старший - первый)
+
+    Если диапазоны ключей позволяют, ключи упаковываются в одно число int64
+    и сортируются одним argsort - это в разы быстрее np.lexsort. Сочетания
+    ключей должны быть уникальны (порядок равных не гарантируется).
+    """
+    if not len(keys[0]):
+        return np.arange(0)
+
+    lows = [key.min() for key in keys]
+    spans = [int(key.max()) - int(low) + 1 for key, low in zip(keys, lows)]
+    if np.prod([float(span) for span in spans]) >= 2 ** 62:
+        return np.lexsort(keys[::-1])
+
+    packed = np.zeros(len(keys[0]), dtype=np.int64)
+    for key, low, span in zip(keys, lows, spans):
+        packed *= span
+        packed += key - low
+    return np.argsort(packed)
+
+
+def update_queue(queue, changed_ids, columns):
+    """
+    Новая очередь после изменения заявлений абитуриентов changed_ids
+
+    columns - текущие заявления этих абитуриентов (см. load_columns).
+    Измененные абитуриенты убираются из очереди и вставляются на новые места;
+    распределение повторяется только с первого затронутого места очереди.
+    Исходная очередь не изменяется.
+    """
+    changed = np.unique(np.asarray(list(changed_ids), dtype=np.int64))
+    removed = np.zeros(0, dtype=np.int64)
+    if len(changed) and len(queue):
+        found = np.minimum(np.searchsorted(changed, queue.ids), len(changed) - 1)
+        removed = np.flatnonzero(changed[found] == queue.ids)
+    added = build_queue(columns, queue.seats)
+
+    # Места новых записей в прежней очереди: она упорядочена по (-балл, id)
+    negative_best = -queue.best
+    low = np.searchsorted(negative_best, -added.best, 'left')
+    high = np.searchsorted(negative_best, -added.best, 'right')
+    before = np.array([
+        lo + np.searchsorted(queue.ids[lo:hi], applicant_id)
+        for lo, hi, applicant_id in zip(low.tolist(), high.tolist(), added.ids.tolist())
+    ], dtype=np.int64)
+
+    # Общая ширина матриц заявлений
+    none = len(queue.seats)
+    width = max(queue.programs.shape[1], added.programs.shape[1])
+
+    def widen(matrix, fill):
+        if matrix.shape[1] == width:
+            return matrix
+        padding = np.full((len(matrix), width - matrix.shape[1]), fill, dtype=matrix.dtype)
+        return np.hstack([matrix, padding])
+
+    updated = Queue(
+        splice(queue.ids, removed, before, added.ids),
+        splice(queue.best, removed, before, added.best),
+        splice(widen(queue.programs, none), removed, before, widen(added.programs, none)),
+        splice(widen(queue.priorities, 0), removed, before, widen(added.priorities, 0)),
+        splice(widen(queue.totals, 0), removed, before, widen(added.totals, 0)),
+        queue.seats
+    )
+
+    # До первого удаленного или вставленного абитуриента очередь не изменилась
+    start = len(updated)
+    if len(removed):
+        start = min(start, int(removed[0]))
+    if len(before):
+        start = min(start, int(before[0] - np.searchsorted(removed, before[0])))
+    updated.pointer[:start] = queue.pointer[:start]
+    updated.chosen[:start] = queue.chosen[:start]
+
+    return replay(updated, start)
+
+
+def splice(array, removed, before, values):
+    """
+    Копия array без строк removed и со строками values, вставленными перед
+    строками before (оба набора индексов отсортированы)
+
+    Массив копируется отрезками между изменениями, без масок по всей длине.
+    """
+    pieces = []
+    cursor = 0
+    i = j = 0
+    while i < len(removed) or j < len(before):
+        if j < len(before) and (i == len(removed) or before[j] <= removed[i]):
+            position = before[j]
+            end = j
+            while end < len(before) and before[end] == position:
+                end += 1
+            pieces.append(array[cursor:position])
+            pieces.append(values[j:end])
+            cursor = position
+            j = end
+        else:
+            pieces.append(array[cursor:removed[i]])
+            cursor = removed[i] + 1
+            i += 1
+    pieces.append(array[cursor:])
+    return np.concatenate(pieces)
+
+
+def build_allocation(date, queue):
+    """
+    Собирает Allocation из очереди с выполненным распределением
+    """
+    enrolled = {code: [] for code in PROGRAMS.keys()}
+    ranks = np.flatnonzero(queue.chosen != len(queue.seats))
+    if len(ranks):
+        pointer = queue.pointer[ranks]
+        totals = queue.totals[ranks, pointer]
+
+        # Списки программ - по убыванию баллов, при равенстве в порядке очереди
+        order = np.argsort(-totals, kind='stable')
+        ranks, pointer, totals = ranks[order], pointer[order], totals[order]
+        fields = (
+            queue.ids[ranks].tolist(),
+            queue.programs[ranks, pointer].tolist(),
+            queue.priorities[ranks, pointer].tolist(),
+            totals.tolist(),
+        )
+        for applicant_id, program, priority, total in zip(*fields):
+            code = PROGRAM_CODES[program]
+            enrolled[code].append(EnrolledApplicant(applicant_id, code, priority, total))
+    return Allocation(date, enrolled, queue)
+
+
+def compute_allocation(date):
+    """
+    Распределяет места среди абитуриентов с согласием по данным БД за дату
+    """
+    return build_allocation(date, allocate(load_columns(date), seat_counts()))
+
+
+def update_allocation(allocation, changed_ids):
+    """
+    Пошаговое обновление распределения после изменения заявлений changed_ids
+
+    При Config.ALLOCATION_VERIFY результат сверяется с полным пересчетом;
+    при расхождении выводится предупреждение и используется полный пересчет.
+    """
+    date = allocation.date
+    columns = load_columns(date, ids=changed_ids)
+    result = build_allocation(date, update_queue(allocation.queue, changed_ids, columns))
+
+    if Config.ALLOCATION_VERIFY:
+        full = compute_allocation(date)
+        if full.enrolled != result.enrolled:
+            print(f"ВНИМАНИЕ: пошаговое распределение за {date} расходится с полным пересчетом")
+            return full
+
+    return result
+
+
+def remember(date, version, allocation):
+    allocation.version = version
+    with _lock:
+        _cache[date] = (version, allocation)
+        _cache.move_to_end(date)
+        while len(_cache) > Config.ALLOCATION_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def get_allocation(date):
+    """
+    Распределение мест за дату; пересчитывается только при смене версии данных
+    """
+    version = get_version(date)
+    with _lock:
+        cached = _cache.get(date)
+        if cached and cached[0] == version:
+            _cache.move_to_end(date)
+            return cached[1]
+
+    allocation = compute_allocation(date)
+    remember(date, version, allocation)
+    return allocation
+
+
+def save_enrollment(allocation):
+    """
+    Записывает распределение в таблицу enrollments одним пакетом
+
+    Прежние строки за дату удаляются. Транзакцию фиксирует вызывающий код
+    (вместе с проходными баллами).
+    """
+    table = Enrollment.__table__
+    date_key = date_id(allocation.date)
+    ids = program_ids()
+    db.session.execute(table.delete().where(table.c.date_id == date_key))
+    rows = [
+        {
+            'date_id': date_key,
+            'applicant_id': app.id,
+            'program_id': ids[code],
+            'rank': rank,
+            'status': ENROLLED,
+            'version': allocation.version,
+        }
+        for code, applicants in allocation.enrolled.items()
+        for rank, app in enumerate(applicants, 1)
+    ]
+    if rows:
+        db.session.execute(table.insert(), rows)
+
+    # Отметка о сохранении - и для распределения без зачисленных
+    record = db.session.get(DataVersion, allocation.date)
+    if record is None:
+        record = DataVersion(upload_date=allocation.date, version=allocation.version, calculation=0)
+        db.session.add(record)
+    record.enrollment_version = allocation.version
+
+
+def enrollment_saved(date, version):
+    """
+    Сохранено ли в enrollments распределение за дату по версии данных version
+    """
+    record = db.session.get(DataVersion, date)
+    return record is not None and record.enrollment_version == version
@@ -1,18 +1,55 @@
-from flask import Flask, render_template, request, redirect, url_for, send_file, flash
+from flask import Flask, Request, render_template, request, redirect, url_for, send_file, flash, current_app, jsonify
 from config import Config
 from models import db
+from database import init_engines
+from migrations import migrate
+from ingest import remove_hash
+from allocation import bump_version
+from snapshots import remove_snapshot
+from dimensions import date_id, sync_programs
+from catalog import dataset_dates, display_dates, latest_date, remove_dataset, selected_date
 from services import (
-    get_all_applicants,
+    get_applicants_page,
     get_program_applicants,
+    page_size_value,
+    parse_filters,
     calculate_passing_scores,
     upload_competition_list,
     get_statistics,
     get_report_dates,
     generate_pdf_report,
-    get_csv_files,
+    passing_scores_message,
+    prepare_date,
+    preparing_dates,
     PROGRAMS
 )
+from parsing import MAX_PRIORITY
+from jobs import get_job, init_jobs, submit_upload
+from simulation import EXAMPLE_SCENARIOS, parse_scenarios, seat_sweep, simulate
+from recalculate import recalculate_dates, recalculation_message
+from datetime import datetime
+import json
 import os
+import shutil
+import tempfile
+
+
+# Маршруты загрузки списков, на которые не распространяется MAX_CONTENT_LENGTH
+INGEST_ENDPOINTS = {'upload'}
+
+
+class IngestRequest(Request):
+    """
+    Запрос, для маршрутов загрузки использующий INGEST_MAX_CONTENT_LENGTH
+
+    Файл списка разбирается потоково, поэтому общий лимит размера
+    для этих маршрутов не нужен.
+    """
+    @property
+    def max_content_length(self):
+        if self.endpoint in INGEST_ENDPOINTS:
+            return current_app.config['INGEST_MAX_CONTENT_LENGTH']
+        return super().max_content_length
 
 
 def create_app(config_class=Config):
@@ -20,14 +57,23 @@ def create_app(config_class=Config):
     Фабрика приложений Flask
     """
     app = Flask(__name__)
+    app.request_class = IngestRequest
     app.config.from_object(config_class)
     
     # Инициализация базы данных
     db.init_app(app)
     
-    # Создание таблиц БД
+    # Создание таблиц БД и миграции существующих таблиц
     with app.app_context():
+        # Профиль SQLite и пул чтения - до первого соединения
+        init_engines(app, db)
         db.create_all()
+        migrate()
+        # Новые программы из Config.PROGRAMS - в справочник
+        with db.engine.begin() as connection:
+            sync_programs(connection)
+        # Таблица состояния фоновых задач
+        init_jobs()
         
         # Создание необходимых директорий
         if not os.path.exists(app.config['DATA_DIR']):
@@ -41,6 +87,15 @@ def create_app(config_class=Config):
 app = create_app()
 
 
+@app.context_processor
+def preparing_notice():
+    """
+    Даты, которые готовятся фоновой задачей (services.prepare_date), - для
+    сообщения на странице
+    """
+    return {'preparing': [date.replace('_', '.') for date in preparing_dates()]}
+
+
 @app.route("/", methods=["GET"])
 def index():
     """
@@ -50,42 +105,49 @@ def index():
     - Единый список всех абитуриентов с каскадом приоритетов
     - Возможности сортировки и фильтрации
     - Время перестроения не должно превышать 3 секунды
+    
+    Список выводится постранично (per_page строк, курсоры after/before)
     """
-    selected_file = request.args.get("file")
+    # Дата и список дат для выбора - из каталога загруженных списков
+    selected_file = selected_date(request.args.get("file"))
     sort_by = request.args.get("sort_by", "total_score")
     order = request.args.get("order", "desc")
-    program_filter = request.args.get("program_filter", "all")
-    
-    files = get_csv_files()
-    if selected_file not in [f.replace('.csv', '').replace('_', '.') for f in files]:
-        latest_file = files[-1].replace('.csv', '').replace('_', '.') if files else None
-        selected_file = latest_file
+    per_page = page_size_value(request.args.get("per_page"))
+    try:
+        filters = parse_filters(request.args, "program_filter")
+    except ValueError as e:
+        flash(str(e), "error")
+        filters = {}
     
     safe_date = selected_file.replace('.', '_') if selected_file else None
     
-    # Получаем всех абитуриентов
-    applicants = get_all_applicants(safe_date, sort_by, order)
-    
-    # Фильтрация по программе
-    if program_filter != "all":
-        applicants = [a for a in applicants if a['program_code'] == program_filter]
+    # Страница абитуриентов; фильтры выполняются в запросе
+    try:
+        page = get_applicants_page(
+            safe_date, filters, sort_by, order, per_page,
+            request.args.get("after"), request.args.get("before")
+        )
+    except ValueError as e:
+        flash(str(e), "error")
+        page = get_applicants_page(safe_date, filters, sort_by, order, per_page)
     
     stats = get_statistics(safe_date)
     
-    # Форматируем список файлов для отображения
-    formatted_files = [f.replace('.csv', '').replace('_', '.') for f in files]
-    
     return render_template(
         "index.html",
-        applicants=applicants,
+        applicants=page["applicants"],
+        page=page,
+        page_sizes=app.config['PAGE_SIZES'],
         total_applicants=stats["total_applicants"],
         with_consent=stats["with_consent"],
         last_update=stats["last_update"],
-        files=formatted_files,
+        files=display_dates(),
         selected_file=selected_file,
-        sort_by=sort_by,
-        order=order,
-        program_filter=program_filter,
+        sort_by=page["sort_by"],
+        order=page["order"],
+        program_filter=filters.get("program", "all"),
+        filters=filters,
+        max_priority=MAX_PRIORITY,
         programs=PROGRAMS
     )
 
@@ -100,25 +162,34 @@ def program_page(code):
     - Проходной балл
     - Количество мест
     - Возможности сортировки
+    
+    Список выводится постранично (per_page строк, курсоры after/before)
     """
     if code not in PROGRAMS:
         flash("Неверный код программы", "error")
         return redirect(url_for("index"))
     
-    selected_file = request.args.get("file")
+    # Дата и список дат для выбора - из каталога загруженных списков
+    selected_file = selected_date(request.args.get("file"))
     sort_by = request.args.get("sort_by", "total_score")
     order = request.args.get("order", "desc")
-    
-    files = get_csv_files()
-    if selected_file not in [f.replace('.csv', '').replace('_', '.') for f in files]:
-        latest_file = files[-1].replace('.csv', '').replace('_', '.') if files else None
-        selected_file = latest_file
+    per_page = page_size_value(request.args.get("per_page"))
+    try:
+        filters = parse_filters(request.args)
+    except ValueError as e:
+        flash(str(e), "error")
+        filters = {}
     
     safe_date = selected_file.replace('.', '_') if selected_file else None
     
-    program_data = get_program_applicants(code, safe_date, sort_by, order)
-    
-    formatted_files = [f.replace('.csv', '').replace('_', '.') for f in files]
+    try:
+        program_data = get_program_applicants(
+            code, safe_date, sort_by, order, per_page,
+            request.args.get("after"), request.args.get("before"), filters
+        )
+    except ValueError as e:
+        flash(str(e), "error")
+        program_data = get_program_applicants(code, safe_date, sort_by, order, per_page, filters=filters)
     
     return render_template(
         "program.html",
@@ -126,11 +197,16 @@ def program_page(code):
         program_name=program_data["name"],
         seats=program_data["seats"],
         passing_score=program_data["passing_score"],
+        enrolled_count=program_data.get("enrolled_count", 0),
         applicants=program_data["applicants"],
-        files=formatted_files,
+        page=program_data,
+        page_sizes=app.config['PAGE_SIZES'],
+        filters=program_data["filters"],
+        max_priority=MAX_PRIORITY,
+        files=display_dates(),
         selected_file=selected_file,
-        sort_by=sort_by,
-        order=order
+        sort_by=program_data["sort_by"],
+        order=program_data["order"]
     )
 
 
@@ -155,14 +231,53 @@ def upload():
         flash("Можно загружать только CSV файлы", "error")
         return redirect(url_for("index"))
     
+    if app.config['INGEST_BACKGROUND']:
+        # Сохраняем файл и ставим загрузку в очередь - запрос не ждет ее окончания
+        safe_date = date.replace('.', '_').strip()
+        fd, path = tempfile.mkstemp(suffix='.upload', dir=app.config['DATA_DIR'])
+        with os.fdopen(fd, 'wb') as f:
+            shutil.copyfileobj(file.stream, f, app.config['INGEST_CHUNK_SIZE'])
+        
+        job = submit_upload(app, path, safe_date)
+        return redirect(url_for("job_page", job_id=job.id))
+    
     try:
         upload_competition_list(file, date)
+        # Распределение и проходные баллы - сразу после загрузки: страницы
+        # (GET-запросы) ничего не записывают в БД
+        prepare_date(date.replace('.', '_').strip())
     except Exception as e:
         flash(f"Ошибка при загрузке: {str(e)}", "error")
     
     return redirect(url_for("index"))
 
 
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """
+    Ход выполнения фоновой задачи в формате JSON
+    """
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Задача не найдена'}), 404
+    
+    job['follow_up_job'] = get_job(job['follow_up']) if job['follow_up'] else None
+    return jsonify(job)
+
+
+@app.route("/jobs/<job_id>/view", methods=["GET"])
+def job_page(job_id):
+    """
+    Страница хода выполнения фоновой задачи
+    """
+    job = get_job(job_id)
+    if job is None:
+        flash("Задача не найдена", "error")
+        return redirect(url_for("index"))
+    
+    return render_template("job.html", job=job)
+
+
 @app.route("/calculate", methods=["POST"])
 def calculate():
     """
@@ -174,31 +289,44 @@ def calculate():
     
     Отображает результаты в графическом интерфейсе
     """
-    selected_file = request.form.get("file")
-    
-    files = get_csv_files()
-    if selected_file not in [f.replace('.csv', '').replace('_', '.') for f in files]:
-        latest_file = files[-1].replace('.csv', '').replace('_', '.') if files else None
-        selected_file = latest_file
+    selected_file = selected_date(request.form.get("file"))
     
     safe_date = selected_file.replace('.', '_') if selected_file else None
     
     try:
         results = calculate_passing_scores(safe_date)
-        msg_list = []
-        
-        for code, score in results.items():
-            program_name = PROGRAMS[code]["name"]
-            score_text = f"{score}" if score else "НЕДОБОР"
-            msg_list.append(f"{program_name}: {score_text}")
-        
-        flash("Проходные баллы рассчитаны:<br>" + "<br>".join(msg_list), "success")
+        flash(passing_scores_message(results), "success")
     except Exception as e:
         flash(f"Ошибка при расчете: {str(e)}", "error")
     
     return redirect(url_for("index", file=selected_file))
 
 
+@app.route("/calculate_all", methods=["POST"])
+def calculate_all():
+    """
+    П.13, П.14.c: Пересчет проходных баллов за все загруженные даты
+    
+    Даты распределяются параллельно в отдельных процессах, результаты
+    записываются одной транзакцией - динамика в отчетах полная.
+    """
+    start_time = datetime.now()
+    
+    try:
+        summary = recalculate_dates()
+        elapsed_time = (datetime.now() - start_time).total_seconds()
+        if summary:
+            flash(recalculation_message(summary, elapsed_time), "success")
+        else:
+            flash("Нет загруженных конкурсных списков", "error")
+    except Exception as e:
+        flash(f"Ошибка при пересчете: {str(e)}", "error")
+    
+    if request.form.get("next") == "index":
+        return redirect(url_for("index", file=request.form.get("file")))
+    return redirect(url_for("reports"))
+
+
 @app.route("/reports")
 def reports():
     """
@@ -233,6 +361,116 @@ def report_pdf(date):
         return redirect(url_for("reports"))
 
 
+@app.route("/simulate", methods=["GET", "POST"])
+def simulate_page():
+    """
+    Моделирование распределения мест по сценариям ("что если")
+    
+    Сценарии задаются списком JSON; дополнительно можно перебрать
+    число мест на одной программе. Результаты в БД не записываются.
+    """
+    files = display_dates()
+    selected_file = selected_date(request.values.get("file"))
+    
+    scenarios_text = request.form.get("scenarios") or json.dumps(EXAMPLE_SCENARIOS, ensure_ascii=False, indent=2)
+    sweep = {
+        'program': request.form.get("sweep_program", ""),
+        'start': request.form.get("sweep_start", ""),
+        'stop': request.form.get("sweep_stop", ""),
+        'step': request.form.get("sweep_step", "1"),
+    }
+    result = None
+    error = None
+    
+    if request.method == "POST":
+        try:
+            if not selected_file:
+                raise ValueError("Нет загруженных конкурсных списков")
+            try:
+                data = json.loads(scenarios_text) if scenarios_text.strip() else []
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Ошибка в JSON сценариев: строка {e.lineno}, позиция {e.colno}")
+            if sweep['program']:
+                try:
+                    bounds = [int(sweep[name]) for name in ('start', 'stop', 'step')]
+                except ValueError:
+                    raise ValueError("Диапазон мест задается целыми числами")
+                data = list(data) + seat_sweep(sweep['program'], *bounds)
+            result = simulate(selected_file.replace('.', '_'), parse_scenarios(data))
+        except ValueError as e:
+            error = str(e)
+    
+    return render_template(
+        "simulate.html",
+        files=files,
+        selected_file=selected_file,
+        scenarios_text=scenarios_text,
+        sweep=sweep,
+        result=result,
+        error=error,
+        programs=PROGRAMS
+    )
+
+
+@app.route("/api/simulate", methods=["POST"])
+def simulate_api():
+    """
+    Моделирование сценариев в формате JSON
+    
+    Тело запроса: {"date": "01.08", "scenarios": [...]} (формат сценария -
+    см. simulation.py). Без даты используется последний загруженный список.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Ожидается объект JSON'}), 400
+    
+    date = str(payload.get('date') or latest_date() or '').replace('.', '_')
+    if date not in dataset_dates():
+        return jsonify({'error': 'Нет данных за указанную дату'}), 404
+    
+    try:
+        result = simulate(date, parse_scenarios(payload.get('scenarios')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    result['date'] = date.replace('_', '.')
+    return jsonify(result)
+
+
+@app.route("/api/applicants", methods=["GET"])
+def applicants_api():
+    """
+    Страница конкурсного списка в формате JSON
+    
+    Параметры: date (без даты - последний загруженный список), фильтры
+    (program, consent, priority, min_score, max_score, enrolled, id_prefix -
+    см. services.parse_filters), sort_by, order, per_page, after/before -
+    курсоры из next_cursor и prev_cursor предыдущего ответа (как на
+    страницах списков).
+    """
+    date = str(request.args.get('date') or latest_date() or '').replace('.', '_')
+    if date not in dataset_dates():
+        return jsonify({'error': 'Нет данных за указанную дату'}), 404
+    
+    try:
+        page = get_applicants_page(
+            date, parse_filters(request.args),
+            request.args.get('sort_by', 'total_score'),
+            request.args.get('order', 'desc'),
+            page_size_value(request.args.get('per_page')),
+            request.args.get('after'),
+            request.args.get('before')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    page['date'] = date.replace('_', '.')
+    # Дата готовится фоновой задачей: статусы могут быть еще не рассчитаны
+    page['preparing'] = date in preparing_dates()
+    page['applicants'] = [dict(row._asdict(), upload_date=page['date']) for row in page['applicants']]
+    return jsonify(page)
+
+
 @app.route("/delete_date/<date>", methods=["POST"])
 def delete_date(date):
     """
@@ -242,15 +480,21 @@ def delete_date(date):
         safe_date = date.replace('.', '_')
         
         # Удаляем из БД
-        from models import Applicant, PassingScore
-        Applicant.query.filter_by(upload_date=safe_date).delete()
+        from models import Applicant, PassingScore, Enrollment
+        remove_snapshot(safe_date)
+        date_key = date_id(safe_date)
+        Applicant.query.filter_by(date_id=date_key).delete()
         PassingScore.query.filter_by(upload_date=safe_date).delete()
+        Enrollment.query.filter_by(date_id=date_key).delete()
         db.session.commit()
+        bump_version(safe_date)
+        remove_dataset(safe_date)
         
         # Удаляем CSV файл
         csv_path = os.path.join(app.config['DATA_DIR'], f"{safe_date}.csv")
         if os.path.exists(csv_path):
             os.remove(csv_path)
+        remove_hash(csv_path)
         
         flash(f"Данные за {date} успешно удалены", "success")
     except Exception as e:
@@ -0,0 +1,286 @@
+"""
+Архив закрытых дат приемной кампании в столбцовых файлах NumPy
+
+Список за дату, после которой загружена следующая, больше не меняется.
+Такую дату можно заархивировать (services.archive_date): заявления вместе
+со статусами зачисления записываются в каталог Config.ARCHIVE_DIR/<дата>
+по одному файлу .npy на столбец (целые фиксированной ширины) и манифест
+manifest.json (дата, версия данных, число строк, порядок программ, типы
+столбцов).
+
+Файлы открываются отображением в память (np.load(mmap_mode='r')):
+столбцы читаются без копирования и без построения объектов ORM, а
+процессы приложения (несколько рабочих процессов gunicorn) делят одни и те
+же страницы через кэш ОС. Страницы, отчеты и расчет читают заархивированную
+дату из архива, если его версия совпадает с текущей версией данных
+(data_versions); после загрузки или удаления списка архив удаляется
+(allocation.bump_version), а устаревший архив не используется.
+
+Строки архива упорядочены по убыванию суммы баллов, затем по id. Для
+каждого ключа сортировки страниц при записи сохраняются перестановка строк
+по возрастанию ключа (order_<ключ>.npy) и упорядоченные составные ключи
+(key_<ключ>.npy, ключ одним числом int64 - key_codes): страница выбирается
+двоичным поиском курсора (keyset_page), без сортировки при запросе.
+"""
+
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+import numpy as np
+from config import Config
+
+
+# Столбцы архива и их типы
+COLUMNS = {
+    'id': 'int32',
+    # Номер программы в allocation.PROGRAM_CODES
+    'program': 'int8',
+    'priority': 'int8',
+    'physics_ict_score': 'int16',
+    'russian_score': 'int16',
+    'math_score': 'int16',
+    'extra_score': 'int16',
+    'total_score': 'int16',
+    'has_consent': 'bool',
+    # Программа, на которую зачислен абитуриент (-1 - не зачислен), и место в ее списке
+    'enrolled_program': 'int8',
+    'rank': 'int32',
+}
+
+MANIFEST = 'manifest.json'
+
+# Открытые архивы процесса {дата: архив}
+_archives = {}
+_lock = threading.Lock()
+
+
+def archive_path(date):
+    return os.path.join(Config.ARCHIVE_DIR, date)
+
+
+def key_codes(keys):
+    """
+    Составной ключ строк одним числом int64: порядок чисел - порядок кортежей
+
+    keys - столбцы ключа целых типов; значение столбца сдвигается к
+    неотрицательному и занимает ширину своего типа (в сумме не более 63 бит).
+    """
+    codes = np.zeros(len(keys[0]), dtype=np.int64)
+    bits = 0
+    for column in keys:
+        column = np.asarray(column)
+        width = column.dtype.itemsize * 8
+        bits += width
+        if bits > 63:
+            raise ValueError("Ключ сортировки не помещается в int64")
+        codes = (codes << width) | (column.astype(np.int64) - np.iinfo(column.dtype).min)
+    return codes
+
+
+def cursor_code(cursor, dtypes):
+    """
+    Составной ключ (key_codes) для курсора - кортежа значений ключа
+
+    Значения вне диапазона типа столбца приводятся к его границе.
+    """
+    code = 0
+    for value, dtype in zip(cursor, dtypes):
+        limits = np.iinfo(dtype)
+        code = (code << limits.bits) | (min(max(int(value), limits.min), limits.max) - limits.min)
+    return code
+
+
+def write_archive(date, version, programs, columns, sort_keys):
+    """
+    Записывает столбцы даты в архив и возвращает манифест
+
+    columns - {столбец: массив} для всех COLUMNS; значения приводятся к
+    типам COLUMNS (при выходе за диапазон типа - ValueError). sort_keys -
+    {ключ сортировки: [столбцы ключа]} (целые массивы по всем строкам): для
+    каждого сохраняются перестановка строк и упорядоченные ключи. Файлы
+    пишутся во временный каталог, который затем заменяет прежний архив.
+    """
+    rows = len(columns['id'])
+    arrays = {}
+    for name, dtype in COLUMNS.items():
+        values = np.asarray(columns[name])
+        if len(values) != rows:
+            raise ValueError(f"Столбец {name}: {len(values)} строк вместо {rows}")
+        if np.dtype(dtype).kind == 'i' and rows:
+            limits = np.iinfo(dtype)
+            if values.min() < limits.min or values.max() > limits.max:
+                raise ValueError(f"Столбец {name}: значения не помещаются в {dtype}")
+        arrays[name] = values.astype(dtype)
+
+    orders = {}
+    for name, keys in sort_keys.items():
+        codes = key_codes(keys)
+        order = np.argsort(codes, kind='stable')
+        arrays[f"order_{name}"] = order.astype(np.int32)
+        arrays[f"key_{name}"] = codes[order]
+        orders[name] = [np.asarray(column).dtype.name for column in keys]
+
+    manifest = {
+        'date': date,
+        'version': version,
+        'rows': rows,
+        'programs': list(programs),
+        'columns': COLUMNS,
+        # Ключи сортировки страниц: {ключ: типы столбцов ключа}
+        'orders': orders,
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+    }
+
+    path = archive_path(date)
+    temporary = f"{path}.tmp"
+    shutil.rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+    for name, values in arrays.items():
+        np.save(os.path.join(temporary, f"{name}.npy"), values)
+    with open(os.path.join(temporary, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    # Открытые отображения прежних файлов остаются действительными
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(temporary, path)
+    with _lock:
+        _archives.pop(date, None)
+    return manifest
+
+
+def read_manifest(date):
+    """
+    Манифест архива даты (None - дата не заархивирована)
+    """
+    try:
+        with open(os.path.join(archive_path(date), MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def open_archive(date, version, programs):
+    """
+    Архив даты для версии данных version: {'manifest', 'columns', 'orders'}
+
+    Столбцы - массивы, отображенные в память; orders - {ключ сортировки:
+    (перестановка, упорядоченные ключи)}. None - архива нет, он записан по
+    другой версии данных, другому составу программ или без перестановок
+    (прежний формат - дату нужно заархивировать заново).
+    """
+    with _lock:
+        archive = _archives.get(date)
+    if archive and archive['manifest']['version'] == version:
+        return archive
+
+    manifest = read_manifest(date)
+    if (
+        not manifest
+        or manifest['version'] != version
+        or manifest['programs'] != list(programs)
+        or 'orders' not in manifest
+    ):
+        return None
+
+    path = archive_path(date)
+
+    def load(name):
+        return np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+
+    try:
+        columns = {name: load(name) for name in COLUMNS}
+        orders = {name: (load(f"order_{name}"), load(f"key_{name}")) for name in manifest['orders']}
+    except FileNotFoundError:
+        # Архив заменяется другим процессом
+        return None
+    archive = {'manifest': manifest, 'columns': columns, 'orders': orders}
+    with _lock:
+        _archives[date] = archive
+    return archive
+
+
+def remove_archive(date):
+    """
+    Удаляет архив даты (список изменен или удален)
+    """
+    with _lock:
+        _archives.pop(date, None)
+    shutil.rmtree(archive_path(date), ignore_errors=True)
+
+
+def archived_dates():
+    """
+    Манифесты всех архивов по порядку дат
+    """
+    if not os.path.exists(Config.ARCHIVE_DIR):
+        return []
+    manifests = [read_manifest(name) for name in sorted(os.listdir(Config.ARCHIVE_DIR))]
+    return [manifest for manifest in manifests if manifest]
+
+
+def keyset_page(order, codes, dtypes, mask=None, descending=True, after=None, before=None, size=None):
+    """
+    Страница строк архива по ключу сортировки (как keyset-запрос к БД)
+
+    order, codes - перестановка строк по возрастанию ключа и упорядоченные
+    составные ключи (сохранены при записи архива), dtypes - типы столбцов
+    ключа; mask - строки списка (None - все). Курсор after или before
+    (кортеж значений ключа) находится двоичным поиском, страница - size
+    строк после after или перед before. Возвращает (номера строк страницы,
+    смещение, строк в списке).
+    """
+    # Позиции строк списка в упорядоченном архиве (None - все строки)
+    positions = None if mask is None else np.flatnonzero(np.asarray(mask)[order])
+    total = len(order) if positions is None else len(positions)
+
+    def below(cursor, side):
+        # Строк списка с ключом меньше курсора (side='right' - не больше)
+        position = int(np.searchsorted(codes, cursor_code(cursor, dtypes), side))
+        return position if positions is None else int(np.searchsorted(positions, position))
+
+    # Границы страницы в порядке списка: после курсора - строки дальше по
+    # порядку, перед курсором - строки строго до него
+    start, stop = 0, total
+    if before is not None:
+        stop = total - below(before, 'right') if descending else below(before, 'left')
+        if size:
+            start = max(stop - size, 0)
+    else:
+        if after is not None:
+            start = total - below(after, 'left') if descending else below(after, 'right')
+        if size:
+            stop = min(start + size, total)
+    stop = max(stop, start)
+
+    # Порядок списка по убыванию - перестановка, прочитанная с конца
+    low, high = (total - stop, total - start) if descending else (start, stop)
+    rows = np.asarray(order[low:high] if positions is None else order[positions[low:high]], dtype=np.int64)
+    if descending:
+        rows = rows[::-1]
+    # У пустой страницы смещение 0 - как у запроса к БД
+    return rows, (start if len(rows) else 0), total
+
+
+def statuses(columns, rows):
+    """
+    Статусы зачисления строк - как в services.applicants_with_status
+    """
+    enrolled = np.asarray(columns['enrolled_program'][rows])
+    status = np.where(
+        enrolled == np.asarray(columns['program'][rows]), 'enrolled',
+        np.where(enrolled >= 0, 'elsewhere',
+                 np.where(np.asarray(columns['has_consent'][rows]), 'waiting', 'not_enrolled'))
+    )
+    return status.tolist()
+
+
+def enrolled_rows(columns, program):
+    """
+    Строки зачисленных на программу (номер) в порядке мест в списке
+    """
+    rows = np.flatnonzero(
+        (np.asarray(columns['enrolled_program']) == program) & (np.asarray(columns['program']) == program)
+    )
+    return rows[np.argsort(columns['rank'][rows], kind='stable')]
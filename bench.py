@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+"""
+Бенчмарк бизнес-логики относительно требований по времени (п.3, п.12)
+
+Для каждого масштаба (число строк в списке) во временной папке создается
+отдельная БД SQLite и набор данных generate.py, после чего замеряются:
+upload_competition_list, get_all_applicants, get_applicants_page (одна
+страница, без кэша результатов и из него), get_program_applicants,
+calculate_passing_scores, allocation.allocate (каждым способом распределения
+из allocation.ENGINES), get_enrolled_applicants и generate_pdf_report.
+Результаты пишутся в JSON.
+
+Использование:
+    python bench.py                                   # 5k, 50k, 500k строк
+    python bench.py --scales 5000 50000 --output bench.json
+    python bench.py --baseline baseline.json          # сравнение с эталоном
+    python bench.py --results bench.json --baseline baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+
+# Требования по времени из README (секунды)
+BUDGETS = {
+    'upload_competition_list': 5.0,
+    'get_all_applicants': 3.0,
+    'get_program_applicants': 3.0,
+}
+
+# Дата, под которой загружается набор данных
+BENCH_DATE = '01_08'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Бенчмарк конкурсных списков")
+    parser.add_argument("--scales", type=int, nargs="+", default=[5000, 50000, 500000],
+                        help="размеры списков в строках")
+    parser.add_argument("--repeat", type=int, default=3, help="повторов каждого замера")
+    parser.add_argument("--seed", type=int, default=42, help="зерно генератора данных")
+    parser.add_argument("--output", default="bench_results.json", help="файл результатов")
+    parser.add_argument("--baseline", help="эталонные результаты для сравнения")
+    parser.add_argument("--results", help="не запускать замеры, а сравнить готовые результаты")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="допустимое замедление относительно эталона (доля)")
+    parser.add_argument("--noise", type=float, default=0.01,
+                        help="разница в секундах, которая не считается регрессией")
+    parser.add_argument("--keep", action="store_true", help="не удалять временную папку")
+    return parser.parse_args()
+
+
+def measure(func, repeat):
+    """
+    Замеряет func() repeat раз; возвращает минимум и медиану в секундах
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return {'min': min(samples), 'median': statistics.median(samples), 'samples': len(samples)}
+
+
+def generate_dataset(scale, seed, output):
+    """
+    Генерирует два дня списков примерно по scale строк; возвращает пути к файлам
+    """
+    import generate
+
+    # В среднем (min + max) / 2 программ на абитуриента
+    gen_args = generate.parse_args(["--seed", str(seed), "--days", "2", "--first-day-share", "1.0",
+                                    "--output", str(output)])
+    gen_args.applicants = max(1, round(scale * 2 / (gen_args.min_programs + gen_args.max_programs)))
+
+    output.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for day, date in enumerate(generate.campaign_dates(gen_args.start_date, gen_args.days)):
+        filepath, _, _ = generate.write_day(gen_args, date, day, output)
+        paths.append(filepath)
+    return paths
+
+
+def run_scale(create_app, config_class, scale, args, workdir):
+    """
+    Замеры для одного масштаба в отдельной папке и БД
+    """
+    from werkzeug.datastructures import FileStorage
+    from config import Config
+    from allocation import ENGINES, allocate, load_columns, seat_counts
+    from result_cache import clear_results
+    from services import (
+        upload_competition_list,
+        get_all_applicants,
+        get_applicants_page,
+        get_program_applicants,
+        calculate_passing_scores,
+        get_enrolled_applicants,
+        generate_pdf_report,
+        get_statistics
+    )
+
+    scale_dir = workdir / str(scale)
+    scale_dir.mkdir()
+    first_day, second_day = generate_dataset(scale, args.seed, scale_dir / "source")
+
+    class BenchConfig(config_class):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{scale_dir / 'bench.db'}"
+        INGEST_BACKGROUND = False
+
+    # DATA_DIR задан относительным путем - работаем из папки масштаба
+    previous_dir = os.getcwd()
+    os.chdir(scale_dir)
+    try:
+        app = create_app(BenchConfig)
+        timings = {}
+
+        def upload(path):
+            with app.test_request_context(), open(path, 'rb') as f:
+                upload_competition_list(FileStorage(stream=f, filename='list.csv'), BENCH_DATE)
+
+        with app.app_context():
+            # Первая загрузка в пустую БД и повторная загрузка следующего дня (изменения)
+            timings['upload_competition_list'] = measure(lambda: upload(first_day), 1)
+            rows = get_statistics(BENCH_DATE)['total_applicants']
+
+            program_code = next(iter(Config.PROGRAMS))
+            seats = Config.PROGRAMS[program_code]['seats']
+
+            # Визуализация замеряется без кэша результатов - он очищается перед вызовом
+            timings['get_all_applicants'] = measure(
+                lambda: (clear_results(), get_all_applicants(BENCH_DATE)), args.repeat)
+            timings['get_program_applicants'] = measure(
+                lambda: (clear_results(), get_program_applicants(program_code, BENCH_DATE)), args.repeat)
+            # Одна страница списка, как на главной странице: без кэша и из кэша
+            timings['get_applicants_page'] = measure(
+                lambda: (clear_results(), get_applicants_page(BENCH_DATE, page_size=Config.PAGE_SIZE)), args.repeat)
+            timings['get_applicants_page_cached'] = measure(
+                lambda: get_applicants_page(BENCH_DATE, page_size=Config.PAGE_SIZE), args.repeat)
+            timings['calculate_passing_scores'] = measure(
+                lambda: calculate_passing_scores(BENCH_DATE), args.repeat)
+            # Само распределение мест без чтения из БД и кэша - каждым способом
+            columns = load_columns(BENCH_DATE)
+            for engine in ENGINES:
+                timings[f'allocate_{engine}'] = measure(
+                    lambda: allocate(columns, seat_counts(), engine), args.repeat)
+            timings['get_enrolled_applicants'] = measure(
+                lambda: get_enrolled_applicants(program_code, BENCH_DATE, seats), args.repeat)
+            timings['generate_pdf_report'] = measure(
+                lambda: generate_pdf_report(BENCH_DATE.replace('_', '.')), args.repeat)
+            timings['upload_competition_list_update'] = measure(lambda: upload(second_day), 1)
+    finally:
+        os.chdir(previous_dir)
+
+    over_budget = [
+        name for name, budget in BUDGETS.items()
+        if name in timings and timings[name]['min'] > budget
+    ]
+    return {'rows': rows, 'timings': timings, 'over_budget': over_budget}
+
+
+def run(args):
+    workdir = Path(tempfile.mkdtemp(prefix="bench_"))
+
+    # Конфигурация читает DATABASE_URL при импорте - подменяем ее до импорта приложения,
+    # чтобы рабочая БД не затрагивалась
+    os.environ['DATABASE_URL'] = f"sqlite:///{workdir / 'app.db'}"
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    from app import create_app
+    from config import Config
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+        },
+        'scales': {}
+    }
+
+    try:
+        for scale in args.scales:
+            print(f"Масштаб {scale} строк...")
+            results['scales'][str(scale)] = run_scale(create_app, Config, scale, args, workdir)
+            print_scale(scale, results['scales'][str(scale)])
+    finally:
+        if args.keep:
+            print(f"Временная папка: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return results
+
+
+def print_scale(scale, result):
+    print(f"  строк в БД: {result['rows']}")
+    for name, timing in result['timings'].items():
+        flag = "  ПРЕВЫШЕНИЕ" if name in result['over_budget'] else ""
+        print(f"  {name:<32} {timing['min']:>8.3f} с (медиана {timing['median']:.3f}){flag}")
+
+
+def compare(results, baseline, threshold, noise):
+    """
+    Сравнивает результаты с эталоном; возвращает список регрессий
+    """
+    regressions = []
+    print(f"\n{'Масштаб':<8} {'Функция':<32} {'Эталон':>9} {'Сейчас':>9} {'Изм.':>8}")
+    for scale, result in results['scales'].items():
+        base = baseline.get('scales', {}).get(scale)
+        if not base:
+            continue
+        for name, timing in result['timings'].items():
+            if name not in base['timings']:
+                continue
+            before = base['timings'][name]['min']
+            after = timing['min']
+            change = (after - before) / before if before > 0 else 0.0
+            regressed = after > before * (1 + threshold) and after - before > noise
+            mark = "  РЕГРЕССИЯ" if regressed else ""
+            print(f"{scale:<8} {name:<32} {before:>9.3f} {after:>9.3f} {change:>+8.0%}{mark}")
+            if regressed:
+                regressions.append({'scale': scale, 'function': name, 'baseline': before,
+                                    'current': after, 'change': change})
+    return regressions
+
+
+def main():
+    args = parse_args()
+
+    if args.results:
+        with open(args.results, 'r', encoding='utf-8') as f:
+            results = json.load(f)
+    else:
+        results = run(args)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты записаны в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.noise)
+        if regressions:
+            print(f"\nНайдено регрессий: {len(regressions)}")
+            sys.exit(1)
+        print("\nРегрессий не найдено")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Каталог загруженных конкурсных списков
+
+Маршруты выбирают дату (последний загруженный список) и заполняют список
+дат для выбора по каталогу, а не по содержимому папки data: таблица
+datasets (дата, строк в списке, хеш файла, время загрузки и последнего
+расчета) ведется загрузкой (record_upload), удалением списка
+(remove_dataset) и расчетом проходных баллов (mark_calculated).
+
+Процесс держит копию каталога в памяти вместе с готовым списком дат для
+отображения (дд.мм). Изменения в этом процессе сбрасывают копию сразу,
+изменения других процессов замечаются проверкой состояния каталога (число
+строк и последние времена загрузки и расчета - один запрос к таблице без
+чтения строк) не чаще раза в Config.CATALOG_REFRESH_SECONDS секунд.
+Обращение к каталогу не читает файловую систему.
+
+Порядок дат - по имени (дд_мм), как у файлов в data.
+
+Использование:
+    python init_db.py catalog           - показать каталог
+    python init_db.py catalog --sync    - заполнить каталог заново по папке data
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import delete, func, select
+from config import Config
+from models import db, Dataset, PassingScore, Snapshot
+from ingest import read_hash
+
+
+# Копия каталога в памяти процесса: {'dates', 'display', 'datasets', 'state'}
+_catalog = None
+# Когда состояние каталога в БД последний раз сверялось с копией
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def catalog_state():
+    """
+    Запрос состояния каталога: (строк, последняя загрузка, последний расчет)
+    """
+    return select(func.count(), func.max(Dataset.uploaded_at), func.max(Dataset.calculated_at))
+
+
+def load_catalog():
+    """
+    Копия каталога в памяти процесса (при необходимости - перечитанная из БД)
+    """
+    global _catalog, _checked_at
+    with _lock:
+        catalog = _catalog
+        if catalog is not None and time.monotonic() - _checked_at < Config.CATALOG_REFRESH_SECONDS:
+            return catalog
+
+        state = tuple(db.session.execute(catalog_state()).one())
+        if catalog is None or catalog['state'] != state:
+            records = db.session.execute(select(Dataset.__table__)).mappings().all()
+            datasets = {record['upload_date']: dict(record) for record in records}
+            dates = sorted(datasets)
+            catalog = {
+                'dates': dates,
+                # Даты для выбора в шаблонах - строятся один раз на копию
+                'display': [date.replace('_', '.') for date in dates],
+                'datasets': datasets,
+                'state': state,
+            }
+            _catalog = catalog
+        _checked_at = time.monotonic()
+        return catalog
+
+
+def invalidate_catalog():
+    """
+    Сбрасывает копию каталога - следующее обращение перечитает его из БД
+    """
+    global _catalog
+    with _lock:
+        _catalog = None
+
+
+def dataset_dates():
+    """
+    Даты загруженных списков (дд_мм) по порядку
+    """
+    return load_catalog()['dates']
+
+
+def display_dates():
+    """
+    Даты загруженных списков для отображения (дд.мм) по порядку
+    """
+    return load_catalog()['display']
+
+
+def latest_date():
+    """
+    Дата последнего загруженного списка (дд_мм) или None
+    """
+    dates = dataset_dates()
+    return dates[-1] if dates else None
+
+
+def selected_date(value):
+    """
+    Выбранная дата для отображения (дд.мм): value, если список за нее
+    загружен, иначе последняя загруженная (None - списков нет)
+    """
+    display = display_dates()
+    if value in display:
+        return value
+    return display[-1] if display else None
+
+
+def get_dataset(date):
+    """
+    Запись каталога за дату: {'upload_date', 'rows', 'content_hash',
+    'uploaded_at', 'calculated_at'} или None
+    """
+    return load_catalog()['datasets'].get(date)
+
+
+def record_upload(date, rows, content_hash):
+    """
+    Записывает загруженный список за дату в каталог и фиксирует транзакцию
+    """
+    record = db.session.get(Dataset, date)
+    if record is None:
+        record = Dataset(upload_date=date)
+        db.session.add(record)
+    record.rows = rows
+    record.content_hash = content_hash
+    record.uploaded_at = datetime.utcnow()
+    db.session.commit()
+    invalidate_catalog()
+
+
+def mark_calculated(date):
+    """
+    Отмечает расчет проходных баллов за дату в текущей транзакции
+    (фиксирует вызывающий код вместе с результатами расчета)
+    """
+    record = db.session.get(Dataset, date)
+    if record is not None:
+        record.calculated_at = datetime.utcnow()
+    invalidate_catalog()
+
+
+def remove_dataset(date):
+    """
+    Удаляет список за дату из каталога и фиксирует транзакцию
+    """
+    db.session.execute(delete(Dataset).where(Dataset.upload_date == date))
+    db.session.commit()
+    invalidate_catalog()
+
+
+def sync_catalog(connection, data_dir=None):
+    """
+    Заполняет каталог заново по CSV файлам папки data
+
+    Строк в списке - из хранилища снимков, хеш - из файла .sha256 рядом со
+    списком, время загрузки - время изменения файла, время расчета - по
+    сохраненным проходным баллам. Возвращает число списков в каталоге.
+    """
+    data_dir = data_dir or Config.DATA_DIR
+    names = sorted(os.listdir(data_dir)) if os.path.exists(data_dir) else []
+    dates = [name[:-len('.csv')] for name in names if name.endswith('.csv')]
+
+    rows = dict(connection.execute(select(Snapshot.upload_date, Snapshot.rows)).all())
+    calculated = dict(connection.execute(
+        select(PassingScore.upload_date, func.max(PassingScore.calculated_at))
+        .group_by(PassingScore.upload_date)
+    ).all())
+
+    table = Dataset.__table__
+    connection.execute(table.delete())
+    for date in dates:
+        path = os.path.join(data_dir, f"{date}.csv")
+        connection.execute(table.insert().values(
+            upload_date=date,
+            rows=rows.get(date, 0),
+            content_hash=read_hash(path),
+            uploaded_at=datetime.utcfromtimestamp(os.path.getmtime(path)),
+            calculated_at=calculated.get(date)
+        ))
+    invalidate_catalog()
+    return len(dates)
@@ -11,13 +11,97 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///applicants.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Профиль соединений SQLite (database.py), назначается каждому новому соединению
+    SQLITE_PROFILE = {
+        # Журнал WAL: страницы читают БД, пока загрузка пишет список
+        'journal_mode': 'WAL',
+        # В режиме WAL достаточно синхронизации при контрольных точках
+        'synchronous': 'NORMAL',
+        # Отображение файла БД в память, байт
+        'mmap_size': 256 * 1024 * 1024,
+        # Кэш страниц соединения (отрицательное значение - в КиБ)
+        'cache_size': -32768,
+        # Временные таблицы и сортировки - в памяти
+        'temp_store': 'MEMORY',
+        # Сколько ждать освобождения блокировки записи, мс
+        'busy_timeout': 5000,
+    }
+    # Отдельный пул соединений только для чтения для GET-маршрутов
+    SQLITE_READ_POOL = True
+    SQLITE_READ_POOL_SIZE = 8
+    
     # Папки для данных
     DATA_DIR = 'data'
     REPORTS_DIR = 'reports'
+    # Архив закрытых дат в столбцовых файлах NumPy (archive.py)
+    ARCHIVE_DIR = 'archive'
+    
+    # Постраничный вывод списков: строк на странице по умолчанию и варианты
+    # выбора (наибольший - предел для /api/applicants)
+    PAGE_SIZE = 100
+    PAGE_SIZES = (50, 100, 500, 1000)
+    
+    # Кэш результатов страниц и статистики (result_cache.py): объем в памяти
+    # процесса и общий для рабочих процессов каталог (None - без него)
+    RESULT_CACHE = True
+    RESULT_CACHE_BYTES = 64 * 1024 * 1024
+    RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR') or None
+    RESULT_CACHE_DIR_BYTES = 512 * 1024 * 1024
+    
+    # Каталог загруженных списков (catalog.py): как часто, с, процесс проверяет
+    # изменения каталога другими процессами (0 - при каждом обращении)
+    CATALOG_REFRESH_SECONDS = 1.0
     
     # Максимальный размер файла (5MB)
     MAX_CONTENT_LENGTH = 5 * 1024 * 1024
     
+    # Потоковая загрузка конкурсных списков: файл разбирается блоками
+    # прямо из потока запроса, память не зависит от размера файла
+    INGEST_STREAMING = True
+    INGEST_CHUNK_SIZE = 1024 * 1024
+    INGEST_BATCH_SIZE = 5000
+    # Повторная загрузка даты: сравнивать с сохраненным файлом и писать в БД только изменения
+    INGEST_DELTA = True
+    # Сколько ошибок проверки показывать в отчете о загрузке
+    INGEST_MAX_REPORTED_ERRORS = 20
+    # Загрузка в фоновой задаче: маршрут сразу возвращает страницу с ходом выполнения
+    INGEST_BACKGROUND = True
+    # Потоки пула фоновых задач (SQLite допускает одного писателя)
+    JOB_WORKERS = 1
+    # Сколько завершенных задач помнить
+    JOB_HISTORY = 100
+    # БД состояния фоновых задач, общая для рабочих процессов (None - файл
+    # <основная БД>.jobs.db рядом с основной БД)
+    JOB_DATABASE_URL = os.environ.get('JOB_DATABASE_URL') or None
+    # Как часто, с, записывать ход выполнения задачи в БД задач
+    JOB_PROGRESS_INTERVAL = 0.5
+    # Ограничение размера для маршрута загрузки (None - без ограничения)
+    INGEST_MAX_CONTENT_LENGTH = None
+    # Способ распределения мест: 'greedy' (каскад по очереди) или
+    # 'deferred_acceptance' (отложенное принятие), см. allocation.ENGINES
+    ALLOCATION_ENGINE = os.environ.get('ALLOCATION_ENGINE') or 'greedy'
+    # Число дат, для которых в памяти процесса хранится распределение мест
+    ALLOCATION_CACHE_SIZE = 8
+    # Пошаговый пересчет распределения после загрузки изменений списка
+    ALLOCATION_INCREMENTAL = True
+    # Больше измененных абитуриентов - распределение пересчитывается целиком
+    ALLOCATION_INCREMENTAL_LIMIT = 10000
+    # Сверять пошаговый пересчет с полным (для отладки)
+    ALLOCATION_VERIFY = os.environ.get('ALLOCATION_VERIFY') == '1'
+    # Процессы моделирования сценариев (None - по числу ядер)
+    SIMULATION_WORKERS = None
+    # Сценариев за один запуск моделирования
+    SIMULATION_MAX_SCENARIOS = 1000
+    # Процессы пересчета проходных баллов за все даты (None - по числу ядер)
+    RECALCULATE_WORKERS = None
+    # Записывать created_at/updated_at в строки applicants (без них строки и БД компактнее)
+    APPLICANT_AUDIT_TIMESTAMPS = os.environ.get('APPLICANT_AUDIT_TIMESTAMPS') == '1'
+    # Хранение списков по датам изменениями (см. snapshots.py): сколько дат
+    # держать развернутыми в таблице applicants (None - все)
+    SNAPSHOT_MATERIALIZED_DATES = 2
+    # Дата, к которой обращались последние N секунд, не сворачивается
+    SNAPSHOT_EVICT_DELAY = 60
+    
     # Образовательные программы согласно п.6 технических требований
     PROGRAMS = {
         "pm": {
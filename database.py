@@ -0,0 +1,190 @@
+"""
+Профиль подключения SQLite и пул соединений для чтения
+
+Каждому новому соединению с БД назначаются настройки Config.SQLITE_PROFILE:
+журнал WAL (читатели не ждут писателя и не блокируют его), synchronous=NORMAL,
+отображение файла в память, размер кэша, временные таблицы в памяти и время
+ожидания блокировки.
+
+Для GET-маршрутов создается отдельный пул соединений только для чтения
+(PRAGMA query_only): пока фоновая загрузка держит соединение-писатель,
+страницы читают последнее зафиксированное состояние БД через свой пул и не
+ждут ни блокировки, ни свободного соединения. Выбор соединения выполняет
+сессия RoutingSession: SELECT в GET-запросе - пул чтения; запись,
+flush и все запросы транзакции после первой записи - основной пул.
+GET-запросы ничего не записывают в БД (read_request): дату, которую нужно
+развернуть или для которой не сохранено распределение, готовит фоновая
+задача (services.prepare_date), поэтому страницы не ждут блокировки записи.
+"""
+
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.sql.expression import CompoundSelect, Select
+from config import Config
+
+
+# Методы запросов, которые читают через пул чтения
+READ_METHODS = ('GET', 'HEAD')
+
+# Ключ пула чтения в app.extensions
+READ_ENGINE_KEY = 'sqlite_read_engine'
+
+
+def profile_pragmas(profile=None):
+    """
+    Команды PRAGMA профиля (None - Config.SQLITE_PROFILE)
+    """
+    profile = Config.SQLITE_PROFILE if profile is None else profile
+    return [f'PRAGMA {name}={value}' for name, value in profile.items() if value is not None]
+
+
+def apply_profile(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in profile_pragmas():
+        cursor.execute(pragma)
+    cursor.close()
+
+
+def apply_read_profile(dbapi_connection, connection_record):
+    apply_profile(dbapi_connection, connection_record)
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA query_only=ON')
+    cursor.close()
+
+
+def is_file_database(url):
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def init_engines(app, db):
+    """
+    Назначает профиль основному пулу и создает пул чтения
+
+    Вызывается внутри контекста приложения до первого обращения к БД.
+    """
+    engine = db.engine
+    if engine.url.get_backend_name() != 'sqlite':
+        return
+    event.listen(engine, 'connect', apply_profile)
+
+    # БД в памяти у каждого соединения своя - пул чтения для нее не создается
+    if Config.SQLITE_READ_POOL and is_file_database(engine.url):
+        read_engine = create_engine(
+            engine.url,
+            pool_size=Config.SQLITE_READ_POOL_SIZE,
+            max_overflow=Config.SQLITE_READ_POOL_SIZE,
+        )
+        event.listen(read_engine, 'connect', apply_read_profile)
+        app.extensions[READ_ENGINE_KEY] = read_engine
+
+
+def read_request():
+    """
+    Выполняется ли запрос на чтение (GET, HEAD) - он ничего не записывает в БД
+    """
+    return has_request_context() and request.method in READ_METHODS
+
+
+def read_engine():
+    """
+    Пул чтения для текущего запроса (None - запрос читает через основной пул)
+    """
+    if not read_request():
+        return None
+    return current_app.extensions.get(READ_ENGINE_KEY)
+
+
+class RoutingSession(Session):
+    """
+    Сессия, направляющая чтение GET-запросов в пул чтения
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and not self.info.get('writing')
+            and isinstance(clause, (Select, CompoundSelect))
+        ):
+            engine = read_engine()
+            if engine is not None:
+                return engine
+
+        if bind is None:
+            # Транзакция пишет - до ее окончания все запросы идут через писателя,
+            # чтобы видеть собственные незафиксированные изменения
+            self.info['writing'] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def reset_writing(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('writing', None)
+
+
+def check_concurrent_reads(app, path, seconds=5.0, echo=print):
+    """
+    Проверяет, что GET-запросы выполняются, пока писатель держит транзакцию
+
+    Писатель в отдельном потоке открывает исключительную транзакцию, изменяет
+    заявления (как долгая загрузка списка) и держит ее seconds секунд, затем
+    откатывает - данные не меняются. Тем временем выполняются GET-запросы
+    к path. Возвращает True, если запросы завершались до окончания записи.
+    """
+    import threading
+    import time
+    from models import db
+
+    client = app.test_client()
+    # Маршрут отвечает и без записи
+    response = client.get(path)
+    if response.status_code != 200:
+        echo(f"{path}: код ответа {response.status_code}")
+        return False
+
+    with app.app_context():
+        engine = db.engine
+    locked = threading.Event()
+    released = {}
+
+    def write():
+        connection = engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute('BEGIN EXCLUSIVE')
+            cursor.execute('UPDATE applicants SET total_score = total_score')
+            locked.set()
+            time.sleep(seconds)
+            connection.rollback()
+        finally:
+            released['at'] = time.perf_counter()
+            locked.set()
+            connection.close()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    locked.wait()
+
+    timings = []
+    failed = 0
+    while writer.is_alive():
+        start = time.perf_counter()
+        try:
+            ok = client.get(path).status_code == 200
+        except Exception as e:
+            # Без WAL чтение получает "database is locked"
+            echo(f"GET {path}: {e}")
+            ok = False
+        end = time.perf_counter()
+        failed += not ok
+        timings.append((end - start, end))
+    writer.join()
+
+    during = [elapsed for elapsed, end in timings if end < released['at']]
+    echo(f"Писатель держал транзакцию {seconds:.1f} с")
+    echo(f"GET {path}: запросов {len(timings)}, завершено во время записи {len(during)}, ошибок {failed}")
+    if during:
+        echo(f"Время ответа во время записи: среднее {sum(during) / len(during):.3f} с, максимум {max(during):.3f} с")
+    return bool(during) and not failed
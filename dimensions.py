@@ -0,0 +1,128 @@
+"""
+Справочники программ и дат приемной кампании
+
+Таблицы applicants, applicant_changes и enrollments ссылаются на программу и
+дату целыми номерами (programs.id, campaign_dates.id) вместо строк 'ivt' и
+'04_08'. Номера не меняются после создания, поэтому соответствие
+код <-> номер кэшируется в памяти процесса; при промахе справочник
+перечитывается из БД.
+"""
+
+import threading
+from sqlalchemy import case, select
+from config import Config
+from models import db, Program, CampaignDate
+
+
+PROGRAMS = Config.PROGRAMS
+
+_lock = threading.Lock()
+# Кэш справочников: код -> номер и номер -> код
+_program_ids = {}
+_program_codes = {}
+_date_ids = {}
+_date_names = {}
+
+
+def normalize_date(date):
+    """
+    Дата в формате дд_мм (принимается и дд.мм)
+    """
+    return date.replace('.', '_').strip()
+
+
+def load_dimensions(connection=None):
+    """
+    Перечитывает справочники из БД в кэш процесса
+    """
+    connection = connection or db.session
+    programs = connection.execute(select(Program.id, Program.code)).all()
+    dates = connection.execute(select(CampaignDate.id, CampaignDate.upload_date)).all()
+    with _lock:
+        _program_ids.update({code: key for key, code in programs})
+        _program_codes.update({key: code for key, code in programs})
+        _date_ids.update({name: key for key, name in dates})
+        _date_names.update({key: name for key, name in dates})
+
+
+def sync_programs(connection):
+    """
+    Добавляет в справочник программы из Config.PROGRAMS, которых в нем нет
+    """
+    table = Program.__table__
+    existing = set(connection.execute(select(table.c.code)).scalars())
+    for code, program in PROGRAMS.items():
+        if code not in existing:
+            connection.execute(table.insert().values(code=code, name=program['name']))
+
+
+def program_id(code, connection=None):
+    """
+    Номер программы по коду (None - программы нет в справочнике)
+    """
+    if code not in _program_ids:
+        load_dimensions(connection)
+    return _program_ids.get(code)
+
+
+def program_ids(connection=None):
+    """
+    Словарь {код_программы: номер} для программ Config.PROGRAMS
+    """
+    if any(code not in _program_ids for code in PROGRAMS):
+        load_dimensions(connection)
+    return {code: _program_ids[code] for code in PROGRAMS}
+
+
+def program_code(key, connection=None):
+    """
+    Код программы по номеру
+    """
+    if key not in _program_codes:
+        load_dimensions(connection)
+    return _program_codes[key]
+
+
+def program_case(column, mapping, else_=None, connection=None):
+    """
+    Выражение SQL: номер программы в column -> mapping[код_программы]
+    """
+    ids = program_ids(connection)
+    return case({ids[code]: value for code, value in mapping.items()}, value=column, else_=else_)
+
+
+def date_id(date, connection=None, create=False):
+    """
+    Номер даты в справочнике campaign_dates
+
+    Если даты нет: при create=True она добавляется (отдельной зафиксированной
+    транзакцией сессии - вызывать до записи данных за дату), иначе - None.
+    """
+    date = normalize_date(date)
+    if date not in _date_ids:
+        load_dimensions(connection)
+    if date not in _date_ids and create:
+        table = CampaignDate.__table__
+        db.session.execute(table.insert().prefix_with('OR IGNORE').values(upload_date=date))
+        db.session.commit()
+        load_dimensions()
+    return _date_ids.get(date)
+
+
+def date_ids(dates, connection=None):
+    """
+    Словарь {дата: номер} для дат, которые есть в справочнике
+    """
+    dates = [normalize_date(date) for date in dates]
+    if any(date not in _date_ids for date in dates):
+        load_dimensions(connection)
+    return {date: _date_ids[date] for date in dates if date in _date_ids}
+
+
+def date_name(key, connection=None):
+    """
+    Дата (дд_мм) по номеру
+    """
+    if key not in _date_names:
+        load_dimensions(connection)
+    return _date_names[key]
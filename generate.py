@@ -1,49 +1,187 @@
+"""
+Генератор тестовых конкурсных списков
+
+Генерирует списки за несколько дней приемной кампании с заданным числом
+абитуриентов (до миллионов), числом программ на абитуриента, долей согласий,
+распределением баллов и изменениями списка от дня к дню.
+
+Генерация детерминирована: при одинаковом --seed получаются одинаковые файлы.
+Состояние каждого блока абитуриентов выводится из (seed, блок, день), поэтому
+файлы пишутся потоково, блок за блоком, без накопления строк в памяти.
+
+Пример:
+    python generate.py --applicants 1000000 --days 4 --seed 7
+"""
+
+import argparse
 import csv
-import random
 from pathlib import Path
+import numpy as np
+from config import Config
+
+
+FIELDNAMES = ["id", "program", "priority", "physics", "rus", "math", "extra", "total", "consent"]
+
+# Размер блока абитуриентов; от него зависят последовательности случайных чисел
+BLOCK_SIZE = 100_000
+
+# Метки независимых потоков случайных чисел блока
+STREAM_JOIN, STREAM_SCORES, STREAM_CHURN, STREAM_DROPOUT, STREAM_CHOICES = range(5)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Генератор тестовых конкурсных списков")
+    parser.add_argument("--applicants", type=int, default=2000,
+                        help="число абитуриентов к последнему дню (по умолчанию 2000)")
+    parser.add_argument("--min-programs", type=int, default=1,
+                        help="минимум программ на абитуриента")
+    parser.add_argument("--max-programs", type=int, default=len(Config.PROGRAMS),
+                        help="максимум программ на абитуриента")
+    parser.add_argument("--consent-ratio", type=float, default=0.5,
+                        help="доля заявлений с согласием на зачисление")
+    parser.add_argument("--score-distribution", choices=["uniform", "normal"], default="uniform",
+                        help="распределение баллов по предметам")
+    parser.add_argument("--score-min", type=int, default=50, help="минимальный балл по предмету")
+    parser.add_argument("--score-max", type=int, default=100, help="максимальный балл по предмету")
+    parser.add_argument("--score-mean", type=float, default=75.0, help="среднее для normal")
+    parser.add_argument("--score-std", type=float, default=12.0, help="стандартное отклонение для normal")
+    parser.add_argument("--extra-max", type=int, default=10, help="максимум баллов за достижения")
+    parser.add_argument("--days", type=int, default=4, help="число дней кампании")
+    parser.add_argument("--start-date", default="01_08", help="первый день в формате дд_мм")
+    parser.add_argument("--first-day-share", type=float, default=0.05,
+                        help="доля абитуриентов, подавших заявления в первый день")
+    parser.add_argument("--churn", type=float, default=0.1,
+                        help="доля абитуриентов, меняющих согласия и приоритеты за день")
+    parser.add_argument("--dropout", type=float, default=0.01,
+                        help="доля абитуриентов, забирающих заявления за день")
+    parser.add_argument("--first-id", type=int, default=1000, help="первый id абитуриента")
+    parser.add_argument("--seed", type=int, default=42, help="зерно генератора")
+    parser.add_argument("--output", default=Config.DATA_DIR, help="папка для CSV файлов")
+
+    args = parser.parse_args(argv)
+    if not 1 <= args.min_programs <= args.max_programs <= len(Config.PROGRAMS):
+        parser.error(f"требуется 1 <= --min-programs <= --max-programs <= {len(Config.PROGRAMS)}")
+    if args.days < 1:
+        parser.error("--days должно быть не меньше 1")
+    return args
+
+
+def campaign_dates(start_date, days):
+    """
+    Даты кампании в формате дд_мм, начиная с start_date
+    """
+    day, month = (int(part) for part in start_date.replace('.', '_').split('_'))
+    start = np.datetime64(f"2000-{month:02d}-{day:02d}")
+    return [
+        f"{str(date)[8:10]}_{str(date)[5:7]}"
+        for date in (start + np.arange(days)).astype('datetime64[D]')
+    ]
+
+
+def block_rng(args, block, stream, day=0):
+    return np.random.default_rng([args.seed, block, stream, day])
+
 
-DATA_DIR = Path("data")
-DATA_DIR.mkdir(exist_ok=True)
-
-programs = ["PM", "IVT", "ITSS", "IB"]
-
-# Количество абитуриентов по дням (по ТЗ минимально, можно увеличить)
-counts = {
-    "01_08": [60, 100, 50, 70],
-    "02_08": [380, 370, 350, 260],
-    "03_08": [1000, 1150, 1050, 800],
-    "04_08": [1240, 1390, 1240, 1190],
-}
-
-for date, day_counts in counts.items():
-    rows = []
-    global_id = 1000  # начальный id, можно любой
-    for program, count in zip(programs, day_counts):
-        for _ in range(count):
-            physics = random.randint(50, 100)
-            rus = random.randint(50, 100)
-            math = random.randint(50, 100)
-            extra = random.randint(0, 10)
-            total = physics + rus + math + extra
-            priority = random.randint(1, 4)
-            consent = random.randint(0, 1)
-            rows.append({
-                "id": global_id,
-                "program": program,
-                "priority": priority,
-                "physics": physics,
-                "rus": rus,
-                "math": math,
-                "extra": extra,
-                "total": total,
-                "consent": consent
-            })
-            global_id += 1
-    
-    filepath = DATA_DIR / f"{date}.csv"
+def scores(rng, args, size):
+    """
+    Баллы по одному предмету для size абитуриентов
+    """
+    if args.score_distribution == "normal":
+        values = np.rint(rng.normal(args.score_mean, args.score_std, size))
+        return np.clip(values, args.score_min, args.score_max).astype(np.int64)
+    return rng.integers(args.score_min, args.score_max + 1, size)
+
+
+def block_rows(args, block, size, day):
+    """
+    Строки блока абитуриентов на день day (0 - первый день)
+
+    Возвращает столбцы в порядке FIELDNAMES, отсортированные по (id, приоритет).
+    """
+    program_codes = np.array(list(Config.PROGRAMS.keys()))
+    programs_count = len(program_codes)
+
+    # День подачи заявлений
+    join = block_rng(args, block, STREAM_JOIN).random(size)
+    later = (join - args.first_day_share) / max(1.0 - args.first_day_share, 1e-9)
+    join_day = np.where(
+        join < args.first_day_share,
+        0,
+        1 + np.minimum((later * max(args.days - 1, 1)).astype(np.int64), args.days - 2)
+    ) if args.days > 1 else np.zeros(size, dtype=np.int64)
+
+    # Выбывшие и последний день изменения согласий/приоритетов
+    present = join_day <= day
+    last_change = join_day.copy()
+    for k in range(1, day + 1):
+        active = k > join_day
+        present &= ~(active & (block_rng(args, block, STREAM_DROPOUT, k).random(size) < args.dropout))
+        changed = active & (block_rng(args, block, STREAM_CHURN, k).random(size) < args.churn)
+        last_change[changed] = k
+
+    # Баллы не меняются в течение кампании
+    rng = block_rng(args, block, STREAM_SCORES)
+    physics = scores(rng, args, size)
+    rus = scores(rng, args, size)
+    math = scores(rng, args, size)
+    extra = rng.integers(0, args.extra_max + 1, size)
+    total = physics + rus + math + extra
+
+    # Выбор программ (порядок = приоритет) и согласия на день последнего изменения
+    counts = np.zeros(size, dtype=np.int64)
+    order = np.zeros((size, programs_count), dtype=np.int64)
+    consent = np.zeros((size, programs_count), dtype=bool)
+    for version in np.unique(last_change[present]):
+        rng = block_rng(args, block, STREAM_CHOICES, int(version))
+        selected = last_change == version
+        counts[selected] = rng.integers(args.min_programs, args.max_programs + 1, size)[selected]
+        order[selected] = np.argsort(rng.random((size, programs_count)), axis=1)[selected]
+        consent[selected] = (rng.random((size, programs_count)) < args.consent_ratio)[selected]
+
+    rows, slots = np.nonzero(present[:, None] & (np.arange(programs_count) < counts[:, None]))
+    ids = args.first_id + block * BLOCK_SIZE + rows
+
+    return (
+        ids,
+        program_codes[order[rows, slots]],
+        slots + 1,
+        physics[rows],
+        rus[rows],
+        math[rows],
+        extra[rows],
+        total[rows],
+        consent[rows, slots].astype(np.int64),
+    )
+
+
+def write_day(args, date, day, output):
+    """
+    Записывает файл за день блок за блоком; возвращает (путь, строк, абитуриентов)
+    """
+    filepath = output / f"{date}.csv"
+    rows_written = 0
+    applicants = 0
     with open(filepath, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=["id","program","priority","physics","rus","math","extra","total","consent"])
-        writer.writeheader()
-        writer.writerows(rows)
+        writer = csv.writer(f)
+        writer.writerow(FIELDNAMES)
+        for block, start in enumerate(range(0, args.applicants, BLOCK_SIZE)):
+            size = min(BLOCK_SIZE, args.applicants - start)
+            columns = block_rows(args, block, size, day)
+            writer.writerows(zip(*(column.tolist() for column in columns)))
+            rows_written += len(columns[0])
+            applicants += len(np.unique(columns[0]))
+    return filepath, rows_written, applicants
+
+
+def main():
+    args = parse_args()
+    output = Path(args.output)
+    output.mkdir(exist_ok=True)
+
+    for day, date in enumerate(campaign_dates(args.start_date, args.days)):
+        filepath, rows_written, applicants = write_day(args, date, day, output)
+        print(f"CSV {filepath} создано, записано {rows_written} строк ({applicants} абитуриентов)")
+
 
-    print(f"CSV {filepath} создано, записано {len(rows)} абитуриентов")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,567 @@
+"""
+П.2-4: Движок загрузки конкурсных списков в БД
+
+Загрузка работает с множествами, а не построчно:
+- существующие записи за дату читаются одним запросом;
+- наборы на удаление, добавление и обновление вычисляются в памяти;
+- каждый набор применяется одним пакетным запросом (executemany)
+  в рамках одной транзакции.
+
+Потоковый режим разбирает файл блоками фиксированного размера прямо из
+потока загрузки, одновременно сохраняя его на диск, и передает записи
+в БД пакетами через временную таблицу - память не зависит от размера файла.
+
+Рядом с сохраненным файлом хранится его SHA-256 (data/<дата>.csv.sha256):
+повторная загрузка того же файла ничего не делает, а в дельта-режиме новый
+файл сравнивается с сохраненным слиянием по (id, программа), и в БД
+уходят только изменившиеся строки.
+"""
+
+import codecs
+import hashlib
+import os
+import numpy as np
+from datetime import datetime
+from sqlalchemy import (
+    Boolean, Column, Index, Integer, MetaData, Table,
+    and_, bindparam, exists, func, literal, or_, select
+)
+from config import Config
+from models import db, Applicant
+from dimensions import date_id, program_ids
+from parsing import (
+    RECORD_FIELDS, ErrorReport, batch_records, iter_column_batches,
+    read_columns, record_keys, take_rows
+)
+
+
+# Поля, которые сравниваются при обновлении (все, кроме ключа)
+VALUE_FIELDS = RECORD_FIELDS[2:]
+
+# Столбцы applicants в порядке RECORD_FIELDS: программа - номер в справочнике
+DB_FIELDS = ('id', 'program_id') + VALUE_FIELDS
+
+# Расширение файла с хешем сохраненного списка
+HASH_SUFFIX = '.sha256'
+
+
+class HashingWriter:
+    """
+    Обертка над файлом, считающая SHA-256 записываемых данных
+    """
+    def __init__(self, file):
+        self.file = file
+        self.hash = hashlib.sha256()
+
+    def write(self, chunk):
+        self.hash.update(chunk)
+        self.file.write(chunk)
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
+
+def notify(progress, **fields):
+    """
+    Сообщает о ходе загрузки, если передан обработчик progress(**fields)
+
+    Поля: stage (этап), rows_parsed (разобрано строк), rows_written (записано в БД).
+    """
+    if progress is not None:
+        progress(**fields)
+
+
+def read_hash(filepath):
+    """
+    Возвращает сохраненный хеш файла или None, если его нет
+    """
+    hash_path = filepath + HASH_SUFFIX
+    if not os.path.exists(filepath) or not os.path.exists(hash_path):
+        return None
+    with open(hash_path, 'r', encoding='utf-8') as f:
+        return f.read().strip() or None
+
+
+def write_hash(filepath, digest):
+    with open(filepath + HASH_SUFFIX, 'w', encoding='utf-8') as f:
+        f.write(digest)
+
+
+def remove_hash(filepath):
+    hash_path = filepath + HASH_SUFFIX
+    if os.path.exists(hash_path):
+        os.remove(hash_path)
+
+
+def file_hash(filepath, chunk_size):
+    """
+    SHA-256 файла на диске
+    """
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stream_hash(stream, chunk_size):
+    """
+    SHA-256 потока загрузки; после подсчета поток возвращается в начало
+
+    Для потоков без произвольного доступа возвращает None.
+    """
+    if not stream.seekable():
+        return None
+    start = stream.tell()
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        digest.update(chunk)
+    stream.seek(start)
+    return digest.hexdigest()
+
+
+def iter_lines(stream, chunk_size, tee=None):
+    """
+    Читает бинарный поток блоками по chunk_size байт и выдает строки текста
+
+    Если передан tee, каждый прочитанный блок дописывается в него без изменений.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    tail = ''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        if tee is not None:
+            tee.write(chunk)
+        lines = (tail + decoder.decode(chunk)).splitlines(keepends=True)
+        # Незавершенная последняя строка переносится в следующий блок
+        tail = lines.pop() if lines and not lines[-1].endswith('\n') else ''
+        yield from lines
+    tail += decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def audit_time():
+    """
+    Значение created_at/updated_at для записываемых строк applicants
+    (None, если Config.APPLICANT_AUDIT_TIMESTAMPS выключен)
+    """
+    return datetime.utcnow() if Config.APPLICANT_AUDIT_TIMESTAMPS else None
+
+
+def program_keys():
+    """
+    Словарь {код_программы: номер} и обратный к нему
+    """
+    ids = program_ids()
+    return ids, {key: code for code, key in ids.items()}
+
+
+def load_existing(date):
+    """
+    Возвращает словарь {(id, код_программы): значения} для всех записей за дату
+
+    Выполняется одним запросом, ORM-объекты не создаются.
+    """
+    table = Applicant.__table__
+    _, codes = program_keys()
+    columns = [table.c[name] for name in DB_FIELDS]
+    rows = db.session.execute(
+        select(*columns).where(table.c.date_id == date_id(date))
+    )
+    return {(row[0], codes[row[1]]): tuple(row[2:]) for row in rows}
+
+
+def diff_records(existing, records):
+    """
+    Вычисляет наборы изменений между БД и новым списком
+
+    Возвращает словарь с ключами:
+    - delete: ключи (id, программа), отсутствующие в новом списке (П.4.a)
+    - insert: новые записи (П.4.b)
+    - update: изменившиеся записи (П.4.c)
+    - unchanged: количество записей без изменений
+    """
+    new = {(record[0], record[1]): record[2:] for record in records}
+
+    inserts = []
+    updates = []
+    unchanged = 0
+    for key, values in new.items():
+        old_values = existing.get(key)
+        if old_values is None:
+            inserts.append(key + values)
+        elif old_values != values:
+            updates.append(key + values)
+        else:
+            unchanged += 1
+
+    return {
+        'delete': [key for key in existing if key not in new],
+        'insert': inserts,
+        'update': updates,
+        'unchanged': unchanged,
+    }
+
+
+def diff_columns(old, new):
+    """
+    Сравнивает два набора столбцов слиянием по ключу (id, программа)
+
+    Оба набора сортируются по ключу, позиции новых ключей в старом наборе
+    находятся бинарным поиском. Результат в формате diff_records.
+    """
+    old_keys = record_keys(old)
+    new_keys = record_keys(new)
+    old_order = np.argsort(old_keys, kind='stable')
+    new_order = np.argsort(new_keys, kind='stable')
+    old_sorted = old_keys[old_order]
+    new_sorted = new_keys[new_order]
+
+    positions = np.searchsorted(old_sorted, new_sorted)
+    if len(old_sorted):
+        positions = np.minimum(positions, len(old_sorted) - 1)
+        matched = old_sorted[positions] == new_sorted
+    else:
+        matched = np.zeros(len(new_sorted), dtype=bool)
+
+    old_index = old_order[positions[matched]]
+    new_index = new_order[matched]
+    changed = np.zeros(len(new_index), dtype=bool)
+    for field in VALUE_FIELDS:
+        changed |= old[field][old_index] != new[field][new_index]
+
+    old_matched = np.zeros(len(old_sorted), dtype=bool)
+    old_matched[positions[matched]] = True
+    deleted = take_rows(old, np.sort(old_order[~old_matched]))
+
+    return {
+        'delete': list(zip(deleted['id'].tolist(), deleted['program_code'].tolist())),
+        'insert': list(batch_records(take_rows(new, np.sort(new_order[~matched])))),
+        'update': list(batch_records(take_rows(new, np.sort(new_index[changed])))),
+        'unchanged': int(len(new_index) - changed.sum()),
+    }
+
+
+def changed_ids(changes):
+    """
+    Отсортированный список id абитуриентов, затронутых наборами изменений
+    """
+    ids = {key[0] for key in changes['delete']}
+    ids.update(record[0] for record in changes['insert'])
+    ids.update(record[0] for record in changes['update'])
+    return sorted(ids)
+
+
+def apply_changes(date, changes, progress=None):
+    """
+    Применяет наборы изменений пакетными запросами в одной транзакции
+    """
+    notify(progress, stage='writing')
+    table = Applicant.__table__
+    key_clause = and_(
+        table.c.id == bindparam('key_id'),
+        table.c.program_id == bindparam('key_program'),
+        table.c.date_id == bindparam('key_date'),
+    )
+    ids, _ = program_keys()
+    date_key = date_id(date, create=True)
+    now = audit_time()
+
+    try:
+        # П.4.a: удаление до вставки, чтобы смена программы не нарушала ключ
+        if changes['delete']:
+            db.session.execute(
+                table.delete().where(key_clause),
+                [
+                    {'key_id': app_id, 'key_program': ids[program_code], 'key_date': date_key}
+                    for app_id, program_code in changes['delete']
+                ]
+            )
+
+        # П.4.b: добавление
+        if changes['insert']:
+            db.session.execute(
+                table.insert(),
+                [
+                    dict(
+                        zip(VALUE_FIELDS, record[2:]),
+                        id=record[0],
+                        program_id=ids[record[1]],
+                        date_id=date_key,
+                        created_at=now,
+                        updated_at=now
+                    )
+                    for record in changes['insert']
+                ]
+            )
+
+        # П.4.c: обновление
+        if changes['update']:
+            db.session.execute(
+                table.update().where(key_clause),
+                [
+                    dict(
+                        zip(VALUE_FIELDS, record[2:]),
+                        key_id=record[0],
+                        key_program=ids[record[1]],
+                        key_date=date_key,
+                        updated_at=now
+                    )
+                    for record in changes['update']
+                ]
+            )
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    notify(progress, rows_written=len(changes['delete']) + len(changes['insert']) + len(changes['update']))
+
+
+def ingest_records(date, records, progress=None):
+    """
+    Загружает записи за дату: читает существующие ключи, вычисляет наборы
+    изменений и применяет их
+
+    Возвращает статистику загрузки:
+    {'rows', 'inserted', 'updated', 'deleted', 'unchanged', 'elapsed', 'rows_per_second',
+     'changed_ids'} - changed_ids: id абитуриентов с измененными заявлениями
+    """
+    start_time = datetime.now()
+
+    records = list(records)
+    notify(progress, rows_parsed=len(records))
+    changes = diff_records(load_existing(date), records)
+    apply_changes(date, changes, progress)
+
+    elapsed_time = (datetime.now() - start_time).total_seconds()
+
+    return {
+        'rows': len(records),
+        'inserted': len(changes['insert']),
+        'updated': len(changes['update']),
+        'deleted': len(changes['delete']),
+        'unchanged': changes['unchanged'],
+        'elapsed': elapsed_time,
+        'rows_per_second': len(records) / elapsed_time if elapsed_time > 0 else float(len(records)),
+        'changed_ids': changed_ids(changes),
+    }
+
+
+# Временная таблица для потоковой загрузки (живет в рамках соединения)
+staging_metadata = MetaData()
+staging = Table(
+    'ingest_staging',
+    staging_metadata,
+    Column('line', Integer, nullable=False),
+    Column('id', Integer, nullable=False),
+    Column('program_id', Integer, nullable=False),
+    Column('priority', Integer, nullable=False),
+    Column('physics_ict_score', Integer, nullable=False),
+    Column('russian_score', Integer, nullable=False),
+    Column('math_score', Integer, nullable=False),
+    Column('extra_score', Integer, nullable=False),
+    Column('total_score', Integer, nullable=False),
+    Column('has_consent', Boolean, nullable=False),
+    Index('ix_ingest_staging_key', 'id', 'program_id'),
+    prefixes=['TEMPORARY'],
+)
+
+
+def staged_duplicates(connection, limit):
+    """
+    Возвращает (номера строк, общее число) повторов ключа (id, программа) в staging
+    """
+    earlier = staging.alias('earlier')
+    repeated = exists().where(
+        earlier.c.id == staging.c.id,
+        earlier.c.program_id == staging.c.program_id,
+        earlier.c.line < staging.c.line
+    )
+    total = connection.execute(select(func.count()).where(repeated)).scalar()
+    lines = connection.execute(
+        select(staging.c.line).where(repeated).order_by(staging.c.line).limit(limit)
+    ).scalars().all()
+    return lines, total
+
+
+def ingest_stream(date, batches, report, progress=None):
+    """
+    Потоковая загрузка пакетов столбцов за дату
+
+    Пакеты переносятся во временную таблицу, после чего удаление,
+    обновление и добавление выполняются тремя запросами на стороне SQLite.
+    В памяти держится не более одного пакета. Если в report накопились
+    ошибки (или в файле есть повторы ключа), БД не изменяется.
+
+    Возвращает статистику в том же формате, что и ingest_records (без changed_ids -
+    измененные абитуриенты в этом режиме не собираются).
+    """
+    start_time = datetime.now()
+    table = Applicant.__table__
+    now = audit_time()
+    ids, _ = program_keys()
+    date_key = date_id(date, create=True)
+    same_key = and_(
+        table.c.date_id == date_key,
+        table.c.id == staging.c.id,
+        table.c.program_id == staging.c.program_id,
+    )
+
+    connection = db.session.connection()
+    try:
+        staging.create(connection, checkfirst=True)
+        connection.execute(staging.delete())
+
+        rows = 0
+        for columns in batches:
+            if len(columns['line']):
+                connection.execute(staging.insert(), [
+                    dict(zip(DB_FIELDS, record), program_id=ids[record[1]], line=line)
+                    for line, record in zip(columns['line'].tolist(), batch_records(columns))
+                ])
+                rows += len(columns['line'])
+            notify(progress, stage='parsing', rows_parsed=rows, rows_written=rows)
+
+        lines, total = staged_duplicates(connection, report.limit)
+        report.extend([(line, "повтор пары (id, программа)") for line in lines], total)
+        report.check()
+        notify(progress, stage='writing')
+
+        # П.4.a: удаление записей, отсутствующих в новом списке
+        deleted = connection.execute(
+            table.delete().where(
+                table.c.date_id == date_key,
+                ~exists().where(
+                    staging.c.id == table.c.id,
+                    staging.c.program_id == table.c.program_id
+                )
+            )
+        ).rowcount
+
+        # П.4.c: обновление только изменившихся записей
+        updated = connection.execute(
+            table.update()
+            .where(same_key, or_(*[table.c[name].is_distinct_from(staging.c[name]) for name in VALUE_FIELDS]))
+            .values({**{name: staging.c[name] for name in VALUE_FIELDS}, 'updated_at': now})
+        ).rowcount
+
+        # П.4.b: добавление новых записей
+        inserted = connection.execute(
+            table.insert().from_select(
+                list(DB_FIELDS) + ['date_id', 'created_at', 'updated_at'],
+                select(
+                    *[staging.c[name] for name in DB_FIELDS],
+                    literal(date_key), literal(now), literal(now)
+                ).where(~exists().where(same_key))
+            )
+        ).rowcount
+
+        connection.execute(staging.delete())
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    elapsed_time = (datetime.now() - start_time).total_seconds()
+
+    return {
+        'rows': rows,
+        'inserted': inserted,
+        'updated': updated,
+        'deleted': deleted,
+        'unchanged': rows - inserted - updated,
+        'elapsed': elapsed_time,
+        'rows_per_second': rows / elapsed_time if elapsed_time > 0 else float(rows),
+    }
+
+
+def ingest_file_stream(date, stream, filepath, chunk_size, batch_size, progress=None):
+    """
+    Разбирает поток загрузки блоками и одновременно сохраняет его в filepath
+
+    Файл пишется во временный filepath + '.part' и заменяет прежний
+    только после успешной записи в БД.
+    """
+    partial_path = filepath + '.part'
+    try:
+        with open(partial_path, 'wb') as f:
+            tee = HashingWriter(f)
+            report = ErrorReport()
+            batches = iter_column_batches(iter_lines(stream, chunk_size, tee), batch_size, report)
+            stats = ingest_stream(date, batches, report, progress)
+        os.replace(partial_path, filepath)
+        write_hash(filepath, tee.hexdigest())
+    except Exception:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    return stats
+
+
+def ingest_delta(date, stream, filepath, chunk_size, batch_size, progress=None):
+    """
+    Дельта-загрузка: новый файл сравнивается с сохраненным filepath
+
+    В БД отправляются только добавленные, изменившиеся и удаленные строки.
+    Предполагается, что сохраненный файл соответствует БД (это гарантирует
+    наличие его хеша - он пишется только после успешной загрузки).
+    """
+    start_time = datetime.now()
+    partial_path = filepath + '.part'
+    try:
+        notify(progress, stage='parsing')
+        with open(partial_path, 'wb') as f:
+            tee = HashingWriter(f)
+            new = read_columns(iter_lines(stream, chunk_size, tee), batch_size)
+        notify(progress, rows_parsed=len(new['id']))
+        with open(filepath, 'r', encoding='utf-8', newline='') as f:
+            old = read_columns(f, batch_size)
+
+        changes = diff_columns(old, new)
+        apply_changes(date, changes, progress)
+
+        os.replace(partial_path, filepath)
+        write_hash(filepath, tee.hexdigest())
+    except Exception:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    rows = len(new['id'])
+    elapsed_time = (datetime.now() - start_time).total_seconds()
+
+    return {
+        'rows': rows,
+        'inserted': len(changes['insert']),
+        'updated': len(changes['update']),
+        'deleted': len(changes['delete']),
+        'unchanged': changes['unchanged'],
+        'elapsed': elapsed_time,
+        'rows_per_second': rows / elapsed_time if elapsed_time > 0 else float(rows),
+        'changed_ids': changed_ids(changes),
+    }
+
+
+def unchanged_stats(date):
+    """
+    Статистика для повторной загрузки того же файла: БД не изменяется
+    """
+    table = Applicant.__table__
+    rows = db.session.execute(
+        select(func.count()).select_from(table).where(table.c.date_id == date_id(date))
+    ).scalar()
+    return {
+        'rows': rows,
+        'inserted': 0,
+        'updated': 0,
+        'deleted': 0,
+        'unchanged': rows,
+        'elapsed': 0.0,
+        'rows_per_second': 0.0,
+        'skipped': True,
+    }
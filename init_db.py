@@ -1,8 +1,29 @@
 #!/usr/bin/env python
 """
 Скрипт для инициализации базы данных
+
+Использование:
+    python init_db.py                     - создать таблицы
+    python init_db.py load [даты ...]     - загрузить CSV файлы из data/
+                                            (все или только за указанные даты)
+    python init_db.py calculate [даты ...] - пересчитать проходные баллы
+                                            (за все или только за указанные даты)
+    python init_db.py migrate             - применить миграции схемы БД
+    python init_db.py explain [дата]      - проверить планы запросов (индексы)
+    python init_db.py snapshots [--vacuum] - хранилище списков по датам: свернуть
+                                            лишние даты (и сжать файл БД)
+    python init_db.py readers [--seconds N] - проверить, что страницы открываются
+                                            во время записи в БД
+    python init_db.py archive [даты ...]  - заархивировать закрытые даты (по
+                                            умолчанию все, кроме последней)
+    python init_db.py archive --remove даты - удалить архив дат
+    python init_db.py catalog [--sync]    - каталог загруженных списков (заполнить
+                                            заново по папке data)
 """
 
+import argparse
+import sys
+from datetime import datetime
 from app import app
 from models import db
 
@@ -13,14 +34,231 @@ def init_database():
     with app.app_context():
         print("Создание таблиц базы данных...")
         db.create_all()
+        migrate_database()
         print("✅ Таблицы успешно созданы!")
-        
+
         # Проверка
         from sqlalchemy import inspect
         inspector = inspect(db.engine)
         tables = inspector.get_table_names()
-        
+
         print(f"\nСозданные таблицы: {', '.join(tables)}")
 
+
+def migrate_database():
+    """
+    Применяет новые миграции схемы БД
+    """
+    from migrations import migrate, schema_version
+
+    with app.app_context():
+        if not migrate():
+            print("Новых миграций нет")
+        print(f"Версия схемы БД: {schema_version()}")
+
+
+def explain_queries(date=None):
+    """
+    Проверяет, что запросы используют индексы; возвращает True, если замечаний нет
+    """
+    from query_plans import check_query_plans, print_plans
+
+    with app.app_context():
+        results = check_query_plans(date)
+        print_plans(results)
+        return not any(item['problems'] for item in results)
+
+
+def show_snapshots(vacuum=False):
+    """
+    Сворачивает лишние развернутые даты и печатает состояние хранилища снимков
+    """
+    from snapshots import evict_snapshots, storage_summary
+
+    with app.app_context():
+        evicted = evict_snapshots()
+        if evicted:
+            print(f"Свернуты даты: {', '.join(evicted)}")
+
+        print(f"{'Дата':<8} {'База':<8} {'Строк':>10} {'Изменений':>10}  В applicants")
+        for item in storage_summary():
+            print(
+                f"{item['date']:<8} {item['base_date'] or '-':<8} {item['rows']:>10} "
+                f"{item['changes']:>10}  {'да' if item['materialized'] else 'нет'}"
+            )
+
+        if vacuum:
+            # Освобожденные страницы SQLite переиспользует, но файл сжимает только VACUUM
+            db.session.close()
+            with db.engine.connect() as connection:
+                connection.exec_driver_sql('VACUUM')
+            print("Файл БД сжат")
+
+
+def check_readers(path=None, seconds=5.0):
+    """
+    Проверяет чтение страниц во время долгой записи; возвращает True при успехе
+    """
+    from database import check_concurrent_reads, profile_pragmas
+    from config import Config
+
+    # По умолчанию - страница первой программы: она читает БД и строится быстро
+    path = path or f"/program/{next(iter(Config.PROGRAMS))}"
+    with app.app_context():
+        with db.engine.connect() as connection:
+            for pragma in profile_pragmas():
+                name = pragma.split()[1].split('=')[0]
+                value = connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+                print(f"{name} = {value}")
+    return check_concurrent_reads(app, path, seconds)
+
+
+def archive_dates(dates=None, remove=False):
+    """
+    Архивирует закрытые даты (или удаляет их архив) и печатает состояние архива
+    """
+    import os
+    from archive import archive_path, archived_dates, remove_archive
+    from allocation import get_archive
+    from services import archive_date
+    from catalog import dataset_dates
+
+    with app.app_context():
+        dates = [date.replace('.', '_').strip() for date in dates or []]
+        if remove:
+            for date in dates:
+                remove_archive(date)
+                print(f"Архив {date} удален")
+        else:
+            if not dates:
+                # Все даты, кроме последней, без действующего архива
+                dates = [date for date in dataset_dates()[:-1] if not get_archive(date)]
+            for date in dates:
+                start_time = datetime.now()
+                try:
+                    manifest = archive_date(date)
+                except ValueError as e:
+                    print(f"{date}: {e}")
+                    continue
+                elapsed_time = (datetime.now() - start_time).total_seconds()
+                print(f"{date}: {manifest['rows']} строк за {elapsed_time:.2f} с")
+
+        print(f"{'Дата':<8} {'Версия':>7} {'Строк':>10} {'Размер, МБ':>11}  Действует")
+        for manifest in archived_dates():
+            path = archive_path(manifest['date'])
+            size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+            current = get_archive(manifest['date']) is not None
+            print(
+                f"{manifest['date']:<8} {manifest['version']:>7} {manifest['rows']:>10} "
+                f"{size / 1024 / 1024:>11.2f}  {'да' if current else 'нет'}"
+            )
+
+
+def show_catalog(sync=False):
+    """
+    Печатает каталог загруженных списков; sync - заполнить его заново по папке data
+    """
+    from catalog import dataset_dates, get_dataset, sync_catalog
+
+    with app.app_context():
+        if sync:
+            with db.engine.begin() as connection:
+                count = sync_catalog(connection)
+            print(f"Каталог заполнен заново: {count} списков")
+
+        print(f"{'Дата':<8} {'Строк':>10} {'Загружен':<20} {'Расчет':<20} Хеш")
+        for date in dataset_dates():
+            item = get_dataset(date)
+            calculated_at = item['calculated_at']
+            print(
+                f"{date:<8} {item['rows']:>10} {item['uploaded_at']:%Y-%m-%d %H:%M:%S}  "
+                f"{f'{calculated_at:%Y-%m-%d %H:%M:%S}' if calculated_at else '-':<20} "
+                f"{(item['content_hash'] or '-')[:12]}"
+            )
+
+
+def load_data(dates=None, workers=None):
+    """
+    Загружает CSV файлы из папки data в БД
+    """
+    from loader import load_directory, print_summary
+
+    with app.app_context():
+        start_time = datetime.now()
+        summary = load_directory(dates=dates, workers=workers)
+        elapsed_time = (datetime.now() - start_time).total_seconds()
+
+        if summary:
+            print_summary(summary)
+            print(f"Общее время: {elapsed_time:.2f} с")
+
+
+def calculate_dates(dates=None, workers=None):
+    """
+    Пересчитывает проходные баллы за даты параллельно
+    """
+    from recalculate import recalculate_dates, print_summary
+
+    with app.app_context():
+        start_time = datetime.now()
+        summary = recalculate_dates(dates, workers)
+        elapsed_time = (datetime.now() - start_time).total_seconds()
+
+        if summary:
+            print_summary(summary)
+            print(f"Общее время: {elapsed_time:.2f} с")
+        else:
+            print("Нет загруженных конкурсных списков")
+
+
 if __name__ == "__main__":
-    init_database()
+    parser = argparse.ArgumentParser(description="Инициализация базы данных")
+    subparsers = parser.add_subparsers(dest="command")
+
+    load_parser = subparsers.add_parser("load", help="загрузить CSV файлы из data/")
+    load_parser.add_argument("dates", nargs="*", help="даты в формате дд_мм или дд.мм (по умолчанию все)")
+    load_parser.add_argument("--workers", type=int, default=None, help="число процессов разбора")
+
+    calculate_parser = subparsers.add_parser("calculate", help="пересчитать проходные баллы")
+    calculate_parser.add_argument("dates", nargs="*", help="даты в формате дд_мм или дд.мм (по умолчанию все)")
+    calculate_parser.add_argument("--workers", type=int, default=None, help="число процессов расчета")
+
+    subparsers.add_parser("migrate", help="применить миграции схемы БД")
+
+    explain_parser = subparsers.add_parser("explain", help="проверить планы запросов")
+    explain_parser.add_argument("date", nargs="?", help="дата в формате дд_мм или дд.мм (по умолчанию последняя)")
+
+    snapshots_parser = subparsers.add_parser("snapshots", help="хранилище списков по датам")
+    snapshots_parser.add_argument("--vacuum", action="store_true", help="сжать файл БД")
+
+    readers_parser = subparsers.add_parser("readers", help="проверить чтение во время записи")
+    readers_parser.add_argument("--path", default=None, help="страница для запросов (по умолчанию - первой программы)")
+    readers_parser.add_argument("--seconds", type=float, default=5.0, help="сколько держать транзакцию записи")
+
+    archive_parser = subparsers.add_parser("archive", help="архив закрытых дат")
+    archive_parser.add_argument("dates", nargs="*", help="даты в формате дд_мм или дд.мм (по умолчанию все закрытые)")
+    archive_parser.add_argument("--remove", action="store_true", help="удалить архив указанных дат")
+
+    catalog_parser = subparsers.add_parser("catalog", help="каталог загруженных списков")
+    catalog_parser.add_argument("--sync", action="store_true", help="заполнить каталог заново по папке data")
+
+    args = parser.parse_args()
+
+    if args.command == "load":
+        load_data(args.dates or None, args.workers)
+    elif args.command == "calculate":
+        calculate_dates(args.dates or None, args.workers)
+    elif args.command == "migrate":
+        migrate_database()
+    elif args.command == "explain":
+        sys.exit(0 if explain_queries(args.date) else 1)
+    elif args.command == "snapshots":
+        show_snapshots(args.vacuum)
+    elif args.command == "archive":
+        archive_dates(args.dates, args.remove)
+    elif args.command == "catalog":
+        show_catalog(args.sync)
+    elif args.command == "readers":
+        sys.exit(0 if check_readers(args.path, args.seconds) else 1)
+    else:
+        init_database()
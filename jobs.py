@@ -0,0 +1,349 @@
+"""
+Фоновые задачи загрузки конкурсных списков и расчета проходных баллов
+
+Маршрут загрузки сохраняет файл и сразу возвращает id задачи, а сама
+загрузка выполняется в пуле потоков. Ход выполнения (этап, количество
+разобранных и записанных строк, время) доступен по /jobs/<id>.
+После успешной загрузки автоматически ставится задача пересчета
+проходных баллов за ту же дату. Страницы (GET-запросы) ничего не пишут в
+БД: дату, которую нужно развернуть или рассчитать, готовит задача
+подготовки (submit_preparation).
+
+Состояние задач хранится в таблице jobs отдельной БД SQLite
+(Config.JOB_DATABASE_URL, по умолчанию - файл <основная БД>.jobs.db рядом с
+основной): ход задачи виден любому рабочему процессу, а запись хода
+выполнения не ждет блокировки записи основной БД, которую держит загрузка.
+Ход выполнения записывается не чаще раза в Config.JOB_PROGRESS_INTERVAL
+секунд (смена этапа - сразу). У задачи записан процесс, который ее
+выполняет: задачи завершившегося процесса (перезапуск приложения)
+отмечаются как прерванные.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import (
+    Column, DateTime, Integer, MetaData, String, Table, Text,
+    create_engine, event, select
+)
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import StaticPool
+from config import Config
+from models import db
+from database import apply_profile, is_file_database
+from services import (
+    ingest_competition_list,
+    upload_messages,
+    calculate_passing_scores,
+    passing_scores_message,
+    ensure_enrollment
+)
+
+
+_executor = None
+_engine = None
+_lock = threading.Lock()
+
+# Статусы незавершенных задач
+ACTIVE = ('queued', 'running')
+
+metadata = MetaData()
+
+jobs_table = Table(
+    'jobs', metadata,
+    Column('id', String(12), primary_key=True),
+    Column('kind', String(20), nullable=False),
+    Column('date', String(10)),
+    Column('status', String(20), nullable=False),
+    Column('stage', String(20), nullable=False),
+    Column('rows_parsed', Integer, nullable=False, default=0),
+    Column('rows_written', Integer, nullable=False, default=0),
+    # Сообщения о результате - JSON [[текст, категория], ...]
+    Column('messages', Text),
+    Column('error', Text),
+    Column('follow_up', String(12)),
+    # Процесс, который выполняет задачу
+    Column('pid', Integer),
+    Column('created_at', DateTime, nullable=False),
+    Column('started_at', DateTime),
+    Column('finished_at', DateTime),
+)
+
+
+def job_database_url(url):
+    """
+    Адрес БД задач: Config.JOB_DATABASE_URL или файл рядом с основной БД url
+    """
+    if Config.JOB_DATABASE_URL:
+        return make_url(Config.JOB_DATABASE_URL)
+    url = make_url(url)
+    if not is_file_database(url):
+        return make_url('sqlite://')
+    return url.set(database=os.path.splitext(url.database)[0] + '.jobs.db')
+
+
+def init_jobs():
+    """
+    Создает БД задач и отмечает задачи завершившихся процессов прерванными
+
+    Вызывается внутри контекста приложения.
+    """
+    global _engine
+    url = job_database_url(db.engine.url)
+    if is_file_database(url):
+        engine = create_engine(url)
+    else:
+        # БД в памяти - одна на все потоки процесса
+        engine = create_engine(url, poolclass=StaticPool, connect_args={'check_same_thread': False})
+    event.listen(engine, 'connect', apply_profile)
+    metadata.create_all(engine)
+    _engine = engine
+    abandon_jobs()
+
+
+def process_alive(pid):
+    """
+    Выполняется ли процесс pid
+    """
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def abandon_jobs(job_ids=None):
+    """
+    Отмечает незавершенные задачи завершившихся процессов прерванными
+
+    job_ids - проверяемые задачи (None - все). Возвращает число задач.
+    """
+    query = select(jobs_table.c.id, jobs_table.c.pid).where(jobs_table.c.status.in_(ACTIVE))
+    if job_ids is not None:
+        query = query.where(jobs_table.c.id.in_(job_ids))
+    with _engine.begin() as connection:
+        abandoned = [job_id for job_id, pid in connection.execute(query) if not process_alive(pid)]
+        if abandoned:
+            connection.execute(
+                jobs_table.update()
+                .where(jobs_table.c.id.in_(abandoned), jobs_table.c.status.in_(ACTIVE))
+                .values(status='failed', stage='failed', finished_at=datetime.now(),
+                        error='Задача прервана: процесс приложения завершился')
+            )
+    return len(abandoned)
+
+
+class Job:
+    """
+    Фоновая задача в процессе, который ее выполняет
+
+    Изменения состояния записываются в таблицу jobs (save).
+    """
+    def __init__(self, kind, date):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.date = date
+        self.stage = 'queued'
+        self.rows_parsed = 0
+        self.rows_written = 0
+        self.messages = []
+        # Когда ход выполнения последний раз записан (time.monotonic)
+        self.saved_at = 0.0
+
+    def save(self, **values):
+        """
+        Записывает поля задачи в таблицу jobs
+        """
+        if 'messages' in values:
+            values['messages'] = json.dumps(values['messages'], ensure_ascii=False)
+        with _engine.begin() as connection:
+            connection.execute(jobs_table.update().where(jobs_table.c.id == self.id).values(**values))
+        self.saved_at = time.monotonic()
+
+    def update(self, stage=None, rows_parsed=None, rows_written=None):
+        """
+        Обработчик хода выполнения (см. ingest.notify)
+        """
+        changed = stage is not None and stage != self.stage
+        if stage is not None:
+            self.stage = stage
+        if rows_parsed is not None:
+            self.rows_parsed = rows_parsed
+        if rows_written is not None:
+            self.rows_written = rows_written
+        if changed or time.monotonic() - self.saved_at >= Config.JOB_PROGRESS_INTERVAL:
+            self.save(stage=self.stage, rows_parsed=self.rows_parsed, rows_written=self.rows_written)
+
+
+def job_dict(record):
+    """
+    Состояние задачи из строки таблицы jobs
+    """
+    started_at, finished_at = record['started_at'], record['finished_at']
+    elapsed = ((finished_at or datetime.now()) - started_at).total_seconds() if started_at else 0.0
+    messages = json.loads(record['messages']) if record['messages'] else []
+    return {
+        'id': record['id'],
+        'kind': record['kind'],
+        'date': record['date'],
+        'status': record['status'],
+        'stage': record['stage'],
+        'rows_parsed': record['rows_parsed'],
+        'rows_written': record['rows_written'],
+        'elapsed': round(elapsed, 2),
+        'messages': [{'text': text, 'category': category} for text, category in messages],
+        'error': record['error'],
+        'follow_up': record['follow_up']
+    }
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=Config.JOB_WORKERS,
+            thread_name_prefix='jobs'
+        )
+    return _executor
+
+
+def get_job(job_id):
+    """
+    Состояние задачи (job_dict) или None
+
+    Задача может выполняться другим рабочим процессом - состояние читается
+    из таблицы jobs.
+    """
+    query = select(jobs_table).where(jobs_table.c.id == job_id)
+    with _engine.connect() as connection:
+        record = connection.execute(query).mappings().first()
+    if record is not None and record['status'] in ACTIVE and abandon_jobs([job_id]):
+        return get_job(job_id)
+    return job_dict(record) if record is not None else None
+
+
+def active_job(date, kinds):
+    """
+    id незавершенной задачи одного из видов kinds за дату или None
+    """
+    query = select(jobs_table.c.id, jobs_table.c.pid).where(
+        jobs_table.c.date == date,
+        jobs_table.c.kind.in_(kinds),
+        jobs_table.c.status.in_(ACTIVE)
+    ).order_by(jobs_table.c.created_at.desc())
+    with _engine.connect() as connection:
+        for job_id, pid in connection.execute(query):
+            if process_alive(pid):
+                return job_id
+    return None
+
+
+def register(job):
+    """
+    Записывает новую задачу в таблицу jobs
+    """
+    with _engine.begin() as connection:
+        connection.execute(jobs_table.insert().values(
+            id=job.id, kind=job.kind, date=job.date, status='queued', stage=job.stage,
+            rows_parsed=0, rows_written=0, pid=os.getpid(), created_at=datetime.now()
+        ))
+        # Забываем самые старые завершенные задачи
+        finished = select(jobs_table.c.id).where(
+            jobs_table.c.status.notin_(ACTIVE)
+        ).order_by(jobs_table.c.created_at.desc()).offset(Config.JOB_HISTORY)
+        connection.execute(jobs_table.delete().where(jobs_table.c.id.in_(finished)))
+    job.saved_at = time.monotonic()
+
+
+def submit(app, kind, date, func, *args, on_success=None):
+    """
+    Ставит func(job, *args) в очередь пула и возвращает задачу
+    """
+    job = Job(kind, date)
+    register(job)
+    get_executor().submit(run, app, job, func, args, on_success)
+    return job
+
+
+def run(app, job, func, args, on_success):
+    with app.app_context():
+        job.stage = 'running'
+        job.save(status='running', stage='running', started_at=datetime.now())
+        try:
+            func(job, *args)
+            status, error = 'done', None
+        except Exception as e:
+            db.session.rollback()
+            status, error = 'failed', str(e)
+        finally:
+            db.session.remove()
+        job.stage = status
+        job.save(status=status, stage=status, rows_parsed=job.rows_parsed,
+                 rows_written=job.rows_written, messages=job.messages, error=error,
+                 finished_at=datetime.now())
+
+        if status == 'done' and on_success is not None:
+            on_success(job)
+
+
+def run_upload(job, path, date):
+    """
+    Загрузка сохраненного файла path за дату; временный файл удаляется
+    """
+    try:
+        with open(path, 'rb') as f:
+            stats = ingest_competition_list(f, date, job.update)
+    finally:
+        os.remove(path)
+    job.messages = upload_messages(stats)
+
+
+def run_calculation(job, date):
+    job.update(stage='calculating')
+    results = calculate_passing_scores(date)
+    job.messages = [(passing_scores_message(results), 'success')]
+
+
+def run_preparation(job, date):
+    job.update(stage='calculating')
+    ensure_enrollment(date)
+    job.messages = [(f"Список за {date.replace('_', '.')} подготовлен к просмотру", 'success')]
+
+
+def submit_preparation(app, date):
+    """
+    Ставит в очередь подготовку даты к чтению страниц (развертывание и
+    сохранение распределения); возвращает id задачи
+
+    Если загрузка, расчет или подготовка этой даты уже поставлены в очередь
+    (любым процессом), новая задача не ставится - после них дата готова.
+    """
+    job_id = active_job(date, ('upload', 'calculate', 'prepare'))
+    if job_id is None:
+        job_id = submit(app, 'prepare', date, run_preparation, date).id
+    return job_id
+
+
+def submit_calculation(app, date):
+    """
+    Ставит в очередь пересчет проходных баллов за дату
+    """
+    return submit(app, 'calculate', date, run_calculation, date)
+
+
+def submit_upload(app, path, date):
+    """
+    Ставит в очередь загрузку файла path за дату и затем пересчет баллов
+    """
+    def follow_up(job):
+        job.save(follow_up=submit_calculation(app, date).id)
+
+    return submit(app, 'upload', date, run_upload, path, date, on_success=follow_up)
@@ -0,0 +1,168 @@
+"""
+Пакетная загрузка всех конкурсных списков из Config.DATA_DIR
+
+Файлы разбираются параллельно в отдельных процессах (parsing.read_columns),
+а в БД записываются последовательно через одно соединение-писатель.
+На время загрузки включаются быстрые настройки SQLite, а вторичные
+индексы таблицы applicants удаляются и строятся заново после загрузки.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from sqlalchemy import event
+from config import Config
+from models import db, Applicant
+from ingest import ingest_records, write_hash, file_hash
+from parsing import batch_records, read_columns
+from allocation import bump_version
+from snapshots import evict_snapshots, materialize, record_snapshot
+from catalog import record_upload
+
+
+# Настройки SQLite на время загрузки (поверх профиля database.py). Журнал
+# остается из профиля: в режиме WAL страницы читают БД во время загрузки
+LOAD_PRAGMAS = (
+    'PRAGMA synchronous=OFF',
+    'PRAGMA cache_size=-262144',
+    'PRAGMA temp_store=MEMORY',
+)
+
+
+def discover_files(data_dir, dates=None):
+    """
+    Возвращает [(дата, путь)] CSV файлов каталога, при необходимости только за dates
+    """
+    if not os.path.exists(data_dir):
+        return []
+
+    wanted = {date.replace('.', '_').strip() for date in dates} if dates else None
+    files = []
+    for name in sorted(os.listdir(data_dir)):
+        if not name.endswith('.csv'):
+            continue
+        date = name[:-len('.csv')]
+        if wanted is None or date in wanted:
+            files.append((date, os.path.join(data_dir, name)))
+    return files
+
+
+def parse_file(date, path, batch_size):
+    """
+    Разбирает файл в рабочем процессе; возвращает (дата, столбцы, время, ошибка)
+    """
+    start_time = datetime.now()
+    try:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            columns = read_columns(f, batch_size)
+        error = None
+    except Exception as e:
+        columns = None
+        error = str(e).replace('<br>', '; ')
+    return date, columns, (datetime.now() - start_time).total_seconds(), error
+
+
+def apply_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in LOAD_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+def load_directory(data_dir=None, dates=None, workers=None, echo=print):
+    """
+    Загружает все файлы каталога (или только за dates) и возвращает сводку
+
+    Вызывается внутри контекста приложения. Сводка - список словарей
+    {'date', 'rows', 'parse_time', 'write_time', 'rows_per_second', 'error', ...}.
+    """
+    data_dir = data_dir or Config.DATA_DIR
+    files = discover_files(data_dir, dates)
+    if not files:
+        echo("Нет CSV файлов для загрузки")
+        return []
+
+    paths = dict(files)
+    table = Applicant.__table__
+    summary = []
+
+    # Новые соединения получают настройки загрузки
+    db.engine.dispose()
+    event.listen(db.engine, 'connect', apply_pragmas)
+    try:
+        connection = db.session.connection()
+        for index in table.indexes:
+            index.drop(connection, checkfirst=True)
+        db.session.commit()
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(parse_file, date, path, Config.INGEST_BATCH_SIZE)
+                for date, path in files
+            ]
+            # Писатель один: файлы записываются по мере готовности разбора
+            for future in as_completed(futures):
+                date, columns, parse_time, error = future.result()
+                if error:
+                    summary.append({'date': date, 'rows': 0, 'parse_time': parse_time, 'write_time': 0.0,
+                                    'rows_per_second': 0.0, 'error': error})
+                    continue
+
+                # Список сравнивается с развернутой датой - записываются только изменения
+                materialize(date, evict=False)
+                stats = ingest_records(date, batch_records(columns))
+                content_hash = file_hash(paths[date], Config.INGEST_CHUNK_SIZE)
+                write_hash(paths[date], content_hash)
+                bump_version(date, stats['changed_ids'])
+                record_upload(date, stats['rows'], content_hash)
+                total_time = parse_time + stats['elapsed']
+                summary.append({
+                    'date': date,
+                    'rows': stats['rows'],
+                    'inserted': stats['inserted'],
+                    'updated': stats['updated'],
+                    'deleted': stats['deleted'],
+                    'parse_time': parse_time,
+                    'write_time': stats['elapsed'],
+                    'rows_per_second': stats['rows'] / total_time if total_time > 0 else 0.0,
+                    'error': None
+                })
+    finally:
+        # Индексы строятся один раз после загрузки
+        db.session.rollback()
+        connection = db.session.connection()
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+        db.session.commit()
+        db.session.close()
+
+        # Новые соединения снова получают только профиль Config.SQLITE_PROFILE
+        event.remove(db.engine, 'connect', apply_pragmas)
+        db.engine.dispose()
+
+    summary.sort(key=lambda item: item['date'])
+
+    # Изменения по датам записываются после построения индексов
+    for item in summary:
+        if not item['error']:
+            record_snapshot(item['date'], evict=False)
+    evict_snapshots()
+    return summary
+
+
+def print_summary(summary, echo=print):
+    """
+    Печатает таблицу пропускной способности по файлам
+    """
+    echo(f"{'Дата':<8} {'Строк':>10} {'Разбор, с':>10} {'Запись, с':>10} {'Строк/с':>10}")
+    total_rows = 0
+    for item in summary:
+        if item['error']:
+            echo(f"{item['date']:<8} ОШИБКА: {item['error']}")
+            continue
+        total_rows += item['rows']
+        echo(
+            f"{item['date']:<8} {item['rows']:>10} {item['parse_time']:>10.2f} "
+            f"{item['write_time']:>10.2f} {item['rows_per_second']:>10.0f}"
+        )
+    echo(f"Всего загружено строк: {total_rows}")
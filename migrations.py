@@ -0,0 +1,309 @@
+"""
+Версионные миграции схемы БД
+
+db.create_all() создает только отсутствующие таблицы и не изменяет
+существующие, поэтому изменения ключей и индексов существующих таблиц
+выполняются миграциями. Миграция - функция(connection) с номером;
+примененные номера хранятся в таблице schema_migrations, и каждая
+миграция выполняется один раз.
+
+Миграции проверяют текущее состояние схемы: на новой БД, созданной
+create_all по текущим моделям, они ничего не меняют и только отмечаются
+как примененные.
+
+Использование:
+    python init_db.py migrate       - применить новые миграции
+(при запуске приложения миграции применяются автоматически)
+"""
+
+from datetime import datetime
+from sqlalchemy import Boolean, Column, DateTime, Integer, MetaData, String, Table, inspect, select
+from config import Config
+from models import db, Applicant, ApplicantChange, CampaignDate, Enrollment, PassingScore, SchemaMigration
+from dimensions import sync_programs
+from snapshots import build_snapshots
+from catalog import sync_catalog
+
+
+# Таблица applicants до миграции 5 (строковые дата и код программы) -
+# в таком виде ее создает миграция 1
+legacy_metadata = MetaData()
+legacy_applicants = Table(
+    'applicants',
+    legacy_metadata,
+    Column('id', Integer, primary_key=True),
+    Column('upload_date', String(20), primary_key=True),
+    Column('program_code', String(10), primary_key=True),
+    Column('priority', Integer, nullable=False),
+    Column('physics_ict_score', Integer, nullable=False),
+    Column('russian_score', Integer, nullable=False),
+    Column('math_score', Integer, nullable=False),
+    Column('extra_score', Integer, nullable=False),
+    Column('total_score', Integer, nullable=False),
+    Column('has_consent', Boolean, nullable=False),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime),
+)
+
+
+def index_names(connection, table_name):
+    return {index['name'] for index in inspect(connection).get_indexes(table_name)}
+
+
+def drop_indexes(connection, table_name, names):
+    existing = index_names(connection, table_name)
+    for name in names:
+        if name in existing:
+            connection.exec_driver_sql(f'DROP INDEX "{name}"')
+
+
+def create_indexes(connection, table):
+    for index in table.indexes:
+        index.create(connection, checkfirst=True)
+
+
+def column_names(connection, table_name):
+    return {column['name'] for column in inspect(connection).get_columns(table_name)}
+
+
+def rebuild_table(connection, table, columns, select_sql):
+    """
+    Пересоздает таблицу по определению table и переносит данные
+
+    select_sql - запрос к прежней таблице ({table}_old), возвращающий
+    значения столбцов columns.
+    """
+    name = table.name
+    # Имена индексов прежней таблицы нужны новой
+    drop_indexes(connection, name, index_names(connection, name))
+    connection.exec_driver_sql(f'ALTER TABLE {name} RENAME TO {name}_old')
+    table.create(connection)
+    names = ', '.join(f'"{column}"' for column in columns)
+    connection.exec_driver_sql(f'INSERT INTO {name} ({names}) {select_sql}')
+    connection.exec_driver_sql(f'DROP TABLE {name}_old')
+
+
+def applicants_primary_key(connection):
+    """
+    Ключ applicants (id, upload_date) -> (id, upload_date, program_code)
+
+    SQLite не изменяет первичный ключ существующей таблицы, поэтому таблица
+    пересоздается по текущей модели и данные копируются.
+    """
+    key = inspect(connection).get_pk_constraint('applicants')['constrained_columns']
+    if len(key) == 3:
+        return
+
+    columns = [column.name for column in legacy_applicants.columns]
+    names = ', '.join(f'"{column}"' for column in columns)
+    rebuild_table(connection, legacy_applicants, columns, f'SELECT {names} FROM applicants_old')
+
+
+def applicants_indexes(connection):
+    """
+    Составные индексы applicants вместо индексов по одному столбцу
+    """
+    drop_indexes(connection, 'applicants', ['ix_applicants_upload_date', 'ix_applicants_program_code'])
+    # Индексы таблицы со строковыми ключами пересоздает миграция 5
+    if 'date_id' in column_names(connection, 'applicants'):
+        create_indexes(connection, Applicant.__table__)
+
+
+def passing_scores_unique(connection):
+    """
+    Уникальный ключ (upload_date, program_code) в passing_scores
+
+    Из повторяющихся записей остается последняя добавленная.
+    """
+    connection.exec_driver_sql(
+        'DELETE FROM passing_scores WHERE id NOT IN '
+        '(SELECT MAX(id) FROM passing_scores GROUP BY upload_date, program_code)'
+    )
+    drop_indexes(connection, 'passing_scores', ['ix_passing_scores_upload_date', 'ix_passing_scores_program_code'])
+    create_indexes(connection, PassingScore.__table__)
+
+
+def snapshot_store(connection):
+    """
+    Хранилище изменений по датам (snapshots.py) для уже загруженных дат
+    """
+    # Для таблицы со строковыми ключами хранилище строит миграция 5
+    if 'date_id' in column_names(connection, 'applicants'):
+        build_snapshots(connection)
+
+
+def dimension_keys(connection):
+    """
+    Дата и программа - номера в справочниках campaign_dates и programs
+
+    applicants, enrollments и applicant_changes пересоздаются с целочисленными
+    ключами; отметки created_at/updated_at переносятся, только если включен
+    Config.APPLICANT_AUDIT_TIMESTAMPS.
+    """
+    sync_programs(connection)
+    legacy = [
+        table for table in (Applicant.__table__, Enrollment.__table__, ApplicantChange.__table__)
+        if 'upload_date' in column_names(connection, table.name)
+    ]
+    if not legacy:
+        return
+
+    # Номера дат - по порядку дат
+    dates = set()
+    for table in legacy:
+        dates.update(connection.exec_driver_sql(f'SELECT DISTINCT upload_date FROM {table.name}').scalars())
+    existing = set(connection.execute(select(CampaignDate.upload_date)).scalars())
+    for date in sorted(dates - existing):
+        connection.execute(CampaignDate.__table__.insert().values(upload_date=date))
+
+    joins = (
+        'JOIN campaign_dates d ON d.upload_date = o.upload_date '
+        'JOIN programs p ON p.code = o.program_code'
+    )
+    audit = 'o.created_at, o.updated_at' if Config.APPLICANT_AUDIT_TIMESTAMPS else 'NULL, NULL'
+    values = 'o.priority, o.physics_ict_score, o.russian_score, o.math_score, o.extra_score, o.total_score, o.has_consent'
+    fields = ['priority', 'physics_ict_score', 'russian_score', 'math_score', 'extra_score', 'total_score', 'has_consent']
+
+    for table in legacy:
+        if table.name == 'applicants':
+            rebuild_table(
+                connection, table,
+                ['id', 'date_id', 'program_id'] + fields + ['created_at', 'updated_at'],
+                f'SELECT o.id, d.id, p.id, {values}, {audit} FROM applicants_old o {joins}'
+            )
+        elif table.name == 'enrollments':
+            rebuild_table(
+                connection, table,
+                ['date_id', 'applicant_id', 'program_id', 'rank', 'status', 'version'],
+                f'SELECT d.id, o.applicant_id, p.id, o.rank, o.status, o.version FROM enrollments_old o {joins}'
+            )
+        else:
+            rebuild_table(
+                connection, table,
+                ['date_id', 'id', 'program_id', 'change'] + fields,
+                f'SELECT d.id, o.id, p.id, o.change, {values} FROM applicant_changes_old o {joins}'
+            )
+
+    if not connection.exec_driver_sql('SELECT 1 FROM snapshots LIMIT 1').first():
+        build_snapshots(connection)
+
+
+def keyset_indexes(connection):
+    """
+    Индексы списков applicants с полным ключом страницы (total_score, id, ...)
+    """
+    existing = {
+        index['name']: index['column_names']
+        for index in inspect(connection).get_indexes('applicants')
+    }
+    for index in Applicant.__table__.indexes:
+        columns = [column.name for column in index.columns]
+        if index.name in existing and existing[index.name] != columns:
+            connection.exec_driver_sql(f'DROP INDEX "{index.name}"')
+        index.create(connection, checkfirst=True)
+
+
+def filter_indexes(connection):
+    """
+    Индексы applicants для сортировки и фильтров списков по ID и приоритету
+    """
+    create_indexes(connection, Applicant.__table__)
+
+
+def calculation_counter(connection):
+    """
+    Номер расчета проходных баллов в data_versions
+    """
+    if 'calculation' not in column_names(connection, 'data_versions'):
+        connection.exec_driver_sql(
+            'ALTER TABLE data_versions ADD COLUMN calculation INTEGER NOT NULL DEFAULT 0'
+        )
+
+
+def dataset_catalog(connection):
+    """
+    Каталог загруженных списков (catalog.py) по файлам папки data
+    """
+    sync_catalog(connection)
+
+
+def enrollment_version(connection):
+    """
+    Версия данных сохраненного распределения в data_versions
+
+    Для дат с сохраненными строками enrollments - их версия.
+    """
+    if 'enrollment_version' in column_names(connection, 'data_versions'):
+        return
+    connection.exec_driver_sql('ALTER TABLE data_versions ADD COLUMN enrollment_version INTEGER')
+    connection.exec_driver_sql(
+        'UPDATE data_versions SET enrollment_version = ('
+        'SELECT MAX(e.version) FROM enrollments e '
+        'JOIN campaign_dates d ON d.id = e.date_id '
+        'WHERE d.upload_date = data_versions.upload_date)'
+    )
+
+
+def snapshot_usage(connection):
+    """
+    Время последнего обращения к дате и номер свертывания в snapshots
+    """
+    columns = column_names(connection, 'snapshots')
+    if 'used_at' not in columns:
+        connection.exec_driver_sql('ALTER TABLE snapshots ADD COLUMN used_at DATETIME')
+    if 'generation' not in columns:
+        connection.exec_driver_sql('ALTER TABLE snapshots ADD COLUMN generation INTEGER NOT NULL DEFAULT 0')
+
+
+# Миграции по порядку: (номер, название, функция)
+MIGRATIONS = [
+    (1, 'applicants_primary_key', applicants_primary_key),
+    (2, 'applicants_indexes', applicants_indexes),
+    (3, 'passing_scores_unique', passing_scores_unique),
+    (4, 'snapshot_store', snapshot_store),
+    (5, 'dimension_keys', dimension_keys),
+    (6, 'keyset_indexes', keyset_indexes),
+    (7, 'filter_indexes', filter_indexes),
+    (8, 'calculation_counter', calculation_counter),
+    (9, 'dataset_catalog', dataset_catalog),
+    (10, 'enrollment_version', enrollment_version),
+    (11, 'snapshot_usage', snapshot_usage),
+]
+
+
+def applied_versions(connection):
+    table = SchemaMigration.__table__
+    return {row.version for row in connection.execute(select(table.c.version))}
+
+
+def migrate(engine=None, echo=print):
+    """
+    Применяет новые миграции; возвращает список примененных (номер, название)
+
+    Таблицы должны быть созданы (db.create_all) до вызова.
+    """
+    engine = engine or db.engine
+    table = SchemaMigration.__table__
+    with engine.begin() as connection:
+        applied = applied_versions(connection)
+
+    done = []
+    for version, name, func in MIGRATIONS:
+        if version in applied:
+            continue
+        # Миграция и отметка о ней - в одной транзакции
+        with engine.begin() as connection:
+            func(connection)
+            connection.execute(table.insert().values(version=version, name=name, applied_at=datetime.utcnow()))
+        done.append((version, name))
+        if echo:
+            echo(f"Применена миграция {version}: {name}")
+    return done
+
+
+def schema_version(engine=None):
+    """
+    Номер последней примененной миграции (0 - миграции не применялись)
+    """
+    with (engine or db.engine).connect() as connection:
+        return max(applied_versions(connection), default=0)
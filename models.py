@@ -1,29 +1,120 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import select
+from sqlalchemy.ext.hybrid import hybrid_property
 from datetime import datetime
+from database import RoutingSession
 
-db = SQLAlchemy()
+# Сессия выбирает пул соединений: чтение GET-запросов - пул чтения (database.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+class Program(db.Model):
+    """
+    Образовательная программа (п.6) - справочник для целочисленных ссылок
+
+    Заполняется по Config.PROGRAMS при запуске приложения (dimensions.sync_programs).
+    """
+    __tablename__ = 'programs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    code = db.Column(db.String(10), nullable=False, unique=True)
+    name = db.Column(db.String(100), nullable=False)
+
+    def __repr__(self):
+        return f'<Program {self.id}: {self.code}>'
+
+
+class CampaignDate(db.Model):
+    """
+    День приемной кампании - справочник для целочисленных ссылок
+
+    upload_date - дата в формате дд_мм (как имя файла в data). Строка
+    добавляется при первой загрузке списка за дату и не удаляется, поэтому
+    номер даты не меняется.
+    """
+    __tablename__ = 'campaign_dates'
+
+    id = db.Column(db.Integer, primary_key=True)
+    upload_date = db.Column(db.String(20), nullable=False, unique=True)
+
+    def __repr__(self):
+        return f'<CampaignDate {self.id}: {self.upload_date}>'
+
+
+class Dataset(db.Model):
+    """
+    Конкурсный список за дату в каталоге загруженных списков (см. catalog.py)
+
+    Строка записывается при загрузке списка и удаляется вместе с ним.
+    rows - строк в списке, content_hash - SHA-256 загруженного файла,
+    calculated_at - время последнего расчета проходных баллов за дату.
+    """
+    __tablename__ = 'datasets'
+
+    upload_date = db.Column(db.String(20), primary_key=True)
+    rows = db.Column(db.Integer, nullable=False, default=0)
+    content_hash = db.Column(db.String(64))
+    uploaded_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    calculated_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<Dataset {self.upload_date}: {self.rows} строк>'
 
 
 class Applicant(db.Model):
     __tablename__ = 'applicants'
     __table_args__ = (
-        db.PrimaryKeyConstraint('id', 'upload_date'),
+        # Абитуриент может подать заявления на несколько программ (п.7)
+        db.PrimaryKeyConstraint('id', 'date_id', 'program_id'),
+        # Индексы под запросы визуализации и расчета (см. query_plans.py):
+        # общий список по убыванию баллов, список программы по убыванию баллов,
+        # заявления с согласием и их количество по программам. Индексы списков
+        # содержат весь ключ страницы (services.SORT_KEYS) - страница читается
+        # из индекса без сортировки
+        db.Index('ix_applicants_date_score', 'date_id', 'total_score', 'id', 'program_id'),
+        db.Index('ix_applicants_date_program_score', 'date_id', 'program_id', 'total_score', 'id'),
+        db.Index('ix_applicants_date_consent', 'date_id', 'has_consent', 'program_id'),
+        # Сортировка и фильтры списков (services.filter_conditions): по ID и
+        # началу ID, по приоритету
+        db.Index('ix_applicants_date_id', 'date_id', 'id', 'program_id'),
+        db.Index('ix_applicants_date_priority', 'date_id', 'priority', 'id', 'program_id'),
     )
 
+    # Дата и программа - номера в справочниках campaign_dates и programs:
+    # строка и индексы короче, чем со строковыми ключами
     id = db.Column(db.Integer, nullable=False)  # id из CSV
-    upload_date = db.Column(db.String(20), nullable=False, index=True)
-    program_code = db.Column(db.String(10), nullable=False, index=True)
-    priority = db.Column(db.Integer, nullable=False)
-    physics_ict_score = db.Column(db.Integer, nullable=False)
-    russian_score = db.Column(db.Integer, nullable=False)
-    math_score = db.Column(db.Integer, nullable=False)
-    extra_score = db.Column(db.Integer, nullable=False)
-    total_score = db.Column(db.Integer, nullable=False)
+    date_id = db.Column(db.SmallInteger, db.ForeignKey('campaign_dates.id'), nullable=False)
+    program_id = db.Column(db.SmallInteger, db.ForeignKey('programs.id'), nullable=False)
+    priority = db.Column(db.SmallInteger, nullable=False)
+    physics_ict_score = db.Column(db.SmallInteger, nullable=False)
+    russian_score = db.Column(db.SmallInteger, nullable=False)
+    math_score = db.Column(db.SmallInteger, nullable=False)
+    extra_score = db.Column(db.SmallInteger, nullable=False)
+    total_score = db.Column(db.SmallInteger, nullable=False)
     has_consent = db.Column(db.Boolean, default=False, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Заполняются, только если включен Config.APPLICANT_AUDIT_TIMESTAMPS
+    created_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+    program = db.relationship(Program)
+    campaign_date = db.relationship(CampaignDate)
+
+    @hybrid_property
+    def program_code(self):
+        return self.program.code
+
+    @program_code.expression
+    def program_code(cls):
+        return select(Program.code).where(Program.id == cls.program_id).scalar_subquery()
+
+    @hybrid_property
+    def upload_date(self):
+        return self.campaign_date.upload_date
+
+    @upload_date.expression
+    def upload_date(cls):
+        return select(CampaignDate.upload_date).where(CampaignDate.id == cls.date_id).scalar_subquery()
 
-    
     def __repr__(self):
         return f'<Applicant {self.id} - {self.program_code}>'
     
@@ -47,14 +138,137 @@ class PassingScore(db.Model):
     Модель для хранения проходных баллов по программам на определенную дату
     """
     __tablename__ = 'passing_scores'
+    __table_args__ = (
+        # Один проходной балл на программу за дату
+        db.Index('uq_passing_scores_date_program', 'upload_date', 'program_code', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    program_code = db.Column(db.String(10), nullable=False, index=True)
+    program_code = db.Column(db.String(10), nullable=False)
     passing_score = db.Column(db.Integer, nullable=True)  # None означает НЕДОБОР
-    upload_date = db.Column(db.String(20), nullable=False, index=True)
+    upload_date = db.Column(db.String(20), nullable=False)
     seats_available = db.Column(db.Integer, nullable=False)
     applicants_with_consent = db.Column(db.Integer, nullable=False)
     calculated_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
         return f'<PassingScore {self.program_code} - {self.upload_date}: {self.passing_score}>'
+
+
+class DataVersion(db.Model):
+    """
+    Версия данных за дату: увеличивается при каждой загрузке и удалении списка
+
+    Используется как ключ для кэшированных результатов (например, распределения мест),
+    общий для всех процессов приложения.
+    """
+    __tablename__ = 'data_versions'
+
+    upload_date = db.Column(db.String(20), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    # Номер расчета проходных баллов за дату: вместе с version - ключ кэша
+    # результатов страниц (result_cache.py)
+    calculation = db.Column(db.Integer, nullable=False, default=0)
+    # Версия данных, по которой сохранено распределение в enrollments
+    # (None - не сохранялось); распределение без зачисленных тоже сохранено
+    enrollment_version = db.Column(db.Integer)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DataVersion {self.upload_date}: {self.version}>'
+
+
+class Enrollment(db.Model):
+    """
+    Сохраненное распределение мест за дату (П.13): зачисленные абитуриенты
+
+    Записывается расчетом проходных баллов одним пакетом. rank - место в списке
+    зачисленных на программу (по убыванию баллов), version - версия данных
+    (data_versions), по которой выполнено распределение: строки прежних версий
+    при чтении не учитываются.
+    """
+    __tablename__ = 'enrollments'
+    __table_args__ = (
+        # Абитуриент зачисляется не более чем на одну программу
+        db.PrimaryKeyConstraint('date_id', 'applicant_id'),
+        db.Index('ix_enrollments_program', 'date_id', 'program_id', 'rank'),
+    )
+
+    date_id = db.Column(db.SmallInteger, db.ForeignKey('campaign_dates.id'), nullable=False)
+    applicant_id = db.Column(db.Integer, nullable=False)
+    program_id = db.Column(db.SmallInteger, db.ForeignKey('programs.id'), nullable=False)
+    rank = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='enrolled')
+    version = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<Enrollment {self.applicant_id} - {self.program_id} ({self.date_id})>'
+
+
+class SchemaMigration(db.Model):
+    """
+    Примененная миграция схемы БД (см. migrations.py)
+    """
+    __tablename__ = 'schema_migrations'
+
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SchemaMigration {self.version}: {self.name}>'
+
+
+class Snapshot(db.Model):
+    """
+    Дата в хранилище снимков (см. snapshots.py)
+
+    base_date - предыдущая дата, относительно которой записаны изменения
+    (None - базовый снимок), rows - строк в списке за дату, changes - записей
+    изменений. materialized - заявления за дату развернуты в таблице applicants.
+    used_at - последнее обращение к дате (любым процессом), generation -
+    сколько раз дата сворачивалась (входит в ключ кэша результатов).
+    """
+    __tablename__ = 'snapshots'
+
+    upload_date = db.Column(db.String(20), primary_key=True)
+    base_date = db.Column(db.String(20))
+    rows = db.Column(db.Integer, nullable=False, default=0)
+    changes = db.Column(db.Integer, nullable=False, default=0)
+    materialized = db.Column(db.Boolean, nullable=False, default=True)
+    materialized_at = db.Column(db.DateTime, default=datetime.utcnow)
+    used_at = db.Column(db.DateTime)
+    generation = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<Snapshot {self.upload_date} ({self.changes} изменений)>'
+
+
+class ApplicantChange(db.Model):
+    """
+    Изменение заявления за дату относительно предыдущей даты
+
+    change: 'added' - новое заявление, 'changed' - изменились баллы, приоритет
+    или согласие, 'removed' - заявление отозвано (значения не хранятся).
+    """
+    __tablename__ = 'applicant_changes'
+    __table_args__ = (
+        db.PrimaryKeyConstraint('date_id', 'id', 'program_id'),
+        # Строки хранятся прямо в B-дереве первичного ключа, без отдельного индекса
+        {'sqlite_with_rowid': False},
+    )
+
+    date_id = db.Column(db.SmallInteger, db.ForeignKey('campaign_dates.id'), nullable=False)
+    id = db.Column(db.Integer, nullable=False)
+    program_id = db.Column(db.SmallInteger, db.ForeignKey('programs.id'), nullable=False)
+    change = db.Column(db.String(10), nullable=False)
+    priority = db.Column(db.SmallInteger)
+    physics_ict_score = db.Column(db.SmallInteger)
+    russian_score = db.Column(db.SmallInteger)
+    math_score = db.Column(db.SmallInteger)
+    extra_score = db.Column(db.SmallInteger)
+    total_score = db.Column(db.SmallInteger)
+    has_consent = db.Column(db.Boolean)
+
+    def __repr__(self):
+        return f'<ApplicantChange {self.id} - {self.program_id} ({self.date_id}): {self.change}>'
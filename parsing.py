@@ -0,0 +1,276 @@
+"""
+П.7: Разбор и проверка конкурсных списков
+
+Строки CSV разбираются пакетами в столбцы NumPy: каждое поле декодируется
+в типизированный массив за один проход, а проверки выполняются над
+столбцами целиком. Ошибки собираются в компактный отчет (номер строки +
+причина), и файл с ошибками отклоняется до записи в БД.
+"""
+
+import csv
+import numpy as np
+from config import Config
+
+
+PROGRAMS = Config.PROGRAMS
+
+# Коды программ в порядке Config.PROGRAMS и отсортированные (для поиска индекса)
+PROGRAM_CODES = np.array(list(PROGRAMS.keys()))
+SORTED_PROGRAM_CODES = np.sort(PROGRAM_CODES)
+
+# Приоритет ОП - от 1 до количества программ (п.7)
+MAX_PRIORITY = len(PROGRAMS)
+
+# Колонки CSV
+CSV_FIELDS = ('id', 'program', 'priority', 'physics', 'rus', 'math', 'extra', 'total', 'consent')
+
+# Числовые колонки CSV и соответствующие им поля записи
+INT_COLUMNS = (
+    ('id', 'id'),
+    ('priority', 'priority'),
+    ('physics', 'physics_ict_score'),
+    ('rus', 'russian_score'),
+    ('math', 'math_score'),
+    ('extra', 'extra_score'),
+    ('total', 'total_score'),
+)
+
+# Порядок полей в записи, передаваемой в БД
+RECORD_FIELDS = (
+    'id',
+    'program_code',
+    'priority',
+    'physics_ict_score',
+    'russian_score',
+    'math_score',
+    'extra_score',
+    'total_score',
+    'has_consent',
+)
+
+# Не более 9 цифр, чтобы значение гарантированно помещалось в int64
+MAX_DIGITS = 9
+
+
+class ValidationError(ValueError):
+    """
+    Файл не прошел проверку; errors - первые ошибки (строка, причина), total - общее число
+    """
+    def __init__(self, errors, total):
+        self.errors = errors
+        self.total = total
+        super().__init__(self.message())
+
+    def message(self):
+        lines = [f"Строка {line}: {reason}" for line, reason in self.errors]
+        if self.total > len(self.errors):
+            lines.append(f"... и еще {self.total - len(self.errors)}")
+        return f"файл не прошел проверку, ошибок: {self.total}<br>" + "<br>".join(lines)
+
+
+class ErrorReport:
+    """
+    Компактный отчет об ошибках: хранит не более limit строк, но считает все
+    """
+    def __init__(self, limit=None):
+        self.limit = limit if limit is not None else Config.INGEST_MAX_REPORTED_ERRORS
+        self.errors = []
+        self.total = 0
+
+    def extend(self, errors, total=None):
+        """
+        Добавляет ошибки; total - их полное число, если передана только часть
+        """
+        self.total += total if total is not None else len(errors)
+        free = self.limit - len(self.errors)
+        if free > 0:
+            self.errors.extend(errors[:free])
+
+    def check(self):
+        """
+        Выбрасывает ValidationError, если в отчете есть ошибки
+        """
+        if self.total:
+            raise ValidationError(sorted(self.errors), self.total)
+
+
+def read_header(reader):
+    """
+    Читает заголовок и возвращает {колонка: позиция}
+    """
+    header = next(reader, None)
+    if header is None:
+        raise ValidationError([(1, "файл пуст")], 1)
+
+    index = {name.strip(): position for position, name in enumerate(header)}
+    missing = [name for name in CSV_FIELDS if name not in index]
+    if missing:
+        raise ValidationError([(1, f"нет колонок: {', '.join(missing)}")], 1)
+
+    return index, len(header)
+
+
+def parse_batch(rows, line_numbers, index, width):
+    """
+    Разбирает пакет строк csv.reader в столбцы и проверяет их
+
+    Возвращает (columns, errors):
+    - columns: {поле записи: массив} только для корректных строк, плюс 'line'
+    - errors: список (номер строки, причина), по одной причине на строку
+    """
+    errors = []
+    line_numbers = np.asarray(line_numbers, dtype=np.int64)
+
+    widths = np.fromiter(map(len, rows), dtype=np.int64, count=len(rows))
+    wrong_width = widths != width
+    if wrong_width.any():
+        errors.extend((int(line), "неверное число полей") for line in line_numbers[wrong_width])
+        rows = [row for row, ok in zip(rows, ~wrong_width) if ok]
+        line_numbers = line_numbers[~wrong_width]
+
+    if not rows:
+        return empty_columns(), errors
+
+    table = np.char.strip(np.array(rows, dtype=str))
+    valid = np.ones(len(rows), dtype=bool)
+
+    def reject(mask, reason):
+        # Для каждой строки сохраняется только первая причина
+        rejected = mask & valid
+        if rejected.any():
+            errors.extend((int(line), reason) for line in line_numbers[rejected])
+            valid[rejected] = False
+
+    # Числовые поля
+    columns = {}
+    for column, field in INT_COLUMNS:
+        raw = table[:, index[column]]
+        ok = np.char.isdecimal(raw) & (np.char.str_len(raw) <= MAX_DIGITS)
+        reject(~ok, f"поле {column}: ожидается целое неотрицательное число")
+        columns[field] = np.where(ok, raw, '0').astype(np.int64)
+
+    # Код программы (регистр не важен)
+    program = np.char.lower(table[:, index['program']])
+    reject(~np.isin(program, PROGRAM_CODES), "неизвестный код программы")
+    columns['program_code'] = program
+
+    # Согласие
+    consent = table[:, index['consent']]
+    reject(~np.isin(consent, ('0', '1')), "поле consent: ожидается 0 или 1")
+    columns['has_consent'] = consent == '1'
+
+    # Диапазон приоритета и сумма баллов
+    priority = columns['priority']
+    reject((priority < 1) | (priority > MAX_PRIORITY), f"приоритет вне диапазона 1-{MAX_PRIORITY}")
+    subjects_sum = (
+        columns['physics_ict_score'] + columns['russian_score']
+        + columns['math_score'] + columns['extra_score']
+    )
+    reject(columns['total_score'] != subjects_sum, "сумма баллов не равна сумме по предметам")
+
+    columns = {field: values[valid] for field, values in columns.items()}
+    columns['line'] = line_numbers[valid]
+    errors.sort()
+    return columns, errors
+
+
+def empty_columns():
+    """
+    Пустой набор столбцов
+    """
+    columns = {field: np.empty(0, dtype=np.int64) for field in RECORD_FIELDS}
+    columns['program_code'] = np.empty(0, dtype=str)
+    columns['has_consent'] = np.empty(0, dtype=bool)
+    columns['line'] = np.empty(0, dtype=np.int64)
+    return columns
+
+
+def iter_column_batches(lines, batch_size, report):
+    """
+    Выдает проверенные пакеты столбцов из строк CSV с заголовком
+
+    Ошибки строк попадают в report, сами строки в пакеты не включаются.
+    """
+    reader = csv.reader(lines)
+    index, width = read_header(reader)
+
+    rows = []
+    line_numbers = []
+    for fields in reader:
+        if not fields:
+            continue
+        rows.append(fields)
+        line_numbers.append(reader.line_num)
+        if len(rows) >= batch_size:
+            columns, errors = parse_batch(rows, line_numbers, index, width)
+            report.extend(errors)
+            yield columns
+            rows = []
+            line_numbers = []
+
+    if rows:
+        columns, errors = parse_batch(rows, line_numbers, index, width)
+        report.extend(errors)
+        yield columns
+
+
+def batch_records(columns):
+    """
+    Превращает пакет столбцов в кортежи в порядке RECORD_FIELDS
+    """
+    return zip(*(columns[field].tolist() for field in RECORD_FIELDS))
+
+
+def record_keys(columns):
+    """
+    Кодирует ключ (id, программа) одним целым числом для сортировки и слияния
+    """
+    programs = np.searchsorted(SORTED_PROGRAM_CODES, columns['program_code'])
+    return columns['id'] * len(PROGRAM_CODES) + programs
+
+
+def concat_columns(batches):
+    """
+    Склеивает пакеты столбцов в один набор
+    """
+    if not batches:
+        return empty_columns()
+    return {field: np.concatenate([columns[field] for columns in batches]) for field in batches[0]}
+
+
+def take_rows(columns, indices):
+    """
+    Выбирает строки с указанными индексами из набора столбцов
+    """
+    return {field: values[indices] for field, values in columns.items()}
+
+
+def duplicate_lines(columns):
+    """
+    Возвращает номера строк, повторяющих ключ (id, программа) более ранней строки
+    """
+    keys = record_keys(columns)
+    lines = columns['line']
+    order = np.lexsort((lines, keys))
+    repeated = keys[order][1:] == keys[order][:-1]
+    return np.sort(lines[order][1:][repeated])
+
+
+def read_columns(lines, batch_size):
+    """
+    Разбирает весь файл в один набор столбцов
+
+    Если в файле есть ошибки (включая повтор ключа), выбрасывает ValidationError.
+    """
+    report = ErrorReport()
+    columns = concat_columns(list(iter_column_batches(lines, batch_size, report)))
+    report.extend([(int(line), "повтор пары (id, программа)") for line in duplicate_lines(columns)])
+    report.check()
+    return columns
+
+
+def read_records(lines, batch_size):
+    """
+    Разбирает весь файл и возвращает список записей
+    """
+    return list(batch_records(read_columns(lines, batch_size)))
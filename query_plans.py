@@ -0,0 +1,142 @@
+"""
+Проверка планов запросов SQLite (EXPLAIN QUERY PLAN)
+
+Для запросов, которые выполняет services.py при визуализации, расчете и
+формировании отчета, проверяется, что SQLite использует индексы:
+в плане не должно быть полного просмотра таблицы (SCAN без покрывающего
+индекса) и временных B-деревьев для сортировки (USE TEMP B-TREE).
+
+Использование:
+    python init_db.py explain [дата]    - код возврата 1, если есть замечания
+"""
+
+from sqlalchemy import func, select, tuple_
+from config import Config
+from models import db, Applicant, PassingScore
+from allocation import columns_query, get_version
+from services import count_query as list_count, enrolled_query, page_query
+from catalog import latest_date
+from dimensions import date_id, program_id
+
+
+PROGRAMS = Config.PROGRAMS
+
+
+def count_query(query):
+    """
+    Запрос количества строк в том виде, в каком его строит Query.count()
+    """
+    return select(func.count()).select_from(query.subquery())
+
+
+def hot_queries(date, program_code=None):
+    """
+    Запросы services.py за дату: список (название, запрос)
+    """
+    program_code = program_code or next(iter(PROGRAMS))
+    version = get_version(date)
+    date_key = date_id(date)
+    program_key = program_id(program_code)
+    size = Config.PAGE_SIZE
+    program = {'program': program_code}
+    # Курсор страницы - ключ (total_score, id, program_id) из середины диапазона
+    cursor = (200, 1000, program_key)
+    key = tuple_(Applicant.total_score, Applicant.id, Applicant.program_id)
+    return [
+        ('get_all_applicants: первая страница',
+         page_query(date, version, None, 'total_score', 'desc', size)),
+        ('get_all_applicants: страница после курсора',
+         page_query(date, version, None, 'total_score', 'desc', size, after=cursor)),
+        ('get_all_applicants: страница перед курсором',
+         page_query(date, version, None, 'total_score', 'desc', size, before=cursor)),
+        ('get_all_applicants: строк перед страницей',
+         list_count(date, version, None, key > tuple_(*cursor))),
+        ('get_all_applicants: по ID',
+         page_query(date, version, None, 'id', 'asc', size, after=(1000, program_key))),
+        ('get_all_applicants: по приоритету',
+         page_query(date, version, None, 'priority', 'asc', size, after=(1, 1000, program_key))),
+        ('get_all_applicants: фильтр по приоритету',
+         page_query(date, version, {'priority': 1}, 'priority', 'asc', size)),
+        ('get_all_applicants: фильтр по сумме баллов',
+         page_query(date, version, {'min_score': 200, 'max_score': 250}, 'total_score', 'desc', size)),
+        ('get_all_applicants: фильтр по началу ID',
+         page_query(date, version, {'id_prefix': '12'}, 'id', 'asc', size)),
+        ('get_all_applicants: строк с началом ID',
+         list_count(date, version, {'id_prefix': '12'})),
+        ('get_all_applicants: строк с согласием',
+         list_count(date, version, {'consent': True})),
+        ('get_all_applicants: зачисленные',
+         page_query(date, version, {'enrolled': True}, 'total_score', 'desc', size)),
+        ('get_program_applicants: первая страница',
+         page_query(date, version, program, 'total_score', 'desc', size)),
+        ('get_program_applicants: страница после курсора',
+         page_query(date, version, program, 'total_score', 'desc', size, after=cursor)),
+        ('get_program_applicants: строк перед страницей',
+         list_count(date, version, program, key > tuple_(*cursor))),
+        ('get_program_applicants: строк в диапазоне баллов',
+         list_count(date, version, dict(program, min_score=200, max_score=250))),
+        ('get_program_applicants: проходной балл',
+         PassingScore.query.filter_by(program_code=program_code, upload_date=date)),
+        ('get_statistics: всего заявлений',
+         count_query(Applicant.query.filter_by(date_id=date_key))),
+        ('get_statistics: с согласием',
+         count_query(Applicant.query.filter_by(date_id=date_key, has_consent=True))),
+        ('calculate_passing_scores: заявления с согласием',
+         columns_query(date)),
+        ('calculate_passing_scores: сохраненные баллы',
+         PassingScore.query.filter_by(upload_date=date)),
+        ('generate_pdf_report: зачисленные',
+         enrolled_query(date, version)),
+        ('generate_pdf_report: заявлений на программу',
+         count_query(Applicant.query.filter_by(date_id=date_key, program_id=program_key))),
+        ('generate_pdf_report: с согласием на программу',
+         count_query(Applicant.query.filter_by(date_id=date_key, program_id=program_key, has_consent=True))),
+    ]
+
+
+def explain(query):
+    """
+    Строки плана запроса (поле detail EXPLAIN QUERY PLAN)
+    """
+    statement = getattr(query, 'statement', query)
+    sql = str(statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+    return [row[-1] for row in db.session.execute(db.text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+
+def plan_problems(plan):
+    """
+    Замечания к плану: полный просмотр таблицы и сортировка во временном B-дереве
+    """
+    problems = []
+    for detail in plan:
+        if detail.startswith('SCAN') and 'COVERING INDEX' not in detail:
+            problems.append(detail)
+        elif 'USE TEMP B-TREE' in detail:
+            problems.append(detail)
+    return problems
+
+
+def check_query_plans(date=None, program_code=None):
+    """
+    Проверяет планы запросов за дату (по умолчанию - последнюю загруженную)
+
+    Вызывается внутри контекста приложения. Возвращает список
+    {'name', 'plan', 'problems'}.
+    """
+    date = (date or latest_date() or '').replace('.', '_')
+
+    results = []
+    for name, query in hot_queries(date, program_code):
+        plan = explain(query)
+        results.append({'name': name, 'plan': plan, 'problems': plan_problems(plan)})
+    return results
+
+
+def print_plans(results, echo=print):
+    for item in results:
+        mark = "ЗАМЕЧАНИЯ" if item['problems'] else "ok"
+        echo(f"{item['name']}: {mark}")
+        for detail in item['plan']:
+            echo(f"    {detail}")
+    failed = sum(1 for item in results if item['problems'])
+    echo(f"Запросов: {len(results)}, с замечаниями: {failed}")
@@ -0,0 +1,152 @@
+"""
+Пересчет проходных баллов за все даты приемной кампании (П.13, П.14.c)
+
+Распределения мест за разные даты вычисляются параллельно в отдельных
+процессах; каждый процесс читает БД через собственное соединение только
+для чтения. Результаты возвращаются в основной процесс и записываются
+(passing_scores и enrollments) одной транзакцией, поэтому пересчет всей
+истории занимает время самой долгой даты, а не сумму по датам.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from sqlalchemy import create_engine, select
+from config import Config
+from models import db, DataVersion
+from allocation import allocate, build_allocation, get_allocation, get_version, load_columns, remember, seat_counts
+from services import store_calculation
+from catalog import dataset_dates
+from snapshots import evict_snapshots, materialize
+
+
+PROGRAMS = Config.PROGRAMS
+
+# Соединение с БД в рабочем процессе
+_engine = None
+
+
+def read_only_url(url):
+    """
+    Адрес БД для рабочих процессов: файл SQLite открывается в режиме только для чтения
+    """
+    if url.get_backend_name() == 'sqlite' and url.database and url.database != ':memory:':
+        return f"sqlite:///file:{os.path.abspath(url.database)}?mode=ro&uri=true"
+    return url.render_as_string(hide_password=False)
+
+
+def init_worker(database_url):
+    global _engine
+    _engine = create_engine(database_url) if database_url else None
+
+
+def compute_date(date):
+    """
+    Распределяет места за дату в рабочем процессе
+
+    Возвращает (дата, Allocation без очереди, время, ошибка); у результата
+    указана версия данных, прочитанная в том же соединении.
+    """
+    start_time = datetime.now()
+    try:
+        with _engine.connect() as connection:
+            version = connection.execute(
+                select(DataVersion.version).where(DataVersion.upload_date == date)
+            ).scalar() or 0
+            columns = load_columns(date, connection=connection)
+        allocation = build_allocation(date, allocate(columns, seat_counts()))
+        # Очередь в основной процесс не передается - она нужна только для пошагового пересчета
+        allocation.queue = None
+        allocation.version = version
+        error = None
+    except Exception as e:
+        allocation = None
+        error = str(e)
+    return date, allocation, (datetime.now() - start_time).total_seconds(), error
+
+
+def recalculate_dates(dates=None, workers=None):
+    """
+    Пересчитывает проходные баллы за даты (по умолчанию - за все загруженные)
+
+    Вызывается внутри контекста приложения. Возвращает сводку - список
+    {'date', 'passing_scores', 'elapsed', 'error'} по датам.
+    """
+    if dates is None:
+        dates = dataset_dates()
+    dates = sorted({date.replace('.', '_').strip() for date in dates})
+    if not dates:
+        return []
+
+    # Рабочие процессы читают applicants - разворачиваем все даты заранее,
+    # лишние сворачиваются после записи результатов
+    for date in dates:
+        materialize(date, evict=False)
+
+    workers = min(workers or Config.RECALCULATE_WORKERS or os.cpu_count() or 1, len(dates))
+    database_url = read_only_url(db.engine.url)
+
+    if workers == 1:
+        init_worker(database_url)
+        try:
+            results = [compute_date(date) for date in dates]
+        finally:
+            _engine.dispose()
+            init_worker(None)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(database_url,)) as executor:
+            results = list(executor.map(compute_date, dates))
+
+    # Писатель один: все даты записываются одной транзакцией
+    summary = []
+    for date, allocation, elapsed, error in results:
+        if error:
+            summary.append({'date': date, 'passing_scores': {}, 'elapsed': elapsed, 'error': error})
+            continue
+
+        if allocation.version == get_version(date):
+            remember(date, allocation.version, allocation)
+        else:
+            # Список изменился во время расчета - считаем по текущим данным
+            allocation = get_allocation(date)
+
+        summary.append({
+            'date': date,
+            'passing_scores': store_calculation(allocation),
+            'elapsed': elapsed,
+            'error': None
+        })
+    db.session.commit()
+    evict_snapshots()
+
+    return summary
+
+
+def recalculation_message(summary, elapsed_time):
+    """
+    Текст сообщения с итогами пересчета
+    """
+    done = [item for item in summary if not item['error']]
+    lines = [f"Проходные баллы пересчитаны за {len(done)} дат за {elapsed_time:.2f} секунд"]
+    for item in summary:
+        if item['error']:
+            lines.append(f"{item['date'].replace('_', '.')}: ошибка расчета")
+    return "<br>".join(lines)
+
+
+def print_summary(summary, echo=print):
+    """
+    Печатает проходные баллы и время расчета по датам
+    """
+    codes = list(PROGRAMS.keys())
+    echo(f"{'Дата':<8} " + " ".join(f"{PROGRAMS[code]['full_name']:>8}" for code in codes) + f" {'Время, с':>10}")
+    for item in summary:
+        if item['error']:
+            echo(f"{item['date']:<8} ОШИБКА: {item['error']}")
+            continue
+        scores = item['passing_scores']
+        echo(
+            f"{item['date']:<8} "
+            + " ".join(f"{scores[code] if scores[code] is not None else 'НЕДОБОР':>8}" for code in codes)
+            + f" {item['elapsed']:>10.2f}"
+        )
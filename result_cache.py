@@ -0,0 +1,225 @@
+"""
+Кэш результатов страниц списков и статистики
+
+Одни и те же страницы (дата, сортировка, фильтры, страница) запрашиваются
+многократно. Результаты services.get_applicants_page, get_program_applicants
+и get_statistics запоминаются по ключу (функция, дата, версия результатов,
+параметры). Версия результатов - версия данных за дату, номер расчета
+проходных баллов (allocation.get_result_version) и номер свертывания даты в
+хранилище снимков (snapshots.snapshot_generation): она меняется при загрузке
+и удалении списка, при каждом расчете и свертывании, поэтому устаревший
+результат не возвращается - после изменения у того же запроса другой ключ.
+Если версия изменилась во время вычисления (например, дату свернул другой
+процесс и запрос прочитал пустой список), результат не запоминается и
+вычисляется заново.
+
+Уровни кэша:
+- память процесса: LRU с ограничением по объему (Config.RESULT_CACHE_BYTES);
+- каталог файлов Config.RESULT_CACHE_DIR (по умолчанию отключен), общий для
+  рабочих процессов: результат, посчитанный одним процессом, читают
+  остальные. Файлы прежних версий даты удаляются при записи новой, общий
+  объем ограничен Config.RESULT_CACHE_DIR_BYTES (удаляются давно
+  прочитанные файлы).
+
+Результаты хранятся сериализованными (pickle): объем записи известен точно,
+а вызывающий код получает собственную копию и может ее изменять.
+"""
+
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from config import Config
+from allocation import get_result_version
+from snapshots import snapshot_generation
+
+
+# Память процесса: {ключ: сериализованный результат}
+_entries = OrderedDict()
+_size = 0
+_stats = {'hits': 0, 'file_hits': 0, 'misses': 0}
+_lock = threading.Lock()
+
+# Сколько раз вычислять результат, если версия меняется во время вычисления
+ATTEMPTS = 3
+
+
+def cached_result(name, date, params, compute, prepare=None):
+    """
+    Результат compute() для функции name за дату с параметрами params
+
+    params - кортеж значений, которые pickle сериализует однозначно
+    (строки, числа, кортежи). Без даты или при выключенном кэше
+    (Config.RESULT_CACHE) результат вычисляется каждый раз.
+    prepare() - записи, от которых зависит результат (развертывание даты,
+    сохранение распределения): выполняется до чтения версии, поэтому
+    compute() только читает и не меняет версию, под которой запоминается.
+    Если prepare() возвращает False (дата еще готовится), результат
+    вычисляется без кэша и не запоминается.
+    """
+    if not date:
+        return compute()
+
+    for attempt in range(ATTEMPTS):
+        if prepare and not prepare():
+            return compute()
+        version = result_version(date)
+        if not Config.RESULT_CACHE:
+            result = compute()
+        else:
+            key = (name, date, version, params)
+            data = memory_get(key)
+            if data is None:
+                data = file_get(key)
+                if data is not None:
+                    memory_put(key, data)
+            if data is not None:
+                return pickle.loads(data)
+
+            with _lock:
+                _stats['misses'] += 1
+            result = compute()
+
+        # Версия изменилась во время вычисления - результат мог быть прочитан
+        # по неполным данным; он не запоминается, вычисление повторяется
+        if result_version(date) != version:
+            continue
+        if Config.RESULT_CACHE:
+            data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+            memory_put(key, data)
+            file_put(key, data)
+        return result
+    return result
+
+
+def result_version(date):
+    """
+    Версия результатов за дату: (версия данных, номер расчета, номер свертывания)
+    """
+    return get_result_version(date) + (snapshot_generation(date),)
+
+
+def memory_get(key):
+    with _lock:
+        data = _entries.get(key)
+        if data is not None:
+            _entries.move_to_end(key)
+            _stats['hits'] += 1
+        return data
+
+
+def memory_put(key, data):
+    """
+    Запоминает результат в памяти; вытесняет давно прочитанные записи сверх
+    Config.RESULT_CACHE_BYTES (запись больше предела не запоминается)
+    """
+    global _size
+    limit = Config.RESULT_CACHE_BYTES
+    if len(data) > limit:
+        return
+    with _lock:
+        previous = _entries.pop(key, None)
+        if previous is not None:
+            _size -= len(previous)
+        _entries[key] = data
+        _size += len(data)
+        while _size > limit:
+            _, evicted = _entries.popitem(last=False)
+            _size -= len(evicted)
+
+
+def file_path(key):
+    """
+    Файл результата: <каталог>/<дата>/<версия>/<хэш ключа>.pickle
+    """
+    name, date, version, params = key
+    digest = hashlib.sha1(repr((name, params)).encode('utf-8')).hexdigest()
+    return os.path.join(Config.RESULT_CACHE_DIR, date, '_'.join(map(str, version)), f"{digest}.pickle")
+
+
+def file_get(key):
+    if not Config.RESULT_CACHE_DIR:
+        return None
+    path = file_path(key)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        # Время изменения - время последнего чтения (для вытеснения)
+        os.utime(path)
+    except OSError:
+        return None
+    with _lock:
+        _stats['file_hits'] += 1
+    return data
+
+
+def file_put(key, data):
+    """
+    Записывает результат в общий каталог; удаляет файлы прежних версий даты
+    """
+    if not Config.RESULT_CACHE_DIR or len(data) > Config.RESULT_CACHE_DIR_BYTES:
+        return
+    path = file_path(key)
+    directory = os.path.dirname(path)
+    date_directory = os.path.dirname(directory)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(date_directory):
+            if name != os.path.basename(directory):
+                shutil.rmtree(os.path.join(date_directory, name), ignore_errors=True)
+        # Другие процессы видят только записанный целиком файл
+        fd, temporary = tempfile.mkstemp(suffix='.tmp', dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path)
+    except OSError as e:
+        print(f"ВНИМАНИЕ: Не удалось записать кэш результатов: {e}")
+        return
+    trim_files()
+
+
+def trim_files():
+    """
+    Удаляет давно прочитанные файлы кэша сверх Config.RESULT_CACHE_DIR_BYTES
+    """
+    files = []
+    for root, _, names in os.walk(Config.RESULT_CACHE_DIR):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            files.append((info.st_mtime, info.st_size, path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= Config.RESULT_CACHE_DIR_BYTES:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+
+def clear_results():
+    """
+    Очищает кэш в памяти процесса и общий каталог
+    """
+    global _size
+    with _lock:
+        _entries.clear()
+        _size = 0
+    if Config.RESULT_CACHE_DIR:
+        shutil.rmtree(Config.RESULT_CACHE_DIR, ignore_errors=True)
+
+
+def cache_info():
+    """
+    Состояние кэша: {'entries', 'bytes', 'hits', 'file_hits', 'misses'}
+    """
+    with _lock:
+        return dict(_stats, entries=len(_entries), bytes=_size)
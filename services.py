@@ -1,10 +1,28 @@
-import csv
 import os
-import io
+import shutil
+from collections import namedtuple
 from datetime import datetime
-from flask import flash
-from models import db, Applicant, PassingScore
+from itertools import chain
+import numpy as np
+from flask import current_app, flash, g
+from sqlalchemy import and_, case, false, func, or_, select, tuple_
+from models import db, Applicant, PassingScore, Enrollment
 from config import Config
+from database import read_request
+from ingest import (
+    ingest_records, ingest_file_stream, ingest_delta, unchanged_stats,
+    notify, read_hash, write_hash, file_hash, stream_hash
+)
+from parsing import MAX_PRIORITY, read_records
+from allocation import (
+    get_allocation, get_archive, get_version, bump_version, bump_calculation, save_enrollment, enrollment_saved,
+    EnrolledApplicant, ENROLLED, PROGRAM_CODES, PROGRAM_INDEX
+)
+from archive import COLUMNS, enrolled_rows, keyset_page, statuses, write_archive
+from snapshots import is_materialized, materialize, record_snapshot
+from result_cache import cached_result
+from catalog import dataset_dates, display_dates, latest_date, mark_calculated, record_upload
+from dimensions import date_id, program_code as program_code_of, program_id, program_ids
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image
@@ -22,23 +40,30 @@ from io import BytesIO
 PROGRAMS = Config.PROGRAMS
 DATA_DIR = Config.DATA_DIR
 
+# Ключи сортировки списков: столбец сортировки, затем id и программа -
+# порядок строк однозначен, и по ключу выбираются страницы (keyset)
+SORT_KEYS = {
+    'total_score': ('total_score', 'id', 'program_id'),
+    'id': ('id', 'program_id'),
+    'priority': ('priority', 'id', 'program_id'),
+}
 
-def get_csv_files():
-    """
-    Возвращает список CSV файлов в папке data
-    """
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
-    files = [f for f in os.listdir(DATA_DIR) if f.endswith('.csv')]
-    return sorted(files)
+# Строка конкурсного списка: шаблоны читают поля напрямую, JSON - _asdict()
+ApplicantRow = namedtuple('ApplicantRow', [
+    'id', 'program_code', 'program_name', 'priority', 'physics_ict', 'russian',
+    'math', 'extra', 'total_score', 'has_consent', 'upload_date', 'status'
+])
 
+# Столбцы applicants, которые выбирает запрос списка (applicants_with_status)
+LIST_COLUMNS = ('id', 'program_id', 'priority', 'physics_ict_score', 'russian_score',
+                'math_score', 'extra_score', 'total_score', 'has_consent')
 
-def get_latest_csv():
-    """
-    Возвращает последний загруженный CSV файл
-    """
-    files = get_csv_files()
-    return files[-1] if files else None
+# Фильтры списков (parse_filters): программа, согласие, приоритет, диапазон
+# суммы баллов, только зачисленные на программу заявления, начало ID
+FILTERS = ('program', 'consent', 'priority', 'min_score', 'max_score', 'enrolled', 'id_prefix')
+
+# Наибольший ID абитуриента (столбец id архива - int32)
+MAX_APPLICANT_ID = 2 ** 31 - 1
 
 
 def upload_competition_list(file, date):
@@ -54,192 +79,555 @@ def upload_competition_list(file, date):
     
     П.3: Время загрузки не должно превышать 5 секунд
     """
-    start_time = datetime.now()
-    
     if not file.filename.lower().endswith('.csv'):
         raise ValueError("Можно загружать только CSV файлы")
     
+    stats = ingest_competition_list(file.stream, date)
+    
+    for message, category in upload_messages(stats):
+        flash(message, category)
+    
+    return True
+
+
+def ingest_competition_list(stream, date, progress=None):
+    """
+    Загружает конкурсный список из бинарного потока CSV за указанную дату
+    
+    Не зависит от контекста запроса, поэтому используется и в фоновых задачах.
+    progress(**fields) - необязательный обработчик хода загрузки (см. ingest.notify).
+    
+    Возвращает статистику загрузки (см. ingest.ingest_records) с полями
+    'filename' и 'elapsed' - полное время, включая сохранение файла.
+    """
+    start_time = datetime.now()
+    
     # Сохраняем файл
     safe_date = date.replace('.', '_').strip()
     filename = f"{safe_date}.csv"
     filepath = os.path.join(DATA_DIR, filename)
-    file.save(filepath)
-    
-    # Читаем CSV
-    with open(filepath, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        new_data = list(reader)
-    
-    # Получаем существующие записи для этой даты
-    existing_applicants = Applicant.query.filter_by(upload_date=safe_date).all()
-    existing_ids = {(app.id, app.program_code) for app in existing_applicants}
-    
-    # Новые ID из CSV
-    new_ids = {(int(row['id']), row['program']) for row in new_data}
-    
-    # П.4.a: Удаление записей, отсутствующих в новом списке
-    ids_to_delete = existing_ids - new_ids
-    if ids_to_delete:
-        for app_id, prog_code in ids_to_delete:
-            Applicant.query.filter_by(
-                id=app_id, 
-                program_code=prog_code, 
-                upload_date=safe_date
-            ).delete()
-    
-    # П.4.b и 4.c: Добавление и обновление
-    for row in new_data:
-        applicant_id = int(row['id'])
-        program_code = row['program']
-        
-        existing = Applicant.query.filter_by(id=applicant_id, upload_date=safe_date).first()
+    
+    # Хеш ранее сохраненного файла за эту дату (если он загружался этой версией)
+    stored_hash = read_hash(filepath)
+    if stored_hash:
+        notify(progress, stage='hashing')
+    upload_hash = stream_hash(stream, Config.INGEST_CHUNK_SIZE) if stored_hash else None
+    
+    # Загрузка сравнивается со списком за дату в applicants - он должен быть развернут
+    materialize(safe_date)
+    
+    if stored_hash and upload_hash == stored_hash:
+        # Тот же файл загружен повторно - БД уже актуальна
+        stats = unchanged_stats(safe_date)
+    elif stored_hash and Config.INGEST_DELTA:
+        # Сравниваем с сохраненным файлом и отправляем в БД только изменения
+        stats = ingest_delta(
+            safe_date,
+            stream,
+            filepath,
+            Config.INGEST_CHUNK_SIZE,
+            Config.INGEST_BATCH_SIZE,
+            progress
+        )
+    elif Config.INGEST_STREAMING:
+        # Разбираем поток загрузки блоками, одновременно сохраняя файл на диск
+        stats = ingest_file_stream(
+            safe_date,
+            stream,
+            filepath,
+            Config.INGEST_CHUNK_SIZE,
+            Config.INGEST_BATCH_SIZE,
+            progress
+        )
+    else:
+        with open(filepath, 'wb') as f:
+            shutil.copyfileobj(stream, f, Config.INGEST_CHUNK_SIZE)
         
-        applicant_data = {
-            'id': applicant_id,
-            'program_code': program_code,
-            'priority': int(row['priority']),
-            'physics_ict_score': int(row['physics']),
-            'russian_score': int(row['rus']),
-            'math_score': int(row['math']),
-            'extra_score': int(row['extra']),
-            'total_score': int(row['total']),
-            'has_consent': row['consent'] == '1',
-            'upload_date': safe_date
-        }
+        # Читаем CSV
+        notify(progress, stage='parsing')
+        with open(filepath, 'r', encoding='utf-8', newline='') as f:
+            records = read_records(f, Config.INGEST_BATCH_SIZE)
         
-        if existing:
-            for key, value in applicant_data.items():
-                if key != 'id':
-                    setattr(existing, key, value)
-            existing.updated_at = datetime.utcnow()
-        else:
-            new_applicant = Applicant(**applicant_data)
-            db.session.add(new_applicant)
+        # П.4: удаление, добавление и обновление пакетными запросами
+        stats = ingest_records(safe_date, records, progress)
+        write_hash(filepath, file_hash(filepath, Config.INGEST_CHUNK_SIZE))
+    
+    # Результаты, посчитанные по прежним данным, больше не действительны;
+    # если известны измененные абитуриенты, распределение обновляется пошагово
+    changed_ids = stats.pop('changed_ids', None)
+    if not stats.get('skipped'):
+        # Изменения относительно предыдущей даты - в хранилище снимков
+        record_snapshot(safe_date)
+        bump_version(safe_date, changed_ids)
+    # Список за дату - в каталог загруженных списков
+    record_upload(safe_date, stats['rows'], read_hash(filepath))
+    
+    stats['filename'] = filename
+    stats['elapsed'] = (datetime.now() - start_time).total_seconds()
+    return stats
 
-    db.session.commit()
-        
-    # Проверяем время выполнения
-    elapsed_time = (datetime.now() - start_time).total_seconds()
+
+def upload_messages(stats):
+    """
+    Формирует сообщения [(текст, категория)] по итогам загрузки
+    """
+    filename = stats['filename']
+    elapsed_time = stats['elapsed']
+    
+    if stats.get('skipped'):
+        return [(f"Файл {filename} не изменился с прошлой загрузки ({stats['rows']} строк), БД не обновлялась", "success")]
     
-    flash(f"Файл {filename} успешно загружен за {elapsed_time:.2f} секунд", "success")
+    rate = stats['rows'] / elapsed_time if elapsed_time > 0 else stats['rows']
+    messages = [(
+        f"Файл {filename} успешно загружен за {elapsed_time:.2f} секунд "
+        f"({stats['rows']} строк, {rate:.0f} строк/с): "
+        f"добавлено {stats['inserted']}, обновлено {stats['updated']}, "
+        f"удалено {stats['deleted']}, без изменений {stats['unchanged']}",
+        "success"
+    )]
     
+    # Проверяем время выполнения
     if elapsed_time > 5:
-        flash(f"ВНИМАНИЕ: Время загрузки ({elapsed_time:.2f}с) превысило требуемые 5 секунд", "warning")
+        messages.append((f"ВНИМАНИЕ: Время загрузки ({elapsed_time:.2f}с) превысило требуемые 5 секунд", "warning"))
     
-    return True
+    return messages
 
 
-def get_all_applicants(date=None, sort_by='total_score', order='desc'):
+def get_all_applicants(date=None, sort_by='total_score', order='desc', page_size=None, after=None, before=None,
+                       filters=None):
     """
     П.12: Визуализация конкурсных списков
     
     Возвращает список всех абитуриентов с возможностью сортировки и фильтрации
     Время перестроения визуализаций не должно превышать 3 секунды
-    """
-    start_time = datetime.now()
     
-    if not date:
-        latest = get_latest_csv()
-        date = latest.replace('.csv', '') if latest else None
+    page_size, after, before - страница списка, filters - фильтры
+    (см. get_applicants_page); без page_size возвращается весь список.
+    """
+    return get_applicants_page(date, filters, sort_by, order, page_size, after, before)['applicants']
+
+
+def get_program_applicants(program_code, date=None, sort_by='total_score', order='desc',
+                           page_size=None, after=None, before=None, filters=None):
+    """
+    П.12: Визуализация конкурсных списков по отдельной программе
     
+    'applicants' - страница списка программы (без page_size - весь список),
+    курсоры соседних страниц - в 'next_cursor' и 'prev_cursor'.
+    Результат кэшируется (result_cache.py).
+    """
     if not date:
-        return []
+        date = latest_date()
     
-    query = Applicant.query.filter_by(upload_date=date)
-    
-    # Сортировка
-    if sort_by == 'total_score':
-        query = query.order_by(Applicant.total_score.desc() if order == 'desc' else Applicant.total_score.asc())
-    elif sort_by == 'id':
-        query = query.order_by(Applicant.id.asc() if order == 'asc' else Applicant.id.desc())
-    elif sort_by == 'priority':
-        query = query.order_by(Applicant.priority.asc() if order == 'asc' else Applicant.priority.desc())
-    
-    applicants = query.all()
-    
-    result = []
-    for app in applicants:
-        result.append({
-            'id': app.id,
-            'program_code': app.program_code,
-            'program_name': PROGRAMS[app.program_code]['name'],
-            'priority': app.priority,
-            'physics_ict': app.physics_ict_score,
-            'russian': app.russian_score,
-            'math': app.math_score,
-            'extra': app.extra_score,
-            'total_score': app.total_score,
-            'has_consent': app.has_consent,
-            'upload_date': app.upload_date
-        })
+    return cached_result(
+        'get_program_applicants', date,
+        (program_code,) + page_params(filters, sort_by, order, page_size, after, before),
+        lambda: build_program_page(program_code, date, sort_by, order, page_size, after, before, filters),
+        lambda: prepare_date(date)
+    )
+
+
+def build_program_page(program_code, date, sort_by, order, page_size, after, before, filters):
+    """
+    Страница списка программы с проходным баллом (без кэша; дата подготовлена prepare_date)
+    """
+    filters = dict(filters or {}, program=program_code)
+    page = build_applicants_page(date, filters, sort_by, order, page_size, after, before)
     
-    elapsed_time = (datetime.now() - start_time).total_seconds()
+    # Проходной балл и число зачисленных сохранены вместе с распределением
+    record = None
+    if page['date']:
+        record = PassingScore.query.filter_by(program_code=program_code, upload_date=page['date']).first()
     
-    if elapsed_time > 3:
-        print(f"ВНИМАНИЕ: Время визуализации ({elapsed_time:.2f}с) превысило требуемые 3 секунды")
+    page.update({
+        'name': PROGRAMS[program_code]['name'],
+        'seats': PROGRAMS[program_code]['seats'],
+        'passing_score': record.passing_score if record else None,
+        'enrolled_count': record.applicants_with_consent if record else 0,
+    })
+    return page
+
+
+def page_size_value(value, default=None):
+    """
+    Размер страницы из параметра запроса: целое от 1 до наибольшего из
+    Config.PAGE_SIZES (иначе - default или Config.PAGE_SIZE)
+    """
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default or Config.PAGE_SIZE
+    return min(max(size, 1), max(Config.PAGE_SIZES))
+
+
+def parse_cursor(cursor, sort_by):
+    """
+    Курсор страницы - значения ключа сортировки SORT_KEYS[sort_by] через точку
     
-    return result
+    Возвращает кортеж целых (None - курсора нет); неверный курсор - ValueError.
+    """
+    if not cursor:
+        return None
+    values = str(cursor).split('.')
+    if len(values) != len(SORT_KEYS[sort_by]):
+        raise ValueError(f"Неверный курсор страницы: {cursor}")
+    try:
+        return tuple(int(value) for value in values)
+    except ValueError:
+        raise ValueError(f"Неверный курсор страницы: {cursor}")
+
 
+def make_cursor(values):
+    return '.'.join(str(int(value)) for value in values)
 
-def get_program_applicants(program_code, date=None, sort_by='total_score', order='desc'):
+
+def parse_filters(args, program_param='program'):
     """
-    П.12: Визуализация конкурсных списков по отдельной программе
+    Фильтры списка из параметров запроса (request.args или dict)
+    
+    Возвращает {фильтр: значение} только для заданных фильтров FILTERS:
+    program - код программы ('all' - все), consent - 'yes'/'no',
+    priority - 1..MAX_PRIORITY, min_score/max_score - границы суммы баллов,
+    enrolled - только зачисленные на программу заявления, id_prefix - цифры
+    начала ID. Неверное значение - ValueError.
     """
-    start_time = datetime.now()
+    def value(name):
+        text = args.get(program_param if name == 'program' else name)
+        return str(text).strip() if text is not None else ''
+    
+    def number(name):
+        try:
+            return int(value(name))
+        except ValueError:
+            raise ValueError(f"Параметр {name}: ожидается целое число")
+    
+    filters = {}
+    program = value('program')
+    if program and program != 'all':
+        if program not in PROGRAMS:
+            raise ValueError(f"Неизвестная программа: {program}")
+        filters['program'] = program
+    
+    consent = value('consent').lower()
+    if consent in ('yes', '1', 'true'):
+        filters['consent'] = True
+    elif consent in ('no', '0', 'false'):
+        filters['consent'] = False
+    elif consent not in ('', 'all'):
+        raise ValueError("Параметр consent: ожидается yes или no")
+    
+    if value('priority') not in ('', 'all'):
+        priority = number('priority')
+        if not 1 <= priority <= MAX_PRIORITY:
+            raise ValueError(f"Параметр priority: ожидается число от 1 до {MAX_PRIORITY}")
+        filters['priority'] = priority
+    
+    for name in ('min_score', 'max_score'):
+        if value(name):
+            filters[name] = number(name)
+    
+    if value('enrolled').lower() in ('1', 'yes', 'true', 'on'):
+        filters['enrolled'] = True
+    
+    prefix = value('id_prefix')
+    if prefix:
+        if not prefix.isdigit():
+            raise ValueError("Параметр id_prefix: ожидаются цифры")
+        filters['id_prefix'] = prefix
+    return filters
+
+
+def id_ranges(prefix):
+    """
+    Диапазоны ID (от, до включительно), которые начинаются с цифр prefix
     
-    if not date:
-        latest = get_latest_csv()
-        date = latest.replace('.csv', '') if latest else None
+    Начало десятичной записи - набор диапазонов по числу цифр: для '12' -
+    12, 120-129, 1200-1299 и т.д. до MAX_APPLICANT_ID. Такие условия
+    выполняются поиском по индексу, в отличие от LIKE по тексту ID.
+    """
+    if prefix != '0' and prefix.startswith('0'):
+        return []
+    low = high = int(prefix)
+    ranges = []
+    while low <= MAX_APPLICANT_ID:
+        ranges.append((low, min(high, MAX_APPLICANT_ID)))
+        if low == 0:
+            break
+        low, high = low * 10, high * 10 + 9
+    return ranges
+
+
+def filter_conditions(date, filters, sort_by=None):
+    """
+    SQL-условия списка за дату с фильтрами (включая условие даты)
     
+    Условие 'enrolled' использует присоединенную таблицу enrollments.
+    Каждому фильтру соответствует индекс applicants (models.Applicant).
+    sort_by - столбец сортировки страницы, если условия строятся для нее.
+    """
+    table = Applicant.__table__
+    date_key = date_id(date)
+    conditions = []
+    if not filters.get('id_prefix'):
+        conditions.append(table.c.date_id == date_key)
+    if filters.get('program'):
+        conditions.append(table.c.program_id == program_id(filters['program']))
+    if filters.get('consent') is not None:
+        conditions.append(table.c.has_consent == filters['consent'])
+    if filters.get('priority') is not None:
+        conditions.append(table.c.priority == filters['priority'])
+    if filters.get('min_score') is not None:
+        conditions.append(table.c.total_score >= filters['min_score'])
+    if filters.get('max_score') is not None:
+        conditions.append(table.c.total_score <= filters['max_score'])
+    if filters.get('enrolled'):
+        conditions.append(Enrollment.__table__.c.program_id == table.c.program_id)
+    if filters.get('id_prefix'):
+        bounds = id_ranges(filters['id_prefix'])
+        if not bounds:
+            conditions.append(false())
+        elif sort_by == 'id':
+            # Страница по ID: один проход индекса (date_id, id) от первого
+            # диапазона до последнего уже в порядке ID; диапазоны проверяются
+            # по выражению id + 0, которое SQLite не ищет по индексу - иначе
+            # он выбирает MULTI-INDEX OR и сортирует строки во временном B-дереве
+            key = table.c.id + 0
+            conditions.append(table.c.date_id == date_key)
+            conditions.append(table.c.id.between(bounds[0][0], bounds[-1][1]))
+            conditions.append(or_(*[key.between(low, high) for low, high in bounds]))
+        else:
+            # Дата - только в каждом диапазоне: SQLite ищет диапазоны по индексу
+            # (date_id, id) по отдельности (MULTI-INDEX OR); при общем условии
+            # date_id = ? он просматривает все строки даты
+            conditions.append(or_(*[
+                and_(table.c.date_id == date_key, table.c.id.between(low, high))
+                for low, high in bounds
+            ]))
+    return conditions
+
+
+def get_applicants_page(date=None, filters=None, sort_by='total_score', order='desc',
+                        page_size=None, after=None, before=None):
+    """
+    П.12: Страница конкурсного списка за дату
+    
+    filters - фильтры списка (parse_filters), выполняются в запросе.
+    Страницы выбираются по ключу сортировки (keyset): строки после курсора
+    after или перед курсором before, без OFFSET - запрос любой страницы
+    читает из индекса только ее строки. Ключ - столбец сортировки, затем id
+    и программа (SORT_KEYS), поэтому порядок строк однозначен.
+    
+    Возвращает {'date', 'applicants', 'total', 'offset', 'page_size',
+    'sort_by', 'order', 'filters', 'next_cursor', 'prev_cursor'}; total -
+    строк списка с учетом фильтров, offset - строк перед страницей, курсор
+    None - соседней страницы нет. Неверный курсор - ValueError.
+    Результат кэшируется (result_cache.py).
+    """
     if not date:
-        return {
-            'name': PROGRAMS[program_code]['name'],
-            'seats': PROGRAMS[program_code]['seats'],
-            'passing_score': None,
-            'applicants': []
-        }
-    
-    query = Applicant.query.filter_by(upload_date=date, program_code=program_code)
+        date = latest_date()
     
-    # Сортировка
-    if sort_by == 'total_score':
-        query = query.order_by(Applicant.total_score.desc() if order == 'desc' else Applicant.total_score.asc())
-    elif sort_by == 'priority':
-        query = query.order_by(Applicant.priority.asc() if order == 'asc' else Applicant.priority.desc())
+    return cached_result(
+        'get_applicants_page', date,
+        page_params(filters, sort_by, order, page_size, after, before),
+        lambda: build_applicants_page(date, filters, sort_by, order, page_size, after, before),
+        lambda: prepare_date(date)
+    )
+
+
+def prepare_date(date):
+    """
+    Подготовка даты к чтению страниц и статистики (до ключа кэша результатов)
     
-    applicants = query.all()
+    Дата разворачивается, распределение по текущей версии данных
+    сохраняется (ensure_enrollment). Заархивированная дата читается из
+    архива и не подготавливается.
     
-    # Получаем проходной балл
-    passing_score_record = PassingScore.query.filter_by(
-        program_code=program_code,
-        upload_date=date
-    ).first()
+    Запрос на чтение (GET) ничего не записывает: если дата не развернута или
+    распределение не сохранено, подготовку выполняет фоновая задача
+    (jobs.submit_preparation), дата попадает в preparing_dates(), а функция
+    возвращает False - страница строится по тому, что уже есть в БД, и не
+    запоминается в кэше результатов.
+    """
+    if not date or get_archive(date):
+        return True
+    if not read_request():
+        ensure_enrollment(date)
+        return True
+    if is_materialized(date) and enrollment_saved(date, get_version(date)):
+        return True
+    
+    preparing = preparing_dates()
+    if date not in preparing:
+        # jobs.py импортирует services - импорт при вызове
+        from jobs import submit_preparation
+        preparing[date] = submit_preparation(current_app._get_current_object(), date)
+    return False
+
+
+def preparing_dates():
+    """
+    Даты, которые готовятся фоновой задачей, в текущем запросе: {дата: id задачи}
+    """
+    if 'preparing' not in g:
+        g.preparing = {}
+    return g.preparing
+
+
+def page_params(filters, sort_by, order, page_size, after, before):
+    """
+    Параметры страницы для ключа кэша результатов
+    """
+    return (tuple(sorted((filters or {}).items())), sort_by, order, page_size, after, before)
+
+
+def build_applicants_page(date, filters, sort_by, order, page_size, after, before):
+    """
+    Страница списка за дату (без кэша; дата подготовлена prepare_date) - см. get_applicants_page
+    """
+    start_time = datetime.now()
     
-    result = {
-        'name': PROGRAMS[program_code]['name'],
-        'seats': PROGRAMS[program_code]['seats'],
-        'passing_score': passing_score_record.passing_score if passing_score_record else None,
-        'applicants': []
+    sort_by = sort_by if sort_by in SORT_KEYS else 'total_score'
+    order = 'asc' if order == 'asc' else 'desc'
+    page = {
+        'date': date,
+        'applicants': [],
+        'total': 0,
+        'offset': 0,
+        'page_size': page_size,
+        'sort_by': sort_by,
+        'order': order,
+        'filters': dict(filters or {}),
+        'next_cursor': None,
+        'prev_cursor': None,
     }
-    
-    for app in applicants:
-        result['applicants'].append({
-            'id': app.id,
-            'priority': app.priority,
-            'physics_ict': app.physics_ict_score,
-            'russian': app.russian_score,
-            'math': app.math_score,
-            'extra': app.extra_score,
-            'total_score': app.total_score,
-            'has_consent': app.has_consent
-        })
+    if not date:
+        return page
+    
+    after = parse_cursor(after, sort_by)
+    before = parse_cursor(before, sort_by)
+    
+    archive = get_archive(date)
+    if archive:
+        # Закрытая дата - из архива, без запросов к applicants
+        rows, keys, offset, total = archived_page(
+            archive, date, page['filters'], sort_by, order, page_size, after, before
+        )
+    else:
+        rows, keys, offset, total = database_page(
+            date, page['filters'], sort_by, order, page_size, after, before
+        )
+    
+    page.update({
+        'applicants': rows,
+        'total': total,
+        'offset': offset,
+        'next_cursor': make_cursor(keys[-1]) if rows and offset + len(rows) < total else None,
+        'prev_cursor': make_cursor(keys[0]) if rows and offset > 0 else None,
+    })
     
     elapsed_time = (datetime.now() - start_time).total_seconds()
     
     if elapsed_time > 3:
         print(f"ВНИМАНИЕ: Время визуализации ({elapsed_time:.2f}с) превысило требуемые 3 секунды")
     
-    return result
+    return page
+
+
+def page_query(date, version, filters=None, sort_by='total_score', order='desc',
+               page_size=None, after=None, before=None):
+    """
+    Запрос строк страницы списка за дату: столбцы LIST_COLUMNS и статус
+    
+    К applicants_with_status с фильтрами добавляются условие курсора и
+    порядок по ключу SORT_KEYS[sort_by]. При курсоре
+    before строки выбираются в обратном порядке (ближайшие к курсору) -
+    вызывающий код разворачивает их.
+    """
+    table = Applicant.__table__
+    columns = [table.c[name] for name in SORT_KEYS[sort_by]]
+    key = tuple_(*columns)
+    descending = order == 'desc'
+    
+    query = applicants_with_status(date, version, filters, sort_by)
+    
+    if before is not None:
+        query = query.where(key > tuple_(*before) if descending else key < tuple_(*before))
+        descending = not descending
+    elif after is not None:
+        query = query.where(key < tuple_(*after) if descending else key > tuple_(*after))
+    
+    query = query.order_by(*[column.desc() if descending else column.asc() for column in columns])
+    if page_size:
+        query = query.limit(page_size)
+    return query
+
+
+def count_query(date, version, filters=None, *conditions):
+    """
+    Запрос числа строк списка за дату с фильтрами
+    
+    enrollments присоединяется, только если задан фильтр 'enrolled' -
+    иначе число строк считается по индексу applicants.
+    """
+    filters = filters or {}
+    table = Applicant.__table__
+    enrollments = Enrollment.__table__
+    query = select(func.count()).select_from(table)
+    if filters.get('enrolled'):
+        query = query.join(
+            enrollments,
+            and_(
+                enrollments.c.date_id == table.c.date_id,
+                enrollments.c.applicant_id == table.c.id,
+                enrollments.c.version == version
+            )
+        )
+    return query.where(*filter_conditions(date, filters), *conditions)
+
+
+def database_page(date, filters, sort_by, order, page_size, after, before):
+    """
+    Страница списка из БД: (строки, ключи строк, смещение, всего строк)
+    
+    Строки читаются запросом столбцов (без объектов ORM) и сразу
+    становятся ApplicantRow. Дата подготовлена до вызова (prepare_date):
+    распределение за текущую версию данных сохранено.
+    """
+    version = get_version(date)
+    query = page_query(date, version, filters, sort_by, order, page_size, after, before)
+    results = db.session.execute(query).all()
+    if before is not None:
+        results.reverse()
+    
+    names = SORT_KEYS[sort_by]
+    positions = [LIST_COLUMNS.index(name) for name in names]
+    keys = [tuple(result[i] for i in positions) for result in results]
+    rows = applicant_rows(results, date)
+    
+    # Число строк списка и строк перед страницей - по индексу, без чтения строк
+    total = db.session.execute(count_query(date, version, filters)).scalar()
+    offset = 0
+    if keys:
+        table = Applicant.__table__
+        key = tuple_(*[table.c[name] for name in names])
+        first = tuple_(*keys[0])
+        offset = db.session.execute(count_query(
+            date, version, filters, key > first if order == 'desc' else key < first
+        )).scalar()
+    return rows, keys, offset, total
+
+
+def applicant_rows(results, date):
+    """
+    Строки списка ApplicantRow из строк запроса applicants_with_status
+    """
+    programs = {key: (code, PROGRAMS[code]['name']) for code, key in program_ids().items()}
+    return [
+        ApplicantRow(applicant_id, *programs[program], priority, physics_ict, russian, math, extra,
+                     total_score, has_consent, date, status)
+        for applicant_id, program, priority, physics_ict, russian, math, extra, total_score, has_consent, status
+        in results
+    ]
 
 
 def calculate_passing_scores(date=None):
@@ -253,77 +641,54 @@ def calculate_passing_scores(date=None):
     Возвращает словарь: {код_программы: проходной_балл или None (НЕДОБОР)}
     """
     if not date:
-        latest = get_latest_csv()
-        date = latest.replace('.csv', '') if latest else None
+        date = latest_date()
     
     if not date:
         return {}
     
-    results = {}
-    
-    # Получаем всех абитуриентов с согласием
-    all_applicants_with_consent = Applicant.query.filter_by(
-        upload_date=date,
-        has_consent=True
-    ).order_by(Applicant.total_score.desc()).all()
-    
-    # Группируем по ID абитуриента для учета приоритетов
-    applicants_by_id = {}
-    for app in all_applicants_with_consent:
-        if app.id not in applicants_by_id:
-            applicants_by_id[app.id] = []
-        applicants_by_id[app.id].append(app)
-    
-    # Сортируем заявки каждого абитуриента по приоритету
-    for applicant_id in applicants_by_id:
-        applicants_by_id[applicant_id].sort(key=lambda x: x.priority)
-    
-    # Распределяем места с учетом приоритетов
-    enrolled = {code: [] for code in PROGRAMS.keys()}
-    enrolled_ids = set()
-    
-    # Сортируем всех абитуриентов по общему баллу (по убыванию)
-    sorted_applicant_ids = sorted(
-        applicants_by_id.keys(),
-        key=lambda x: max(app.total_score for app in applicants_by_id[x]),
-        reverse=True
-    )
+    # Распределение мест с учетом приоритетов (общее для всех потребителей);
+    # заархивированная дата читается из архива и не разворачивается
+    if not get_archive(date):
+        materialize(date)
+    return save_calculation(get_allocation(date))
+
+
+def save_calculation(allocation):
+    """
+    Сохраняет проходные баллы и распределение (таблица enrollments)
+    в одной транзакции; возвращает {код_программы: проходной_балл}
+    """
+    results = store_calculation(allocation)
+    db.session.commit()
+    return results
+
+
+def store_calculation(allocation):
+    """
+    Добавляет в текущую транзакцию проходные баллы и распределение за дату
     
-    for applicant_id in sorted_applicant_ids:
-        if applicant_id in enrolled_ids:
-            continue
-        
-        # Проходим по приоритетам абитуриента
-        for app in applicants_by_id[applicant_id]:
-            program_code = app.program_code
-            seats = PROGRAMS[program_code]['seats']
-            
-            if len(enrolled[program_code]) < seats:
-                enrolled[program_code].append(app)
-                enrolled_ids.add(applicant_id)
-                break
+    Транзакцию фиксирует вызывающий код - так результаты за несколько дат
+    записываются одной транзакцией (см. recalculate.py).
+    """
+    date = allocation.date
+    results = {}
+    existing_records = {
+        record.program_code: record
+        for record in PassingScore.query.filter_by(upload_date=date)
+    }
     
     # Рассчитываем проходной балл для каждой программы
     for program_code, program_data in PROGRAMS.items():
         seats = program_data['seats']
-        enrolled_list = enrolled[program_code]
-        
-        # Сортируем зачисленных по баллам
-        enrolled_list.sort(key=lambda x: x.total_score, reverse=True)
-        
-        passing_score = None
-        if len(enrolled_list) >= seats:
-            passing_score = enrolled_list[seats - 1].total_score
+        enrolled_count = allocation.count(program_code)
+        passing_score = allocation.passing_score(program_code)
         
         # Сохраняем в БД
-        existing_record = PassingScore.query.filter_by(
-            program_code=program_code,
-            upload_date=date
-        ).first()
+        existing_record = existing_records.get(program_code)
         
         if existing_record:
             existing_record.passing_score = passing_score
-            existing_record.applicants_with_consent = len(enrolled_list)
+            existing_record.applicants_with_consent = enrolled_count
             existing_record.calculated_at = datetime.utcnow()
         else:
             new_record = PassingScore(
@@ -331,24 +696,132 @@ def calculate_passing_scores(date=None):
                 passing_score=passing_score,
                 upload_date=date,
                 seats_available=seats,
-                applicants_with_consent=len(enrolled_list)
+                applicants_with_consent=enrolled_count
             )
             db.session.add(new_record)
         
         results[program_code] = passing_score
     
-    db.session.commit()
+    # Кто куда зачислен - одной пакетной записью
+    save_enrollment(allocation)
+    # Страницы показывают проходные баллы - кэш результатов за дату устарел
+    bump_calculation(date)
+    mark_calculated(date)
     
     return results
 
 
+def ensure_enrollment(date):
+    """
+    Версия данных, по которой сохранено распределение за дату
+    
+    Если распределение для текущей версии еще не сохранено (список
+    загружен или изменен после расчета), расчет выполняется сейчас.
+    """
+    # Статусы и списки читаются из applicants - дата должна быть развернута
+    materialize(date)
+    version = get_version(date)
+    if enrollment_saved(date, version):
+        return version
+    
+    allocation = get_allocation(date)
+    save_calculation(allocation)
+    return allocation.version
+
+
+def applicants_with_status(date, version, filters=None, sort_by=None):
+    """
+    Запрос столбцов LIST_COLUMNS и статуса заявлений за дату по
+    распределению версии version (Core select, без объектов ORM)
+    
+    filters - фильтры списка (filter_conditions), sort_by - столбец
+    сортировки страницы.
+    Статус заявления: 'enrolled' - зачислен на эту программу, 'elsewhere' -
+    на другую, 'waiting' - есть согласие, но мест не хватило,
+    'not_enrolled' - нет согласия.
+    """
+    table = Applicant.__table__
+    enrollments = Enrollment.__table__
+    status = case(
+        (enrollments.c.program_id == table.c.program_id, ENROLLED),
+        (enrollments.c.program_id.isnot(None), 'elsewhere'),
+        (table.c.has_consent == True, 'waiting'),
+        else_='not_enrolled'
+    )
+    return select(
+        *[table.c[name] for name in LIST_COLUMNS],
+        status.label('status')
+    ).outerjoin(
+        enrollments,
+        and_(
+            enrollments.c.date_id == table.c.date_id,
+            enrollments.c.applicant_id == table.c.id,
+            enrollments.c.version == version
+        )
+    ).where(*filter_conditions(date, filters or {}, sort_by))
+
+
+def enrolled_lists(date, version, program_code=None):
+    """
+    Списки зачисленных {код_программы: [EnrolledApplicant]} по сохраненному
+    распределению, по убыванию баллов
+    """
+    query = enrolled_query(date, version)
+    if program_code:
+        query = query.filter(Enrollment.program_id == program_id(program_code))
+    
+    enrolled = {code: [] for code in PROGRAMS.keys()}
+    for applicant_id, key, priority, total_score in query:
+        code = program_code_of(key)
+        enrolled[code].append(EnrolledApplicant(applicant_id, code, priority, total_score))
+    return enrolled
+
+
+def enrolled_query(date, version):
+    """
+    Запрос зачисленных за дату (id, программа, приоритет, сумма баллов)
+    в порядке программ и мест в списке
+    """
+    return db.session.query(
+        Enrollment.applicant_id,
+        Enrollment.program_id,
+        Applicant.priority,
+        Applicant.total_score
+    ).join(
+        Applicant,
+        and_(
+            Applicant.date_id == Enrollment.date_id,
+            Applicant.id == Enrollment.applicant_id,
+            Applicant.program_id == Enrollment.program_id
+        )
+    ).filter(
+        Enrollment.date_id == date_id(date),
+        Enrollment.version == version
+    ).order_by(Enrollment.program_id, Enrollment.rank)
+
+
+def passing_scores_message(results):
+    """
+    Текст сообщения с результатами расчета проходных баллов
+    """
+    msg_list = []
+    
+    for code, score in results.items():
+        program_name = PROGRAMS[code]["name"]
+        score_text = f"{score}" if score else "НЕДОБОР"
+        msg_list.append(f"{program_name}: {score_text}")
+    
+    return "Проходные баллы рассчитаны:<br>" + "<br>".join(msg_list)
+
+
 def get_statistics(date=None):
     """
     Возвращает общую статистику по абитуриентам
+    
+    Результат кэшируется (result_cache.py).
     """
     if not date:
-        latest = get_latest_csv()
-        date = latest.replace('.csv', '') if latest else None
+        date = latest_date()
     
     if not date:
         return {
@@ -357,8 +830,21 @@ def get_statistics(date=None):
             'last_update': None
         }
     
-    total = Applicant.query.filter_by(upload_date=date).count()
-    with_consent = Applicant.query.filter_by(upload_date=date, has_consent=True).count()
+    return cached_result('get_statistics', date, (), lambda: build_statistics(date), lambda: prepare_date(date))
+
+
+def build_statistics(date):
+    """
+    Статистика за дату (без кэша; дата подготовлена prepare_date) - см. get_statistics
+    """
+    archive = get_archive(date)
+    if archive:
+        total = archive['manifest']['rows']
+        with_consent = int(np.count_nonzero(archive['columns']['has_consent']))
+    else:
+        date_key = date_id(date)
+        total = Applicant.query.filter_by(date_id=date_key).count()
+        with_consent = Applicant.query.filter_by(date_id=date_key, has_consent=True).count()
     
     return {
         'total_applicants': total,
@@ -371,8 +857,7 @@ def get_report_dates():
     """
     Возвращает список дат, по которым доступны отчеты
     """
-    files = get_csv_files()
-    return [f.replace('.csv', '').replace('_', '.') for f in files]
+    return display_dates()
 
 
 def generate_pdf_report(date):
@@ -440,14 +925,23 @@ def generate_pdf_report(date):
     # П.14.b: Проходные баллы
     story.append(Paragraph("Проходные баллы по образовательным программам", heading_style))
     
+    # Сохраненное распределение за дату - общее для всех разделов отчета
+    archive = get_archive(safe_date)
+    if archive:
+        enrolled_by_program = archived_enrolled(archive)
+    elif prepare_date(safe_date):
+        enrolled_by_program = enrolled_lists(safe_date, get_version(safe_date))
+    else:
+        raise ValueError(f"Список за {date} готовится, повторите через несколько секунд")
+    passing_scores = {
+        record.program_code: record.passing_score
+        for record in PassingScore.query.filter_by(upload_date=safe_date)
+    }
+    
     passing_scores_data = [['Программа', 'Мест', 'Проходной балл']]
     for code, program in PROGRAMS.items():
-        ps_record = PassingScore.query.filter_by(
-            program_code=code,
-            upload_date=safe_date
-        ).first()
-        
-        score_text = str(ps_record.passing_score) if ps_record and ps_record.passing_score else 'НЕДОБОР'
+        passing_score = passing_scores.get(code)
+        score_text = str(passing_score) if passing_score else 'НЕДОБОР'
         passing_scores_data.append([
             program['name'],
             str(program['seats']),
@@ -474,6 +968,15 @@ def generate_pdf_report(date):
     
     # Получаем данные по всем датам
     all_dates = get_report_dates()
+    
+    saved_scores = {
+        (record.upload_date, record.program_code): record.passing_score
+        for record in PassingScore.query.all()
+    }
+    # Даты, за которые расчет еще не выполнялся, на графике пропускаются:
+    # отчет не запускает пересчет (его выполняет "Пересчитать все даты")
+    calculated = {upload_date for upload_date, _ in saved_scores}
+    missing = [d for d in all_dates if d.replace('.', '_') not in calculated]
     dynamics_data = {code: [] for code in PROGRAMS.keys()}
     date_labels = []
     
@@ -482,12 +985,10 @@ def generate_pdf_report(date):
         date_labels.append(report_date)
         
         for code in PROGRAMS.keys():
-            ps_record = PassingScore.query.filter_by(
-                program_code=code,
-                upload_date=safe_report_date
-            ).first()
-            
-            score = ps_record.passing_score if ps_record and ps_record.passing_score else 0
+            if safe_report_date in calculated:
+                score = saved_scores.get((safe_report_date, code)) or 0
+            else:
+                score = float('nan')
             dynamics_data[code].append(score)
     
     # Создаем график
@@ -514,6 +1015,11 @@ def generate_pdf_report(date):
     # Добавляем график в PDF
     img = Image(graph_buffer, width=500, height=300)
     story.append(img)
+    if missing:
+        story.append(Paragraph(
+            f"Проходные баллы не рассчитаны за даты: {', '.join(missing)} "
+            f"(пропущены на графике)", normal_style
+        ))
     story.append(Spacer(1, 20))
     story.append(PageBreak())
     
@@ -524,7 +1030,7 @@ def generate_pdf_report(date):
         story.append(Paragraph(f"{program['name']} ({program['seats']} мест)", heading_style))
         
         # Получаем зачисленных
-        enrolled = get_enrolled_applicants(code, safe_date, program['seats'])
+        enrolled = enrolled_by_program[code]
         
         if enrolled:
             enrolled_data = [['№', 'ID абитуриента', 'Сумма баллов', 'Приоритет']]
@@ -561,19 +1067,23 @@ def generate_pdf_report(date):
     
     stats_data = [['Программа', 'Всего заявок', 'С согласием', 'Зачислено', 'Конкурс']]
     
+    counts = archived_counts(archive) if archive else None
     for code, program in PROGRAMS.items():
-        total_apps = Applicant.query.filter_by(
-            upload_date=safe_date,
-            program_code=code
-        ).count()
-        
-        with_consent = Applicant.query.filter_by(
-            upload_date=safe_date,
-            program_code=code,
-            has_consent=True
-        ).count()
+        if counts:
+            total_apps, with_consent = counts[code]
+        else:
+            total_apps = Applicant.query.filter_by(
+                date_id=date_id(safe_date),
+                program_id=program_id(code)
+            ).count()
+            
+            with_consent = Applicant.query.filter_by(
+                date_id=date_id(safe_date),
+                program_id=program_id(code),
+                has_consent=True
+            ).count()
         
-        enrolled_count = len(get_enrolled_applicants(code, safe_date, program['seats']))
+        enrolled_count = len(enrolled_by_program[code])
         
         competition = round(total_apps / program['seats'], 2) if program['seats'] > 0 else 0
         
@@ -609,47 +1119,173 @@ def generate_pdf_report(date):
 def get_enrolled_applicants(program_code, date, seats):
     """
     Возвращает список зачисленных абитуриентов на программу
-    с учетом приоритетов
-    """
-    # Получаем всех абитуриентов с согласием
-    all_applicants_with_consent = Applicant.query.filter_by(
-        upload_date=date,
-        has_consent=True
-    ).order_by(Applicant.total_score.desc()).all()
-    
-    # Группируем по ID
-    applicants_by_id = {}
-    for app in all_applicants_with_consent:
-        if app.id not in applicants_by_id:
-            applicants_by_id[app.id] = []
-        applicants_by_id[app.id].append(app)
-    
-    # Сортируем по приоритету для каждого абитуриента
-    for applicant_id in applicants_by_id:
-        applicants_by_id[applicant_id].sort(key=lambda x: x.priority)
-    
-    # Распределяем места
-    enrolled = {code: [] for code in PROGRAMS.keys()}
-    enrolled_ids = set()
+    с учетом приоритетов (по убыванию баллов)
     
-    sorted_applicant_ids = sorted(
-        applicants_by_id.keys(),
-        key=lambda x: max(app.total_score for app in applicants_by_id[x]),
-        reverse=True
+    Список читается из сохраненного распределения (таблица enrollments);
+    число мест берется из конфигурации программ, параметр seats сохранен
+    для совместимости.
+    """
+    archive = get_archive(date)
+    if archive:
+        return archived_enrolled(archive)[program_code]
+    return enrolled_lists(date, ensure_enrollment(date), program_code)[program_code]
+
+
+def archive_date(date):
+    """
+    Записывает список за закрытую дату в архив (archive.py)
+    
+    Закрытая дата - та, после которой загружен следующий список. В архив
+    попадают заявления со статусами по сохраненному распределению (при
+    необходимости расчет выполняется сейчас). Возвращает манифест архива.
+    """
+    date = date.replace('.', '_').strip()
+    dates = dataset_dates()
+    if date not in dates:
+        raise ValueError(f"Нет конкурсного списка за {date}")
+    if date == dates[-1]:
+        raise ValueError(f"Дата {date} - последняя, ее список еще может измениться")
+    if date_id(date) is None:
+        raise ValueError(f"Список за {date} не загружен в БД")
+    
+    version = ensure_enrollment(date)
+    table = Applicant.__table__
+    enrollments = Enrollment.__table__
+    fields = ('id', 'program_id', 'priority', 'physics_ict_score', 'russian_score',
+              'math_score', 'extra_score', 'total_score', 'has_consent')
+    query = select(
+        *[table.c[name] for name in fields],
+        # Номера программ в справочнике начинаются с 1: 0 - не зачислен
+        func.coalesce(enrollments.c.program_id, 0),
+        func.coalesce(enrollments.c.rank, 0)
+    ).outerjoin(
+        enrollments,
+        and_(
+            enrollments.c.date_id == table.c.date_id,
+            enrollments.c.applicant_id == table.c.id,
+            enrollments.c.version == version
+        )
+    ).where(table.c.date_id == date_id(date)).order_by(
+        table.c.total_score.desc(), table.c.id, table.c.program_id
     )
+    rows = db.session.execute(query)
+    data = np.fromiter(chain.from_iterable(rows), dtype=np.int64).reshape(-1, len(fields) + 2)
+    db.session.commit()
     
-    for applicant_id in sorted_applicant_ids:
-        if applicant_id in enrolled_ids:
-            continue
-        
-        for app in applicants_by_id[applicant_id]:
-            prog_code = app.program_code
-            prog_seats = PROGRAMS[prog_code]['seats']
-            
-            if len(enrolled[prog_code]) < prog_seats:
-                enrolled[prog_code].append(app)
-                enrolled_ids.add(applicant_id)
-                break
+    # Номер программы в справочнике -> номер в PROGRAM_CODES
+    ids = program_ids()
+    index = np.full(max(ids.values()) + 1, -1, dtype=np.int64)
+    for code, key in ids.items():
+        index[key] = PROGRAM_INDEX[code]
+    
+    columns = {name: data[:, i] for i, name in enumerate(fields)}
+    columns['program'] = index[columns.pop('program_id')]
+    columns['has_consent'] = columns['has_consent'] != 0
+    columns['enrolled_program'] = index[data[:, len(fields)]]
+    columns['rank'] = data[:, len(fields) + 1]
+    
+    # Ключи сортировки страниц - с номерами программ справочника, как в БД;
+    # столбцы приводятся к типам архива (ширина составного ключа)
+    dtypes = dict(COLUMNS, program_id='int8')
+    if max(ids.values()) > np.iinfo(dtypes['program_id']).max:
+        raise ValueError("Номера программ справочника не помещаются в архив")
+    keys = dict(columns, program_id=data[:, fields.index('program_id')])
+    sort_keys = {
+        sort_by: [keys[name].astype(dtypes[name]) for name in names]
+        for sort_by, names in SORT_KEYS.items()
+    }
+    
+    return write_archive(date, version, PROGRAM_CODES, columns, sort_keys)
+
+
+def archived_page(archive, date, filters, sort_by, order, page_size, after, before):
+    """
+    Страница списка из архива - как database_page
+    """
+    columns = archive['columns']
+    mask = archived_rows(columns, filters)
+    
+    # Перестановка и ключи сортировки сохранены в архиве - без сортировки
+    permutation, codes = archive['orders'][sort_by]
+    rows, offset, total = keyset_page(
+        permutation, codes, archive['manifest']['orders'][sort_by], mask,
+        order == 'desc', after, before, page_size
+    )
     
-    # Возвращаем зачисленных на конкретную программу
-    return enrolled[program_code]
+    names = ('id', 'program', 'priority', 'physics_ict_score', 'russian_score',
+             'math_score', 'extra_score', 'total_score', 'has_consent')
+    values = [columns[name][rows].tolist() for name in names] + [statuses(columns, rows)]
+    programs = [(code, PROGRAMS[code]['name']) for code in PROGRAM_CODES]
+    result = [
+        ApplicantRow(applicant_id, *programs[program], priority, physics_ict, russian, math, extra,
+                     total_score, consent, date, status)
+        for applicant_id, program, priority, physics_ict, russian, math, extra, total_score, consent, status
+        in zip(*values)
+    ]
+    # Ключи строк страницы - с номерами программ справочника, как в БД
+    ids = program_ids()
+    program_keys = np.array([ids[code] for code in PROGRAM_CODES], dtype=np.int64)
+    key_columns = [
+        program_keys[columns['program'][rows]] if name == 'program_id' else columns[name][rows]
+        for name in SORT_KEYS[sort_by]
+    ]
+    keys = list(zip(*[np.asarray(column).tolist() for column in key_columns]))
+    return result, keys, offset, total
+
+
+def archived_rows(columns, filters):
+    """
+    Маска строк архива, удовлетворяющих фильтрам (None - все строки)
+    """
+    if not filters:
+        return None
+    mask = np.ones(len(columns['id']), dtype=bool)
+    if filters.get('program'):
+        mask &= np.asarray(columns['program']) == PROGRAM_INDEX[filters['program']]
+    if filters.get('consent') is not None:
+        mask &= np.asarray(columns['has_consent']) == filters['consent']
+    if filters.get('priority') is not None:
+        mask &= np.asarray(columns['priority']) == filters['priority']
+    if filters.get('min_score') is not None:
+        mask &= np.asarray(columns['total_score']) >= filters['min_score']
+    if filters.get('max_score') is not None:
+        mask &= np.asarray(columns['total_score']) <= filters['max_score']
+    if filters.get('enrolled'):
+        mask &= np.asarray(columns['enrolled_program']) == np.asarray(columns['program'])
+    if filters.get('id_prefix'):
+        ids = np.asarray(columns['id'])
+        matches = np.zeros(len(ids), dtype=bool)
+        for low, high in id_ranges(filters['id_prefix']):
+            matches |= (ids >= low) & (ids <= high)
+        mask &= matches
+    return mask
+
+
+def archived_enrolled(archive):
+    """
+    Списки зачисленных {код_программы: [EnrolledApplicant]} из архива
+    """
+    columns = archive['columns']
+    enrolled = {}
+    for code in PROGRAMS.keys():
+        rows = enrolled_rows(columns, PROGRAM_INDEX[code])
+        enrolled[code] = [
+            EnrolledApplicant(applicant_id, code, priority, total)
+            for applicant_id, priority, total in zip(
+                columns['id'][rows].tolist(),
+                columns['priority'][rows].tolist(),
+                columns['total_score'][rows].tolist()
+            )
+        ]
+    return enrolled
+
+
+def archived_counts(archive):
+    """
+    {код_программы: (заявлений, с согласием)} из архива
+    """
+    columns = archive['columns']
+    programs = np.asarray(columns['program'])
+    total = np.bincount(programs, minlength=len(PROGRAM_CODES))
+    with_consent = np.bincount(programs[np.asarray(columns['has_consent'])], minlength=len(PROGRAM_CODES))
+    return {code: (int(total[PROGRAM_INDEX[code]]), int(with_consent[PROGRAM_INDEX[code]])) for code in PROGRAMS}
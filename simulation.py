@@ -0,0 +1,265 @@
+"""
+Моделирование распределения мест по сценариям ("что если")
+
+Сценарий меняет число мест на программах, согласия абитуриентов и минимальные
+суммы баллов. Заявления за дату читаются из БД один раз (снимок), сценарии
+распределяются по пулу процессов: каждый процесс получает снимок при запуске
+и строит очередь один раз для всех своих сценариев с одинаковыми согласиями
+и порогами. В БД ничего не записывается (проходные баллы в PassingScore
+не меняются).
+
+Сценарий (JSON):
+    {
+        "name": "ИБ - 25 мест",
+        "seats": {"ib": 25},
+        "consent": [{"priority": 1, "value": true}],
+        "min_score": 200
+    }
+
+- seats: число мест по программам (остальные - из Config.PROGRAMS)
+- consent: правила по порядку; каждое задает согласие value всем заявлениям,
+  подходящим под указанные условия program, priority, ids
+- min_score: минимальная сумма баллов - общая или {код_программы: балл};
+  заявления ниже порога не участвуют в распределении
+"""
+
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+from config import Config
+from allocation import PROGRAM_CODES, PROGRAM_INDEX, build_queue, get_archive, load_columns, run_engine
+from snapshots import materialize
+
+
+PROGRAMS = Config.PROGRAMS
+
+# Условия правила согласия
+CONSENT_FILTERS = ('program', 'priority', 'ids')
+
+# Пример сценариев для страницы моделирования
+EXAMPLE_SCENARIOS = [
+    {'name': "Текущие условия"},
+    {'name': "ИБ - 25 мест", 'seats': {'ib': 25}},
+    {'name': "Все с приоритетом 1 дали согласие", 'consent': [{'priority': 1, 'value': True}]},
+    {'name': "Сумма баллов от 200", 'min_score': 200},
+]
+
+# Снимок заявлений в рабочем процессе
+_snapshot = None
+
+
+def parse_scenarios(data):
+    """
+    Проверяет список сценариев и приводит его к полному виду
+
+    Возвращает список {'name', 'seats', 'consent', 'min_score'}, где seats и
+    min_score заданы для всех программ. При ошибке - ValueError.
+    """
+    if not isinstance(data, list) or not data:
+        raise ValueError("Ожидается непустой список сценариев")
+    if len(data) > Config.SIMULATION_MAX_SCENARIOS:
+        raise ValueError(f"Не более {Config.SIMULATION_MAX_SCENARIOS} сценариев за один запуск")
+
+    scenarios = []
+    for number, item in enumerate(data, 1):
+        if not isinstance(item, dict):
+            raise ValueError(f"Сценарий {number}: ожидается объект")
+        unknown = set(item) - {'name', 'seats', 'consent', 'min_score'}
+        if unknown:
+            raise ValueError(f"Сценарий {number}: неизвестные поля {', '.join(sorted(unknown))}")
+
+        seats = {code: program['seats'] for code, program in PROGRAMS.items()}
+        for code, value in program_values(item.get('seats', {}), number, "seats").items():
+            seats[code] = value
+
+        min_score = {code: 0 for code in PROGRAMS}
+        threshold = item.get('min_score', 0)
+        if isinstance(threshold, dict):
+            min_score.update(program_values(threshold, number, "min_score"))
+        elif is_count(threshold):
+            min_score = {code: threshold for code in PROGRAMS}
+        else:
+            raise ValueError(f"Сценарий {number}: min_score - число или объект по программам")
+
+        scenarios.append({
+            'name': str(item.get('name') or f"Сценарий {number}"),
+            'seats': seats,
+            'consent': consent_rules(item.get('consent', []), number),
+            'min_score': min_score,
+        })
+    return scenarios
+
+
+def is_count(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+def program_values(values, number, field):
+    """
+    Проверяет объект {код_программы: неотрицательное целое}
+    """
+    if not isinstance(values, dict):
+        raise ValueError(f"Сценарий {number}: {field} - объект по программам")
+    for code, value in values.items():
+        if code not in PROGRAMS:
+            raise ValueError(f"Сценарий {number}: неизвестная программа {code} в {field}")
+        if not is_count(value):
+            raise ValueError(f"Сценарий {number}: {field}.{code} - неотрицательное целое")
+    return values
+
+
+def consent_rules(rules, number):
+    """
+    Проверяет правила согласия сценария
+    """
+    if not isinstance(rules, list):
+        raise ValueError(f"Сценарий {number}: consent - список правил")
+    for rule in rules:
+        if not isinstance(rule, dict) or not isinstance(rule.get('value'), bool):
+            raise ValueError(f"Сценарий {number}: правило согласия должно содержать value: true/false")
+        unknown = set(rule) - set(CONSENT_FILTERS) - {'value'}
+        if unknown:
+            raise ValueError(f"Сценарий {number}: неизвестные условия {', '.join(sorted(unknown))}")
+        if 'program' in rule and rule['program'] not in PROGRAMS:
+            raise ValueError(f"Сценарий {number}: неизвестная программа {rule['program']}")
+        if 'priority' in rule and not is_count(rule['priority']):
+            raise ValueError(f"Сценарий {number}: priority - целое число")
+        if 'ids' in rule and not (isinstance(rule['ids'], list) and all(is_count(i) for i in rule['ids'])):
+            raise ValueError(f"Сценарий {number}: ids - список id абитуриентов")
+    return rules
+
+
+def seat_sweep(program_code, start, stop, step=1):
+    """
+    Сценарии с числом мест на программе от start до stop включительно
+    """
+    if program_code not in PROGRAMS:
+        raise ValueError(f"Неизвестная программа {program_code}")
+    if step <= 0 or start < 0 or stop < start:
+        raise ValueError("Неверный диапазон мест")
+    name = PROGRAMS[program_code]['name']
+    return [
+        {'name': f"{name} - {seats} мест", 'seats': {program_code: seats}}
+        for seats in range(start, stop + 1, step)
+    ]
+
+
+def eligibility_key(scenario):
+    """
+    Сценарии с одинаковым ключом используют одну очередь
+    """
+    return json.dumps([scenario['consent'], scenario['min_score']], sort_keys=True)
+
+
+def scenario_consent(columns, scenario):
+    """
+    Массив согласий заявлений с учетом правил и порогов сценария
+    """
+    consent = columns['has_consent'] != 0
+    for rule in scenario['consent']:
+        selected = np.ones(len(consent), dtype=bool)
+        if 'program' in rule:
+            selected &= columns['program'] == PROGRAM_INDEX[rule['program']]
+        if 'priority' in rule:
+            selected &= columns['priority'] == rule['priority']
+        if 'ids' in rule:
+            selected &= np.isin(columns['id'], np.array(rule['ids'], dtype=np.int64))
+        consent[selected] = rule['value']
+
+    thresholds = np.array([scenario['min_score'][code] for code in PROGRAM_CODES], dtype=np.int64)
+    consent &= columns['total_score'] >= thresholds[columns['program']]
+    return consent.astype(np.int64)
+
+
+def scenario_result(queue, scenario):
+    """
+    Распределяет места сценария по готовой очереди; возвращает строку таблицы
+    """
+    seats = np.array([scenario['seats'][code] for code in PROGRAM_CODES], dtype=np.int64)
+    queue.seats = seats
+    run_engine(queue)
+
+    ranks = np.flatnonzero(queue.chosen != len(seats))
+    chosen = queue.chosen[ranks]
+    totals = queue.totals[ranks, queue.pointer[ranks]]
+
+    passing_scores = {}
+    enrolled = {}
+    for index, code in enumerate(PROGRAM_CODES):
+        program_totals = totals[chosen == index]
+        enrolled[code] = int(len(program_totals))
+        if seats[index] > 0 and len(program_totals) >= seats[index]:
+            passing_scores[code] = int(np.sort(program_totals)[::-1][seats[index] - 1])
+        else:
+            passing_scores[code] = None
+
+    return {
+        'name': scenario['name'],
+        'seats': dict(scenario['seats']),
+        'passing_scores': {code: passing_scores[code] for code in PROGRAMS},
+        'enrolled': {code: enrolled[code] for code in PROGRAMS},
+    }
+
+
+def init_worker(columns):
+    global _snapshot
+    _snapshot = columns
+
+
+def run_scenarios(scenarios):
+    """
+    Выполняет сценарии над снимком процесса; очередь строится один раз на группу
+    """
+    results = []
+    queues = {}
+    for index, scenario in scenarios:
+        key = eligibility_key(scenario)
+        if key not in queues:
+            columns = dict(_snapshot, has_consent=scenario_consent(_snapshot, scenario))
+            queues = {key: build_queue(columns, np.zeros(len(PROGRAM_CODES), dtype=np.int64))}
+        results.append((index, scenario_result(queues[key], scenario)))
+    return results
+
+
+def simulate(date, scenarios, workers=None):
+    """
+    Выполняет сценарии (см. parse_scenarios) над снимком заявлений за дату
+
+    Возвращает {'date', 'scenarios': [строки таблицы], 'elapsed'}; строка -
+    {'name', 'seats', 'passing_scores', 'enrolled'} по программам.
+    """
+    start_time = datetime.now()
+    # Заархивированная дата читается из архива и не разворачивается
+    if not get_archive(date):
+        materialize(date)
+    columns = load_columns(date, consent_only=False)
+    workers = workers or Config.SIMULATION_WORKERS or os.cpu_count() or 1
+
+    # Сценарии с одинаковыми согласиями - подряд, чтобы делить очередь
+    indexed = sorted(enumerate(scenarios), key=lambda item: eligibility_key(item[1]))
+    chunk_size = max(1, math.ceil(len(indexed) / workers))
+    tasks = [indexed[i:i + chunk_size] for i in range(0, len(indexed), chunk_size)]
+
+    if len(tasks) <= 1:
+        init_worker(columns)
+        try:
+            batches = [run_scenarios(task) for task in tasks]
+        finally:
+            init_worker(None)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(columns,)) as executor:
+            batches = list(executor.map(run_scenarios, tasks))
+
+    results = [None] * len(scenarios)
+    for batch in batches:
+        for index, result in batch:
+            results[index] = result
+
+    return {
+        'date': date,
+        'scenarios': results,
+        'elapsed': (datetime.now() - start_time).total_seconds(),
+    }
@@ -0,0 +1,382 @@
+"""
+Хранение конкурсных списков по датам в виде изменений (дельт)
+
+Списки соседних дней приемной кампании совпадают почти полностью, поэтому
+полный список хранится только для первой даты (базовый снимок), а для каждой
+следующей - изменения относительно предыдущей даты в таблице
+applicant_changes: 'added', 'changed' и 'removed'. Список за любую дату
+восстанавливается одним запросом: для каждого заявления берется последнее
+изменение в цепочке от базового снимка до этой даты.
+
+Таблица applicants остается рабочей таблицей, по которой строятся запросы
+визуализации и расчета: в ней развернуты (материализованы) последняя дата и
+несколько недавно использованных (Config.SNAPSHOT_MATERIALIZED_DATES).
+Остальные даты удаляются из applicants и разворачиваются заново при первом
+обращении (materialize; для страниц - в фоновой задаче, services.prepare_date). Развертывание и удаление не меняют данные за дату,
+поэтому версия данных (data_versions) и сохраненные расчеты остаются
+действительными.
+
+Чтение даты ничего не пишет в БД: время обращения запоминается в памяти
+процесса и записывается в snapshots (used_at) только теми, кто и так пишет, -
+развертыванием, записью снимка и свертыванием. Свертывание учитывает время
+из snapshots (обращения других процессов, записанные ими) и из памяти своего
+процесса. Каждое свертывание увеличивает номер generation даты - он входит в
+ключ кэша результатов (result_cache.py): страница, прочитанная во время
+свертывания, не кэшируется.
+
+Порядок дат - как в каталоге загруженных списков (catalog.py): по имени.
+"""
+
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import and_, case, exists, func, literal, or_, select
+from config import Config
+from models import db, Applicant, ApplicantChange, CampaignDate, Snapshot
+from dimensions import date_id
+from ingest import DB_FIELDS, VALUE_FIELDS, audit_time
+
+
+# Виды изменений
+ADDED = 'added'
+CHANGED = 'changed'
+REMOVED = 'removed'
+
+# Развертывание, запись и удаление снимков в процессе выполняются по одному
+_lock = threading.RLock()
+# Время последнего обращения к дате в этом процессе: {дата: datetime}
+_used = {}
+
+
+def snapshot_dates(connection):
+    """
+    Даты хранилища по порядку
+    """
+    table = Snapshot.__table__
+    return sorted(connection.execute(select(table.c.upload_date)).scalars())
+
+
+def neighbours(dates, date):
+    """
+    Предыдущая и следующая дата хранилища относительно date (или None)
+    """
+    earlier = [d for d in dates if d < date]
+    later = [d for d in dates if d > date]
+    return (earlier[-1] if earlier else None), (later[0] if later else None)
+
+
+def write_changes(connection, date, previous):
+    """
+    Записывает изменения даты относительно previous (None - базовый снимок)
+
+    Обе даты должны быть развернуты в applicants. Возвращает число записей.
+    """
+    table = Applicant.__table__
+    changes = ApplicantChange.__table__
+    columns = list(DB_FIELDS)
+    date_key = date_id(date, connection)
+    previous_key = date_id(previous, connection) if previous else None
+    connection.execute(changes.delete().where(changes.c.date_id == date_key))
+
+    current = table.alias('current')
+    if previous is None:
+        # Базовый снимок: все заявления - добавленные
+        return connection.execute(
+            changes.insert().from_select(
+                ['date_id', 'change'] + columns,
+                select(literal(date_key), literal(ADDED), *[current.c[name] for name in columns])
+                .where(current.c.date_id == date_key)
+            )
+        ).rowcount
+
+    earlier = table.alias('earlier')
+    same_key = and_(
+        earlier.c.id == current.c.id,
+        earlier.c.program_id == current.c.program_id,
+    )
+
+    added = connection.execute(
+        changes.insert().from_select(
+            ['date_id', 'change'] + columns,
+            select(literal(date_key), literal(ADDED), *[current.c[name] for name in columns])
+            .where(
+                current.c.date_id == date_key,
+                ~exists().where(same_key, earlier.c.date_id == previous_key)
+            )
+        )
+    ).rowcount
+
+    changed = connection.execute(
+        changes.insert().from_select(
+            ['date_id', 'change'] + columns,
+            select(literal(date_key), literal(CHANGED), *[current.c[name] for name in columns])
+            .join(earlier, and_(same_key, earlier.c.date_id == previous_key))
+            .where(
+                current.c.date_id == date_key,
+                or_(*[current.c[name].is_distinct_from(earlier.c[name]) for name in VALUE_FIELDS])
+            )
+        )
+    ).rowcount
+
+    removed = connection.execute(
+        changes.insert().from_select(
+            ['date_id', 'change', 'id', 'program_id'],
+            select(literal(date_key), literal(REMOVED), earlier.c.id, earlier.c.program_id)
+            .where(
+                earlier.c.date_id == previous_key,
+                ~exists().where(same_key, current.c.date_id == date_key)
+            )
+        )
+    ).rowcount
+
+    return added + changed + removed
+
+
+def reconstruct(connection, date, dates):
+    """
+    Разворачивает список за date в applicants по цепочке изменений
+
+    Для каждого заявления берется последнее изменение среди дат цепочки
+    (dates до date включительно); отозванные заявления не попадают в список.
+    """
+    table = Applicant.__table__
+    changes = ApplicantChange.__table__
+    chain = [date_id(d, connection) for d in dates if d <= date]
+    date_key = date_id(date, connection)
+    now = audit_time()
+
+    # Последнее изменение - от самой поздней даты цепочки
+    position = case({key: number for number, key in enumerate(chain)}, value=changes.c.date_id)
+    latest = select(
+        changes,
+        func.row_number().over(
+            partition_by=[changes.c.id, changes.c.program_id],
+            order_by=position.desc()
+        ).label('number')
+    ).where(changes.c.date_id.in_(chain)).subquery()
+
+    # Строки могли остаться от прерванной загрузки - заменяем их
+    connection.execute(table.delete().where(table.c.date_id == date_key))
+    return connection.execute(
+        table.insert().from_select(
+            list(DB_FIELDS) + ['date_id', 'created_at', 'updated_at'],
+            select(
+                *[latest.c[name] for name in DB_FIELDS],
+                literal(date_key), literal(now), literal(now)
+            ).where(latest.c.number == 1, latest.c.change != REMOVED)
+        )
+    ).rowcount
+
+
+def is_materialized(date):
+    """
+    Развернута ли дата в applicants (дата вне хранилища - True)
+
+    Только читает: обращение к дате запоминается в памяти процесса.
+    """
+    table = Snapshot.__table__
+    materialized = db.session.execute(
+        select(table.c.materialized).where(table.c.upload_date == date)
+    ).scalar()
+    _used[date] = datetime.utcnow()
+    return materialized is not False
+
+
+def materialize(date, evict=True):
+    """
+    Разворачивает дату в applicants, если она хранится только изменениями
+
+    Вызывается внутри контекста приложения перед чтением заявлений за дату.
+    Возвращает True, если дата была развернута сейчас.
+    """
+    with _lock:
+        snapshot = db.session.get(Snapshot, date)
+        if snapshot is None:
+            return False
+        now = datetime.utcnow()
+        _used[date] = now
+        if snapshot.materialized:
+            return False
+
+        connection = db.session.connection()
+        reconstruct(connection, date, snapshot_dates(connection))
+        snapshot.materialized = True
+        snapshot.materialized_at = now
+        snapshot.used_at = now
+        db.session.commit()
+
+    if evict:
+        evict_snapshots()
+    return True
+
+
+def evict_snapshots():
+    """
+    Удаляет из applicants развернутые даты сверх Config.SNAPSHOT_MATERIALIZED_DATES
+
+    Последняя дата остается всегда, остальные - по времени последнего обращения
+    (из snapshots и из памяти процесса; время из памяти записывается в
+    snapshots). Даты, развернутые или запрошенные недавно (Config.SNAPSHOT_EVICT_DELAY
+    секунд), не удаляются: их могут читать параллельные запросы.
+    Возвращает список удаленных дат.
+    """
+    limit = Config.SNAPSHOT_MATERIALIZED_DATES
+    if limit is None:
+        return []
+
+    with _lock:
+        table = Applicant.__table__
+        snapshots = Snapshot.query.filter_by(materialized=True).all()
+        if not snapshots:
+            return []
+        latest = max(snapshot.upload_date for snapshot in snapshots)
+        used_at = {}
+        for snapshot in snapshots:
+            date = snapshot.upload_date
+            used_at[date] = max(snapshot.materialized_at or datetime.min, snapshot.used_at or datetime.min,
+                                _used.get(date, datetime.min))
+            # Обращения этого процесса - в snapshots для свертывания в других процессах
+            if used_at[date] > (snapshot.used_at or datetime.min):
+                snapshot.used_at = used_at[date]
+        snapshots.sort(key=lambda snapshot: (snapshot.upload_date == latest, used_at[snapshot.upload_date]))
+        threshold = datetime.utcnow() - timedelta(seconds=Config.SNAPSHOT_EVICT_DELAY)
+
+        evicted = []
+        for snapshot in snapshots[:max(len(snapshots) - max(limit, 1), 0)]:
+            if used_at[snapshot.upload_date] > threshold:
+                continue
+            db.session.execute(table.delete().where(table.c.date_id == date_id(snapshot.upload_date)))
+            snapshot.materialized = False
+            snapshot.generation = (snapshot.generation or 0) + 1
+            evicted.append(snapshot.upload_date)
+        db.session.commit()
+    return evicted
+
+
+def snapshot_generation(date):
+    """
+    Сколько раз дата сворачивалась (0 - даты нет в хранилище)
+
+    Читается запросом, а не из сессии: значение может изменить другой процесс.
+    """
+    table = Snapshot.__table__
+    return db.session.execute(
+        select(table.c.generation).where(table.c.upload_date == date)
+    ).scalar() or 0
+
+
+def record_snapshot(date, evict=True):
+    """
+    Записывает изменения загруженной даты в хранилище
+
+    Вызывается после записи списка за date в applicants. Изменения следующей
+    даты пересчитываются относительно date, чтобы цепочка оставалась верной.
+    """
+    with _lock:
+        connection = db.session.connection()
+        dates = snapshot_dates(connection)
+        previous, following = neighbours(dates, date)
+
+        # Соседние даты разворачиваются по цепочке до изменения date
+        for neighbour in (previous, following):
+            if neighbour:
+                materialize(neighbour, evict=False)
+
+        connection = db.session.connection()
+        table = Applicant.__table__
+        rows = connection.execute(
+            select(func.count()).select_from(table).where(table.c.date_id == date_id(date))
+        ).scalar()
+        snapshot = db.session.get(Snapshot, date) or Snapshot(upload_date=date)
+        snapshot.base_date = previous
+        snapshot.rows = rows
+        snapshot.changes = write_changes(connection, date, previous)
+        snapshot.materialized = True
+        snapshot.materialized_at = snapshot.used_at = datetime.utcnow()
+        db.session.add(snapshot)
+
+        if following:
+            successor = db.session.get(Snapshot, following)
+            successor.base_date = date
+            successor.changes = write_changes(connection, following, date)
+        db.session.commit()
+
+    if evict:
+        evict_snapshots()
+    return snapshot.changes
+
+
+def remove_snapshot(date):
+    """
+    Удаляет дату из хранилища; изменения следующей даты пересчитываются
+    относительно предыдущей. Строки applicants за date не удаляются.
+    """
+    with _lock:
+        connection = db.session.connection()
+        dates = snapshot_dates(connection)
+        if date not in dates:
+            return
+        previous, following = neighbours(dates, date)
+        for neighbour in (previous, following):
+            if neighbour:
+                materialize(neighbour, evict=False)
+
+        connection = db.session.connection()
+        changes = ApplicantChange.__table__
+        connection.execute(changes.delete().where(changes.c.date_id == date_id(date)))
+        Snapshot.query.filter_by(upload_date=date).delete()
+        if following:
+            successor = db.session.get(Snapshot, following)
+            successor.base_date = previous
+            successor.changes = write_changes(connection, following, previous)
+        db.session.commit()
+
+    evict_snapshots()
+
+
+def build_snapshots(connection):
+    """
+    Заполняет хранилище по датам, полностью записанным в applicants
+    (миграция существующей БД); все даты остаются развернутыми
+    """
+    table = Applicant.__table__
+    snapshots = Snapshot.__table__
+    dates = sorted(connection.execute(
+        select(CampaignDate.upload_date).where(
+            exists().where(table.c.date_id == CampaignDate.id)
+        )
+    ).scalars())
+    registered = set(snapshot_dates(connection))
+    now = datetime.utcnow()
+
+    previous = None
+    for date in dates:
+        if date not in registered:
+            rows = connection.execute(
+                select(func.count()).select_from(table).where(table.c.date_id == date_id(date, connection))
+            ).scalar()
+            connection.execute(snapshots.insert().values(
+                upload_date=date,
+                base_date=previous,
+                rows=rows,
+                changes=write_changes(connection, date, previous),
+                materialized=True,
+                materialized_at=now
+            ))
+        previous = date
+    return dates
+
+
+def storage_summary():
+    """
+    Сводка хранилища по датам: [{'date', 'base_date', 'rows', 'changes', 'materialized'}]
+    """
+    return [
+        {
+            'date': snapshot.upload_date,
+            'base_date': snapshot.base_date,
+            'rows': snapshot.rows,
+            'changes': snapshot.changes,
+            'materialized': snapshot.materialized,
+        }
+        for snapshot in Snapshot.query.order_by(Snapshot.upload_date)
+    ]
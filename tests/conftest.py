@@ -0,0 +1,64 @@
+"""
+Общие настройки тестов
+
+Приложение создается один раз на сеанс тестов во временной папке: там
+лежат БД (DATABASE_URL) и папки data, reports и archive - они заданы
+относительными путями. Списки генерирует generate.py и загружает маршрут
+/upload в том же запросе (без фоновой задачи).
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+import pytest
+
+
+ROOT = Path(__file__).resolve().parent.parent
+WORKDIR = Path(tempfile.mkdtemp(prefix='applicants-tests-'))
+
+sys.path.insert(0, str(ROOT))
+os.chdir(WORKDIR)
+os.environ['DATABASE_URL'] = f"sqlite:///{WORKDIR / 'test.db'}"
+
+from config import Config
+
+Config.INGEST_BACKGROUND = False
+# Запись, которая ждет блокировку, быстро завершается ошибкой
+Config.SQLITE_PROFILE = dict(Config.SQLITE_PROFILE, busy_timeout=1000)
+
+# Абитуриентов в сгенерированных списках и число дней кампании
+APPLICANTS = 400
+DAYS = 2
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+    return app
+
+
+@pytest.fixture(scope='session')
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope='session')
+def dates(client):
+    """
+    Даты (дд_мм) загруженных списков
+    """
+    import generate
+
+    source = WORKDIR / 'source'
+    args = generate.parse_args(["--applicants", str(APPLICANTS), "--days", str(DAYS),
+                                "--output", str(source)])
+    source.mkdir()
+    dates = generate.campaign_dates(args.start_date, args.days)
+    for day, date in enumerate(dates):
+        filepath, _, _ = generate.write_day(args, date, day, source)
+        with open(filepath, 'rb') as f:
+            response = client.post('/upload', data={'file': (f, f'{date}.csv'), 'date': date},
+                                   content_type='multipart/form-data')
+        assert response.status_code == 302
+    return dates
@@ -0,0 +1,77 @@
+"""
+GET-запросы ничего не пишут в БД: страницы и отчеты отвечают, пока другой
+писатель держит транзакцию дольше времени ожидания блокировки
+"""
+
+import threading
+import time
+from config import Config
+from models import db
+from result_cache import clear_results
+from snapshots import evict_snapshots, is_materialized
+
+
+def hold_writer(app, seconds, locked):
+    """
+    Держит исключительную транзакцию, изменяющую заявления, seconds секунд
+    """
+    with app.app_context():
+        connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('BEGIN EXCLUSIVE')
+        cursor.execute('UPDATE applicants SET total_score = total_score')
+        locked.set()
+        time.sleep(seconds)
+        connection.rollback()
+    finally:
+        locked.set()
+        connection.close()
+
+
+def test_reads_while_writer_holds_lock(app, client, dates, monkeypatch):
+    first = dates[0].replace('_', '.')
+    # Первая дата свернута: ее страницы ставят задачу подготовки вместо записи
+    with monkeypatch.context() as patch:
+        patch.setattr(Config, 'SNAPSHOT_MATERIALIZED_DATES', 1)
+        patch.setattr(Config, 'SNAPSHOT_EVICT_DELAY', 0)
+        with app.app_context():
+            assert dates[0] in evict_snapshots()
+            assert not is_materialized(dates[0])
+
+    code = next(iter(Config.PROGRAMS))
+    paths = [
+        '/', f'/?file={first}',
+        f'/program/{code}', f'/program/{code}?file={first}',
+        '/api/applicants', f'/api/applicants?date={first}',
+        '/reports', f'/reports/{dates[-1]}',
+    ]
+    seconds = Config.SQLITE_PROFILE['busy_timeout'] / 1000 + 1
+    locked = threading.Event()
+    writer = threading.Thread(target=hold_writer, args=(app, seconds, locked))
+    writer.start()
+    locked.wait()
+
+    responses = []
+    try:
+        while writer.is_alive():
+            for path in paths:
+                # Без кэша результатов - каждый запрос читает БД
+                clear_results()
+                response = client.get(path)
+                responses.append((path, response.status_code, response.data))
+    finally:
+        writer.join()
+
+    assert len(responses) >= len(paths)
+    assert [(path, status) for path, status, _ in responses if status != 200] == []
+    assert all('готовится'.encode() in data for path, _, data in responses if path == f'/?file={first}')
+
+    # После записи задача подготовки разворачивает дату и сохраняет распределение
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if 'готовится' not in client.get(f'/?file={first}').get_data(as_text=True):
+            break
+        time.sleep(0.1)
+    with app.app_context():
+        assert is_materialized(dates[0])
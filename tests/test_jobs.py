@@ -0,0 +1,46 @@
+"""
+Состояние фоновых задач хранится в БД задач и видно по /jobs/<id>
+"""
+
+import subprocess
+import sys
+import time
+from datetime import datetime
+from jobs import Job, register, submit_calculation
+
+
+def wait_job(client, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f'/jobs/{job_id}').get_json()
+        if job['status'] not in ('queued', 'running') or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+def test_calculation_job_status(app, client, dates):
+    job = submit_calculation(app, dates[0])
+
+    data = wait_job(client, job.id)
+    assert data['status'] == 'done', data
+    assert data['kind'] == 'calculate'
+    assert data['date'] == dates[0]
+    assert data['messages']
+    assert client.get(f'/jobs/{job.id}/view').status_code == 200
+
+
+def test_job_of_finished_process_is_failed(app, client):
+    # Задача процесса, который уже завершился (как после перезапуска приложения)
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    job = Job('upload', '01_08')
+    register(job)
+    job.save(status='running', stage='writing', pid=process.pid, started_at=datetime.now())
+
+    data = client.get(f'/jobs/{job.id}').get_json()
+    assert data['status'] == 'failed'
+    assert data['error']
+
+
+def test_unknown_job(client):
+    assert client.get('/jobs/unknown').status_code == 404
@@ -0,0 +1,21 @@
+"""
+Планы запросов services.py (query_plans.hot_queries) используют индексы
+"""
+
+import pytest
+from config import Config
+from query_plans import explain, hot_queries, plan_problems
+
+
+@pytest.mark.parametrize('program_code', list(Config.PROGRAMS))
+def test_hot_queries_use_indexes(app, dates, program_code):
+    with app.app_context():
+        plans = [(name, explain(query)) for name, query in hot_queries(dates[-1], program_code)]
+
+    assert plans
+    for name, plan in plans:
+        scans = [detail for detail in plan
+                 if detail.startswith(('SCAN applicants', 'SCAN applicant_changes'))]
+        assert not scans, f"{name}: {plan}"
+        assert not [detail for detail in plan if 'USE TEMP B-TREE' in detail], f"{name}: {plan}"
+        assert not plan_problems(plan), f"{name}: {plan}"